@@ -1,11 +1,66 @@
-from django.contrib import admin
+import os
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db.models import Case, IntegerField, Value, When
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from . import imports, search
+from .forms import TransactionImportForm
 from .models import Merchant, Transaction
 
+class SearchIndexChangeList(ChangeList):
+    def get_ordering(self, request, queryset):
+        if self.query and ORDER_VAR not in self.params:
+            return [self.model_admin.search_ranking(request, queryset, self.query), '-pk']
+        return super().get_ordering(request, queryset)
+
+class SearchIndexAdminMixin:
+    """
+    Answer changelist searches from the search index.
+
+    ``search_fields`` still enables the search box, but matches come from
+    ``sneat_app.search`` and are ordered by relevance unless the user picks
+    a column to sort by. Every match is listed and counted; only the
+    ranking is limited to the best ``SNEAT_SEARCH_RESULT_LIMIT`` matches,
+    and the rest follow newest first.
+    """
+    
+    def get_changelist(self, request, **kwargs):
+        return SearchIndexChangeList
+    
+    def search_ids(self, request, queryset, search_term):
+        # The ordering and the filtering both need the ranked ids; look them up once per request.
+        cache = request.__dict__.setdefault('_search_ids', {})
+        key = (self.model._meta.label, search_term.strip())
+        if key not in cache:
+            cache[key] = search.ranked_ids(queryset, key[1])
+        return cache[key]
+    
+    def search_ranking(self, request, queryset, search_term):
+        ids = self.search_ids(request, queryset, search_term)
+        return Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+            default=Value(len(ids)),
+            output_field=IntegerField(),
+        ).asc()
+    
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.filter_queryset(queryset, search_term.strip()), False
+
 @admin.register(Merchant)
-class MerchantAdmin(admin.ModelAdmin):
+class MerchantAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     list_display = ['id', 'user', 'business_name', 'status', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'user__email', 'business_name']
+    # Merchant.__str__ and the "user" column read the related user
+    list_select_related = ['user']
+    show_full_result_count = False
     readonly_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']
     
@@ -20,12 +75,16 @@ class MerchantAdmin(admin.ModelAdmin):
     )
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     list_display = ['id', 'merchant', 'amount', 'type', 'description', 'created_at']
     list_filter = ['type', 'created_at']
     search_fields = ['merchant__user__username', 'merchant__business_name', 'description']
+    # The "merchant" column renders Merchant.__str__, which reads merchant.user
+    list_select_related = ['merchant__user']
+    show_full_result_count = False
     readonly_fields = ['created_at']
     ordering = ['-created_at']
+    change_list_template = 'admin/sneat_app/transaction/change_list.html'
     
     fieldsets = (
         ('Transaction Details', {
@@ -36,3 +95,59 @@ class TransactionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_queryset(self, request):
+        # The change form's title is Transaction.__str__, which reads merchant.user too
+        return super().get_queryset(request).select_related('merchant__user')
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'merchant':
+            # The merchant options render Merchant.__str__, which reads merchant.user
+            kwargs['queryset'] = Merchant.objects.select_related('user').only(
+                'id', 'business_name', 'user__first_name', 'user__last_name',
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+    
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='sneat_app_transaction_import'),
+        ] + super().get_urls()
+    
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:sneat_app_transaction_changelist')
+        
+        form = TransactionImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            errors_dir = os.path.join(settings.MEDIA_ROOT, 'imports')
+            os.makedirs(errors_dir, exist_ok=True)
+            errors_path = os.path.join(errors_dir, f"{timezone.now():%Y%m%d-%H%M%S}-{os.path.basename(upload.name)}.errors.csv")
+            
+            with open(errors_path, 'w', newline='', encoding='utf-8') as errors:
+                result = imports.import_transactions(
+                    imports.open_text(upload),
+                    source=f'upload:{upload.name}:{upload.size}',
+                    file_format=imports.detect_format(upload.name),
+                    error_output=errors,
+                    resume=form.cleaned_data['resume'],
+                )
+            
+            messages.success(
+                request,
+                f'Imported {result.inserted} transactions in {result.elapsed:.1f}s '
+                f'({result.rows_per_second:,.0f} rows/sec).'
+            )
+            if result.rejected:
+                messages.warning(request, f'{result.rejected} rows were rejected; see {errors_path}')
+            else:
+                os.remove(errors_path)
+            return redirect('admin:sneat_app_transaction_changelist')
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import transactions',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/sneat_app/transaction/import.html', context)
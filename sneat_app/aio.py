@@ -0,0 +1,78 @@
+"""
+Helpers for async views.
+
+Django's ORM and templates are synchronous. ``run_sync`` runs a function on
+a shared pool of ``SNEAT_ASYNC_QUERY_THREADS`` threads rather than on the
+request's single sync thread, so independent queries started together with
+``gather`` run at the same time, each on its own connection, and the view's
+coroutine holds no thread while it waits for them. The pool is shared by
+every request in the process, so it, not the number of open requests,
+bounds how many queries wait on the database at once.
+
+Pool threads outlive requests, so ``run_sync`` does the connection
+housekeeping Django does at the end of a request. Set
+``SNEAT_ASYNC_QUERIES = False`` to run everything on the request's sync
+thread instead, e.g. in ``TestCase``, whose test transaction is only
+visible on the main thread's connection.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+
+DEFAULT_QUERY_THREADS = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """The pool ``run_sync`` uses; its size caps the queries in flight per process."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                getattr(settings, 'SNEAT_ASYNC_QUERY_THREADS', DEFAULT_QUERY_THREADS),
+                thread_name_prefix='sneat-query',
+            )
+        return _executor
+
+
+def run_sync(func, *args, **kwargs):
+    if not getattr(settings, 'SNEAT_ASYNC_QUERIES', True):
+        return sync_to_async(func)(*args, **kwargs)
+
+    def call():
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False, executor=executor())()
+
+
+async def gather(*funcs):
+    """Run each zero-argument function with ``run_sync``, concurrently."""
+    return await asyncio.gather(*(run_sync(func) for func in funcs))
+
+
+def user_passes_test(test_func):
+    """``django.contrib.auth.decorators.user_passes_test`` for async views."""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            # Load the user once; sync code on other threads then reads it from request.user.
+            request.user = await request.auser()
+            if test_func(request.user):
+                return await view_func(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path())
+        return wrapper
+    return decorator
+
+
+login_required = user_passes_test(lambda user: user.is_authenticated)
@@ -0,0 +1,183 @@
+"""
+JSON API for machine-to-machine transaction ingestion.
+
+Requests authenticate with ``Authorization: Bearer <token>`` (see
+``manage.py create_api_token``). A request carrying an ``Idempotency-Key``
+header is processed at most once per user: the response is stored in the
+same database transaction as the rows it created, and retries with the
+same key get that stored response back instead of posting again.
+"""
+import hashlib
+import json
+import secrets
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from . import imports, writes
+from .models import ApiToken, IdempotencyKey
+
+DEFAULT_MAX_BATCH = 1000
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, errors=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.errors = errors
+
+
+def hash_token(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def create_token(user, name):
+    """Create a token for ``user`` and return ``(ApiToken, plaintext key)``."""
+    key = secrets.token_urlsafe(32)
+    return ApiToken.objects.create(user=user, name=name, key_hash=hash_token(key)), key
+
+
+def authenticate_token(request):
+    header = request.headers.get('Authorization', '')
+    scheme, _, key = header.partition(' ')
+    if scheme.lower() != 'bearer' or not key.strip():
+        raise ApiError(401, 'Missing bearer token.')
+    token = ApiToken.objects.select_related('user').filter(key_hash=hash_token(key.strip())).first()
+    if token is None or not token.user.is_active:
+        raise ApiError(401, 'Invalid token.')
+    if not token.user.is_superuser:
+        raise ApiError(403, 'This token may not create transactions.')
+    ApiToken.objects.filter(pk=token.pk).update(last_used_at=timezone.now())
+    return token.user
+
+
+def _error_response(error):
+    body = {'error': error.message}
+    if error.errors:
+        body['errors'] = error.errors
+    return JsonResponse(body, status=error.status)
+
+
+def serialize(obj):
+    return {
+        'id': obj.pk,
+        'merchant_id': obj.merchant_id,
+        'amount': str(obj.amount),
+        'type': obj.type,
+        'description': obj.description,
+        'created_at': obj.created_at.isoformat(),
+    }
+
+
+def _parse_body(request):
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        raise ApiError(400, 'Request body must be valid JSON.')
+
+
+def _create(rows):
+    """
+    Validate every row in one pass, then write them with a single
+    ``bulk_create``. The ledger, rollups and search index are updated once
+    for the whole batch, in a few set-based statements.
+    """
+    transactions, errors = imports.validate_batch(list(enumerate(rows)))
+    if errors:
+        raise ApiError(400, 'Validation failed; nothing was created.', [
+            {'index': index, 'error': message} for index, message, _ in errors
+        ])
+    return imports.insert_transactions(transactions, batch_size=len(transactions) or 1)
+
+
+def _idempotency_key(request):
+    key = request.headers.get('Idempotency-Key', '').strip()
+    max_length = IdempotencyKey._meta.get_field('key').max_length
+    if len(key) > max_length:
+        raise ApiError(400, f'Idempotency-Key must be at most {max_length} characters.')
+    return key
+
+
+def _handle(request, extract_rows, render):
+    try:
+        user = authenticate_token(request)
+        key = _idempotency_key(request)
+        raw_body = request.body
+        rows = extract_rows(_parse_body(request))
+    except ApiError as e:
+        return _error_response(e)
+
+    request_hash = hashlib.sha256(request.path.encode() + b'\n' + raw_body).hexdigest()
+    if key:
+        stored = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if stored is not None:
+            return _replay(stored, request_hash)
+
+    def write():
+        created = _create(rows)
+        body = render(created)
+        if key:
+            IdempotencyKey.objects.create(
+                user=user, key=key, request_hash=request_hash,
+                status_code=201, response_body=json.dumps(body),
+            )
+        return 201, body
+
+    try:
+        status, body = writes.run(write)
+    except ApiError as e:
+        return _error_response(e)
+    except IntegrityError:
+        # A concurrent request with the same key committed first; our rows were rolled back.
+        stored = IdempotencyKey.objects.filter(user=user, key=key).first() if key else None
+        if stored is None:
+            raise
+        return _replay(stored, request_hash)
+    return JsonResponse(body, status=status)
+
+
+def _replay(stored, request_hash):
+    if stored.request_hash != request_hash:
+        return JsonResponse(
+            {'error': 'Idempotency-Key was already used with a different request.'}, status=422
+        )
+    response = JsonResponse(json.loads(stored.response_body), status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+@csrf_exempt
+@require_POST
+def transaction_create(request):
+    def extract_rows(payload):
+        if not isinstance(payload, dict):
+            raise ApiError(400, 'Expected a JSON object.')
+        return [payload]
+
+    return _handle(request, extract_rows, lambda created: serialize(created[0]))
+
+
+@csrf_exempt
+@require_POST
+def transaction_batch_create(request):
+    max_batch = getattr(settings, 'SNEAT_API_MAX_BATCH', DEFAULT_MAX_BATCH)
+
+    def extract_rows(payload):
+        rows = payload.get('transactions') if isinstance(payload, dict) else None
+        if not isinstance(rows, list) or not rows:
+            raise ApiError(400, 'Expected {"transactions": [...]} with at least one transaction.')
+        if len(rows) > max_batch:
+            raise ApiError(413, f'A batch may contain at most {max_batch} transactions.')
+        if not all(isinstance(row, dict) for row in rows):
+            raise ApiError(400, 'Every transaction must be a JSON object.')
+        return rows
+
+    return _handle(
+        request, extract_rows,
+        lambda created: {'count': len(created), 'transactions': [serialize(obj) for obj in created]},
+    )
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class SneatAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sneat_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,250 @@
+"""
+Bundled, fingerprinted static assets.
+
+``manage.py build_assets`` concatenates the CSS and JS each page type loads
+into the bundles below, minifies them, names each file after a hash of its
+contents and writes ``.gz`` and ``.br`` variants next to it, plus a
+``manifest.json``. JS is minified with ``rjsmin`` and the ``.br`` files are
+written with ``brotli``, both in requirements.txt; without them the build
+still works (unminified JS, gzip only) and ``build_assets`` warns.
+
+Templates ask for bundles with the ``stylesheets()`` and ``scripts()``
+globals. When bundles are enabled (``SNEAT_ASSET_BUNDLES``) and built, each
+bundle is one ``<link>``/``<script>`` pointing at its hashed file, served
+by ``serve_bundle`` with a one-year immutable ``Cache-Control`` and the
+best precompressed variant the client accepts. Otherwise the original
+source files are linked one by one, as during development.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import FileResponse, Http404
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+from django.views.decorators.http import require_safe
+
+try:
+    import brotli
+except ImportError:  # bundles are still gzipped; build_assets warns
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:  # JS is concatenated but not minified; build_assets warns
+    rjsmin = None
+
+BUNDLES = {
+    'core.css': [
+        'assets/vendor/fonts/boxicons.css',
+        'assets/vendor/css/core.css',
+        'assets/vendor/css/theme-default.css',
+        'assets/css/demo.css',
+        'assets/vendor/libs/perfect-scrollbar/perfect-scrollbar.css',
+    ],
+    'auth.css': ['assets/vendor/css/pages/page-auth.css'],
+    'charts.css': ['assets/vendor/libs/apex-charts/apex-charts.css'],
+    # helpers.js and config.js must run in <head>, before the page renders
+    'head.js': ['assets/vendor/js/helpers.js', 'assets/js/config.js'],
+    'core.js': [
+        'assets/vendor/libs/jquery/jquery.js',
+        'assets/vendor/libs/popper/popper.js',
+        'assets/vendor/js/bootstrap.js',
+        'assets/vendor/libs/perfect-scrollbar/perfect-scrollbar.js',
+        'assets/vendor/js/menu.js',
+        'assets/js/main.js',
+    ],
+    'charts.js': [
+        'assets/vendor/libs/apex-charts/apexcharts.js',
+        'assets/js/dashboards-analytics.js',
+    ],
+    'live.js': ['assets/js/live-dashboard.js'],
+}
+
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+_CSS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)|(\s+)', re.DOTALL)
+_CSS_TIGHT_RE = re.compile(r'\s*([{};,])\s*')
+_CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+_manifest = {'mtime': None, 'entries': {}}
+
+
+def output_dir():
+    return str(getattr(settings, 'SNEAT_ASSET_ROOT', os.path.join(settings.STATIC_ROOT, 'bundles')))
+
+
+def bundle_url_prefix():
+    return f'{settings.STATIC_URL}bundles/'
+
+
+def read_source(path):
+    full_path = finders.find(path)
+    if full_path is None:
+        raise FileNotFoundError(f'Static file not found: {path}')
+    with open(full_path, encoding='utf-8') as source:
+        return source.read()
+
+
+def rewrite_css_urls(css, path):
+    """Point relative ``url()`` references at the source file's original location."""
+    base = posixpath.dirname(path)
+
+    def rewrite(match):
+        quote, target = match.groups()
+        if re.match(r'^(?:[a-z]+:|/|#)', target, re.IGNORECASE):
+            return match.group(0)
+        return f'url({quote}{settings.STATIC_URL}{posixpath.normpath(posixpath.join(base, target))}{quote})'
+
+    return _CSS_URL_RE.sub(rewrite, css)
+
+
+def minify_css(css):
+    """Drop comments and collapse whitespace, leaving quoted strings untouched."""
+    parts = []
+    last = 0
+    for match in _CSS_TOKEN_RE.finditer(css):
+        parts.append(css[last:match.start()])
+        string, comment, _ = match.groups()
+        parts.append(string if string else '' if comment else ' ')
+        last = match.end()
+    parts.append(css[last:])
+    # Tighten around structural characters outside strings only.
+    tokens = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', ''.join(parts))
+    tokens = [token if index % 2 else _CSS_TIGHT_RE.sub(r'\1', token) for index, token in enumerate(tokens)]
+    return ''.join(tokens).replace(';}', '}').strip()
+
+
+def minify_js(js):
+    return rjsmin.jsmin(js) if rjsmin else js
+
+
+def bundle_content(name):
+    if name.endswith('.css'):
+        return '\n'.join(minify_css(rewrite_css_urls(read_source(path), path)) for path in BUNDLES[name])
+    # Each file ends its own statements, so a stray missing semicolon cannot join two files.
+    return '\n;\n'.join(minify_js(read_source(path)) for path in BUNDLES[name])
+
+
+def _write(path, data):
+    with open(path, 'wb') as output:
+        output.write(data)
+
+
+def build(names=None, compress=True, clean=False):
+    """Write the bundles and the manifest; returns the manifest entries."""
+    directory = output_dir()
+    os.makedirs(directory, exist_ok=True)
+    entries = dict(load_manifest(directory)) if names else {}
+    for name in names or BUNDLES:
+        content = bundle_content(name).encode('utf-8')
+        stem, extension = name.rsplit('.', 1)
+        filename = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}.{extension}'
+        path = os.path.join(directory, filename)
+        _write(path, content)
+        entry = {
+            'file': filename,
+            'sources': BUNDLES[name],
+            'source_bytes': sum(os.path.getsize(finders.find(source)) for source in BUNDLES[name]),
+            'bytes': len(content),
+        }
+        if compress:
+            # mtime=0 keeps the .gz byte-for-byte reproducible between builds
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            entry['gzip_bytes'] = len(compressed)
+            _write(path + '.gz', compressed)
+            if brotli is not None:
+                compressed = brotli.compress(content)
+                entry['brotli_bytes'] = len(compressed)
+                _write(path + '.br', compressed)
+        entries[name] = entry
+
+    with open(os.path.join(directory, MANIFEST_NAME), 'w', encoding='utf-8') as manifest:
+        json.dump(entries, manifest, indent=2, sort_keys=True)
+    _manifest['mtime'] = None
+
+    if clean:
+        keep = {MANIFEST_NAME} | {
+            entry['file'] + suffix for entry in entries.values() for suffix in ('', '.gz', '.br')
+        }
+        for filename in os.listdir(directory):
+            if filename not in keep:
+                os.remove(os.path.join(directory, filename))
+    return entries
+
+
+def load_manifest(directory=None):
+    """The built manifest, re-read whenever ``build_assets`` rewrites it."""
+    path = os.path.join(directory or output_dir(), MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if _manifest['mtime'] != mtime:
+        with open(path, encoding='utf-8') as manifest:
+            _manifest['entries'] = json.load(manifest)
+        _manifest['mtime'] = mtime
+    return _manifest['entries']
+
+
+def bundle_urls(name):
+    if name not in BUNDLES:
+        raise KeyError(f'Unknown asset bundle: {name}')
+    if getattr(settings, 'SNEAT_ASSET_BUNDLES', not settings.DEBUG):
+        entry = load_manifest().get(name)
+        if entry is not None:
+            return [bundle_url_prefix() + entry['file']]
+    return [static(path) for path in BUNDLES[name]]
+
+
+def stylesheets(*names):
+    urls = [url for name in names for url in bundle_urls(name)]
+    return format_html_join('\n', '<link rel="stylesheet" href="{}" />', ((url,) for url in urls))
+
+
+def scripts(*names):
+    urls = [url for name in names for url in bundle_urls(name)]
+    return format_html_join('\n', '<script src="{}"></script>', ((url,) for url in urls))
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+@require_safe
+def serve_bundle(request, path):
+    """Serve a built bundle with immutable caching and its precompressed variant."""
+    if path not in {entry['file'] for entry in load_manifest().values()}:
+        raise Http404('Unknown bundle')
+    full_path = os.path.join(output_dir(), path)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type.endswith('javascript'):
+        content_type += '; charset=utf-8'
+
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    encoding = None
+    for coding, suffix in ENCODINGS:
+        if coding in accepted and os.path.exists(full_path + suffix):
+            encoding, full_path = coding, full_path + suffix
+            break
+
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Cache-Control'] = IMMUTABLE
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,58 @@
+"""
+Authentication by username or email, in one query and one password hash.
+
+The login form used to ``authenticate()`` the input as a username and, when
+that failed, look it up as an email (a full scan of ``auth_user``) and
+``authenticate()`` again, so every email login and every wrong password
+paid for two PBKDF2 hashes. ``EmailOrUsernameBackend`` finds the account
+with a single query that uses the username's unique index and the
+``auth_user_email_lower_idx`` expression index (migration 0009), then
+hashes exactly once: against the account's password, or against a
+throwaway one when there is no such account, so unknown accounts take as
+long to reject as wrong passwords.
+
+Usernames match exactly, emails case-insensitively. An exact username
+wins over another account's email; an email shared by several accounts
+signs none of them in.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Lower
+
+UserModel = get_user_model()
+
+
+def candidates(identifier):
+    """Accounts ``identifier`` may name, the exact username first; at most two."""
+    return UserModel._default_manager.alias(
+        email_lower=Lower('email'),
+    ).filter(
+        Q(**{UserModel.USERNAME_FIELD: identifier}) | Q(email_lower=identifier.lower()),
+    ).order_by(
+        Case(When(**{UserModel.USERNAME_FIELD: identifier}, then=Value(0)), default=Value(1)),
+    )[:2]
+
+
+def find_user(identifier):
+    """The account whose username is ``identifier``, else the only one with that email; or None."""
+    users = list(candidates(identifier))
+    if users and (users[0].get_username() == identifier or len(users) == 1):
+        return users[0]
+    return None
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        user = find_user(username)
+        if user is None:
+            # Run the hasher anyway so a missing account is not told apart by timing
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,486 @@
+"""
+End-to-end benchmarks of every route in ``sneat_app.urls``.
+
+``run()`` benchmarks one database per scale (number of transactions), each
+seeded once by ``sneat_app.seeding`` and kept under
+``SNEAT_BENCHMARK_ROOT`` for later runs. Seeding and measuring each run in
+a fresh spawned process pointed at that scale's database (through
+``SNEAT_DATABASE_PATH``), so peak RSS belongs to one scale's server work.
+
+``ROUTES`` says how to drive each named route: method, query, form or JSON
+body, and which roles send it. Every request goes through the project's
+``WSGIHandler``, as behind a real server, from ``concurrency`` client
+threads, signed in as a superuser, the largest merchant (by transactions),
+a plain user, or anonymously. Query counts come from
+``QueryInstrumentationMiddleware``. A route missing from ``ROUTES`` (and
+``SKIPPED``) is an error, so new routes cannot silently go unmeasured.
+
+Results are plain JSON; ``compare()`` flags regressions against a
+baseline run.
+"""
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.test import Client, override_settings
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from . import api, middleware, seeding
+from .models import Merchant, MerchantBalance
+
+DEFAULT_SCALES = (10000, 100000)
+DEFAULT_REQUESTS = 50
+DEFAULT_CONCURRENCY = 4
+DEFAULT_WARMUP = 3
+DEFAULT_THRESHOLD = 0.2
+# Latency changes smaller than this are noise, whatever the ratio
+MIN_LATENCY_DELTA_MS = 2.0
+PREFIX = 'bench'
+ROLES = ('superuser', 'merchant', 'user')
+HOST = 'localhost'
+# Every cache read misses, so each request runs its full set of queries.
+COLD_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Request(namedtuple('Request', ['method', 'kwargs', 'query', 'data', 'json', 'roles', 'signed_in', 'label'])):
+    """
+    How to call a route. ``kwargs``, ``query`` and ``data`` are dicts, or
+    callables taking ``(context, role)``. ``signed_in=False`` sends no
+    session (e.g. a login form posting the role's credentials). ``label``
+    tells apart requests to the same route that differ only in their body.
+    """
+    __slots__ = ()
+
+    def __new__(cls, method='GET', kwargs=None, query=None, data=None, json=False, roles=ROLES, signed_in=True,
+                label=None):
+        return super().__new__(cls, method, kwargs, query, data, json, roles, signed_in, label)
+
+
+def _credentials(context, role):
+    return {'username': context['users'][role].username, 'password': context['password']}
+
+
+def _email_credentials(context, role):
+    return {'username': context['users'][role].email, 'password': context['password']}
+
+
+def _wrong_password(context, role):
+    return {'username': context['users'][role].email, 'password': f'{context["password"]}-wrong'}
+
+
+def _unknown_account(context, role):
+    return {'username': f'{PREFIX}_nobody@example.com', 'password': context['password']}
+
+
+def _largest_merchant(context, role):
+    return {'merchant_id': context['largest_merchant']}
+
+
+def _target_merchant(context, role):
+    return {'merchant_id': context['target_merchant']}
+
+
+def _last_day(context, role):
+    return {'start': (timezone.now() - timedelta(days=1)).strftime('%Y-%m-%d')}
+
+
+def _transaction_form(context, role):
+    return {'merchant': context['target_merchant'], 'amount': '12.34', 'type': 'credit', 'description': 'Benchmark'}
+
+
+def _api_transaction(context, role):
+    return {'merchant_id': context['target_merchant'], 'amount': '12.34', 'type': 'credit', 'description': 'Benchmark'}
+
+
+def _api_batch(context, role):
+    return {'transactions': [_api_transaction(context, role)] * 20}
+
+
+ANONYMOUS = ('anonymous',)
+SUPERUSER = ('superuser',)
+
+ROUTES = {
+    'unified_login': [
+        Request(roles=ANONYMOUS),
+        Request('POST', data=_credentials, signed_in=False),
+        Request('POST', data=_email_credentials, signed_in=False, label='email'),
+        Request('POST', data=_wrong_password, roles=SUPERUSER, signed_in=False, label='wrong password'),
+        Request('POST', data=_unknown_account, roles=ANONYMOUS, label='unknown account'),
+    ],
+    'login': [Request(roles=ANONYMOUS)],
+    'register': [Request(roles=ANONYMOUS)],
+    # Anonymous: logging a role out would end the session its next requests use
+    'logout': [Request(roles=ANONYMOUS)],
+    'user_dashboard': [Request()],
+    'merchant_dashboard': [Request()],
+    'merchant_statement': [Request(), Request(query={'format': 'csv'}, roles=('merchant',))],
+    'super_admin_dashboard': [Request()],
+    'merchant_list': [
+        Request(),
+        Request(query={'search': 'coffee'}, roles=SUPERUSER),
+        Request(query={'status': 'inactive'}, roles=SUPERUSER),
+    ],
+    'merchant_add': [Request()],
+    'merchant_edit': [Request(kwargs=_target_merchant)],
+    # The confirmation page; posting it would leave nothing to measure
+    'merchant_delete': [Request(kwargs=_target_merchant)],
+    'merchant_toggle_status': [Request('POST', kwargs=_target_merchant)],
+    'merchant_statement_admin': [Request(kwargs=_largest_merchant)],
+    'transaction_list': [
+        Request(),
+        Request(query={'search': 'refund'}, roles=SUPERUSER),
+        Request(query={'type': 'debit'}, roles=SUPERUSER),
+    ],
+    'transaction_add': [Request(), Request('POST', data=_transaction_form, roles=SUPERUSER)],
+    'transaction_export': [Request(query=_last_day)],
+    'api_transaction_create': [Request('POST', data=_api_transaction, json=True)],
+    'api_transaction_batch_create': [Request('POST', data=_api_batch, json=True)],
+    'chart_revenue': [Request(), Request(query={'interval': 'month'}, roles=SUPERUSER)],
+    'reports': [Request()],
+    'settings_profile': [Request()],
+    'dashboard': [Request()],
+    'cards': [Request()],
+    'forms': [Request()],
+    'tables': [Request()],
+    'ui': [Request()],
+    'pages': [Request()],
+    'layouts': [Request()],
+}
+# Routes that cannot be driven request by request, and where they are measured instead
+SKIPPED = {
+    'live_events': 'a long-lived event stream; see manage.py loadtest_live',
+}
+
+
+def route_names():
+    """Every named route of the ``sneat_app`` namespace."""
+    _, resolver = get_resolver().namespace_dict['sneat_app']
+    return {name for name in resolver.reverse_dict if isinstance(name, str)}
+
+
+def check_routes():
+    missing = route_names() - set(ROUTES) - set(SKIPPED)
+    if missing:
+        raise BenchmarkError(f'No benchmark for route(s): {", ".join(sorted(missing))}. Add them to ROUTES.')
+
+
+def _resolve(value, context, role):
+    return value(context, role) if callable(value) else (value or {})
+
+
+def scenario_key(route, role, request):
+    """Names a scenario the same way in every run, whatever ids or dates it resolves to."""
+    query = f'?{urlencode(request.query)}' if isinstance(request.query, dict) else ''
+    label = f' ({request.label})' if request.label else ''
+    return f'{request.method} {route}{query}{label} as {role}'
+
+
+def scenarios(routes=None, roles=None):
+    """``(key, route, role, request)`` for every request to run, optionally only some routes/roles."""
+    check_routes()
+    for route, requests in ROUTES.items():
+        if routes and route not in routes:
+            continue
+        for request in requests:
+            for role in request.roles:
+                if roles and role not in roles:
+                    continue
+                yield scenario_key(route, role, request), route, role, request
+
+
+def database_path(scale, directory=None):
+    directory = Path(directory or getattr(settings, 'SNEAT_BENCHMARK_ROOT', 'benchmarks'))
+    return directory / f'scale-{scale}.sqlite3'
+
+
+def scale_parameters(scale):
+    """Merchants and plain users seeded alongside ``scale`` transactions."""
+    return {'merchants': max(50, min(scale // 1000, 10000)), 'users': 100}
+
+
+def prepare(scale, seed=0):
+    """Migrate and seed the current database for ``scale``. Runs in the benchmark's child process."""
+    call_command('migrate', verbosity=0)
+    result = seeding.seed(transactions=scale, seed=seed, prefix=PREFIX, **scale_parameters(scale))
+    User.objects.create_superuser(f'{PREFIX}_admin', f'{PREFIX}_admin@example.com', seeding.DEFAULT_PASSWORD)
+    return result['timings']
+
+
+def fixture():
+    """Users, sessions, API tokens and merchants the scenarios refer to."""
+    users = {
+        'superuser': User.objects.filter(username=f'{PREFIX}_admin').first(),
+        'merchant': User.objects.filter(
+            merchant_profile__pk=MerchantBalance.objects.order_by('-transaction_count').values('merchant_id')[:1],
+        ).first(),
+        'user': User.objects.filter(username__startswith=f'{PREFIX}_user_').order_by('pk').first(),
+    }
+    missing = [role for role, user in users.items() if user is None]
+    if missing:
+        raise BenchmarkError(f'The benchmark database has no {", ".join(missing)} to sign in as.')
+    cookies, tokens = {}, {}
+    for role, user in users.items():
+        client = Client()
+        client.force_login(user)
+        cookies[role] = client.cookies[settings.SESSION_COOKIE_NAME].value
+        tokens[role] = api.create_token(user, 'benchmark')[1]
+    return {
+        'users': users,
+        'password': seeding.DEFAULT_PASSWORD,
+        'sessions': cookies,
+        'tokens': tokens,
+        'csrf': get_random_string(CSRF_SECRET_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS),
+        'largest_merchant': users['merchant'].merchant_profile.pk,
+        # Mutating routes (toggle, add) work on a small merchant, away from the largest one's caches
+        'target_merchant': Merchant.objects.order_by('-pk').values_list('pk', flat=True).first(),
+    }
+
+
+def environ(context, route, role, request):
+    """The WSGI environ (without ``wsgi.input``) and body of ``request`` to ``route`` as ``role``."""
+    query = _resolve(request.query, context, role)
+    path = reverse(f'sneat_app:{route}', kwargs=_resolve(request.kwargs, context, role))
+    data = _resolve(request.data, context, role)
+    if request.method == 'GET':
+        body, content_type = b'', ''
+    elif request.json:
+        body, content_type = json.dumps(data).encode(), 'application/json'
+    else:
+        body, content_type = urlencode(data).encode(), 'application/x-www-form-urlencoded'
+    cookies = [f'{settings.CSRF_COOKIE_NAME}={context["csrf"]}']
+    if role in context['sessions'] and request.signed_in:
+        cookies.append(f'{settings.SESSION_COOKIE_NAME}={context["sessions"][role]}')
+    result = {
+        'REQUEST_METHOD': request.method,
+        'PATH_INFO': path,
+        'QUERY_STRING': urlencode(query),
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'HTTP_HOST': HOST,
+        'HTTP_COOKIE': '; '.join(cookies),
+        'HTTP_X_CSRFTOKEN': context['csrf'],
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.url_scheme': 'http',
+    }
+    if request.json and role in context['tokens']:
+        result['HTTP_AUTHORIZATION'] = f'Bearer {context["tokens"][role]}'
+    return result, body
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(len(ordered) * percent / 100), 1) - 1]
+
+
+def drive(handler, context, route, role, request, requests, concurrency, warmup=0):
+    """Send ``requests`` requests from ``concurrency`` threads; returns latencies, statuses, metrics, elapsed."""
+    base, body = environ(context, route, role, request)
+
+    def send():
+        statuses = []
+        started = time.perf_counter()
+        request_environ = dict(base, **{'wsgi.input': io.BytesIO(body), 'wsgi.errors': io.StringIO()})
+        response = handler(request_environ, lambda status, headers: statuses.append(status))
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return time.perf_counter() - started, int(statuses[0].split()[0])
+
+    for _ in range(warmup):
+        send()
+
+    captured = []
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+
+    def client():
+        results = []
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return results
+            results.append(send())
+
+    middleware.listeners.append(captured.append)
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = [result for future in [pool.submit(client) for _ in range(concurrency)] for result in future.result()]
+        elapsed = time.perf_counter() - started
+    finally:
+        middleware.listeners.remove(captured.append)
+    return [latency for latency, _ in results], Counter(status for _, status in results), captured, elapsed
+
+
+def measure(requests=DEFAULT_REQUESTS, concurrency=DEFAULT_CONCURRENCY, warmup=DEFAULT_WARMUP, routes=None,
+            roles=None, cold=False):
+    """Drive every scenario against the current database. Runs in the benchmark's child process."""
+    context = fixture()
+    handler = WSGIHandler()
+    results = []
+    # No rate limits: every request comes from one address as fast as it is answered
+    with override_settings(SNEAT_RATE_LIMITS={}, **({'CACHES': COLD_CACHES} if cold else {})):
+        for key, route, role, request in scenarios(routes, roles):
+            latencies, statuses, metrics, elapsed = drive(
+                handler, context, route, role, request, requests, concurrency, warmup,
+            )
+            latencies.sort()
+            queries = [metric.queries for metric in metrics]
+            request_environ, _ = environ(context, route, role, request)
+            path = request_environ['PATH_INFO']
+            results.append({
+                'key': key,
+                'route': route,
+                'role': role,
+                'method': request.method,
+                'path': f'{path}?{request_environ["QUERY_STRING"]}' if request_environ['QUERY_STRING'] else path,
+                'requests': len(latencies),
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+                'throughput': len(latencies) / elapsed if elapsed else None,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'mean_queries': sum(queries) / len(queries) if queries else None,
+                'max_queries': max(queries, default=None),
+                # ru_maxrss is the process peak so far (KiB on Linux)
+                'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            })
+    return results
+
+
+@contextmanager
+def _database(path):
+    """Point processes spawned inside the block at ``path``."""
+    previous = os.environ.get('SNEAT_DATABASE_PATH')
+    os.environ['SNEAT_DATABASE_PATH'] = str(path)
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ['SNEAT_DATABASE_PATH']
+        else:
+            os.environ['SNEAT_DATABASE_PATH'] = previous
+
+
+def _in_child(path, function, *args, **kwargs):
+    # spawn, so the child reads its settings (and database path) afresh
+    with _database(path), ProcessPoolExecutor(
+        1, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+    ) as pool:
+        return pool.submit(function, *args, **kwargs).result()
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'database': settings.DATABASES['default']['ENGINE'],
+        'debug': settings.DEBUG,
+    }
+
+
+def run(scales=DEFAULT_SCALES, directory=None, reseed=False, seed=0, progress=None, **options):
+    """
+    Seed (if needed) and benchmark each scale. ``options`` go to ``measure()``.
+    ``progress`` is called with ``(scale, step)`` as each step starts.
+    Returns the results document.
+    """
+    check_routes()
+    document = {
+        'created_at': timezone.now().isoformat(),
+        'environment': environment(),
+        'options': {'seed': seed, **options},
+        'scales': {},
+    }
+    for scale in scales:
+        path = database_path(scale, directory)
+        entry = document['scales'][str(scale)] = {}
+        if reseed and path.exists():
+            path.unlink()
+        if not path.exists():
+            if progress is not None:
+                progress(scale, 'seed')
+            path.parent.mkdir(parents=True, exist_ok=True)
+            entry['seed_timings'] = _in_child(path, prepare, scale, seed)
+        if progress is not None:
+            progress(scale, 'measure')
+        entry['database_bytes'] = path.stat().st_size
+        entry['results'] = _in_child(path, measure, **options)
+    return document
+
+
+def server_errors(document):
+    """``(scale, key, count)`` for every scenario answered with a 5xx status at least once."""
+    errors = []
+    for scale, entry in document['scales'].items():
+        for result in entry['results']:
+            count = sum(number for status, number in result['statuses'].items() if status.startswith('5'))
+            if count:
+                errors.append((scale, result['key'], count))
+    return errors
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    ``(scale, key, metric, before, after)`` for every regression of
+    ``current`` against ``baseline``: latency or peak RSS up, or throughput
+    down, by more than ``threshold``; more queries; or different statuses.
+    """
+    regressions = []
+    for scale, entry in current['scales'].items():
+        before_entry = baseline.get('scales', {}).get(scale)
+        if before_entry is None:
+            continue
+        before_results = {result['key']: result for result in before_entry.get('results', [])}
+        for after in entry['results']:
+            before = before_results.get(after['key'])
+            if before is None:
+                continue
+            found = []
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+                if (after[metric] > before[metric] * (1 + threshold)
+                        and after[metric] - before[metric] > MIN_LATENCY_DELTA_MS):
+                    found.append(metric)
+            if after['throughput'] < before['throughput'] * (1 - threshold):
+                found.append('throughput')
+            if (after['max_queries'] or 0) > (before['max_queries'] or 0):
+                found.append('max_queries')
+            if after['statuses'] != before['statuses']:
+                found.append('statuses')
+            regressions.extend((scale, after['key'], metric, before[metric], after[metric]) for metric in found)
+        before_rss = max((result['peak_rss_kb'] for result in before_entry.get('results', [])), default=0)
+        after_rss = max((result['peak_rss_kb'] for result in entry['results']), default=0)
+        if before_rss and after_rss > before_rss * (1 + threshold):
+            regressions.append((scale, 'process', 'peak_rss_kb', before_rss, after_rss))
+    return regressions
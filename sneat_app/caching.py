@@ -0,0 +1,182 @@
+"""
+Versioned cache for values derived from many rows (dashboard statistics).
+
+Every cached value names the *generations* it depends on, e.g.
+``('merchants', 'transactions')``. A generation is a counter in the cache
+that ``signals.py`` bumps after any write to those tables commits, so a
+value computed under an older generation is stale the moment data changes,
+without having to know which keys to delete.
+
+A stale or expired value is recomputed by one caller only: the first to
+take a short ``cache.add`` lock recomputes while everyone else keeps
+serving the previous value. Values also go stale after ``fresh_for``
+seconds even if no generation moved (for time-windowed numbers), and are
+evicted after ``SNEAT_CACHE_MAX_AGE``.
+
+Hits and misses are counted per name in the cache itself, so
+``hit_rates()`` (and ``manage.py cache_stats``) see every process.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .middleware import current_metrics
+from .replicas import read_primary
+
+MERCHANTS = 'merchants'
+TRANSACTIONS = 'transactions'
+
+DEFAULT_FRESH_FOR = 300
+DEFAULT_MAX_AGE = 24 * 60 * 60
+LOCK_TIMEOUT = 30
+# How long a caller with nothing to serve waits for another caller's recomputation
+WAIT_TIMEOUT = 5
+WAIT_INTERVAL = 0.05
+
+# Names this process has already added to the shared registry of counted names
+_counted_names = set()
+COUNTED_NAMES_KEY = 'sneat:counted-names'
+
+
+def get_cache():
+    return caches[getattr(settings, 'SNEAT_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(name):
+    return f'sneat:generation:{name}'
+
+
+def generations(names):
+    """Current generation of each name; missing counters read as 0."""
+    keys = {_generation_key(name): name for name in names}
+    found = get_cache().get_many(list(keys))
+    return tuple(found.get(key, 0) for key in keys)
+
+
+def _bumped_at_key(name):
+    return f'sneat:bumped-at:{name}'
+
+
+def bump(*names):
+    """Invalidate everything cached against ``names``."""
+    cache = get_cache()
+    now = time.time()
+    for name in names:
+        key = _generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted or never set: restart from the clock so old versions are never reused.
+            cache.set(key, time.time_ns(), None)
+    cache.set_many({_bumped_at_key(name): now for name in names}, None)
+
+
+def bumped_at(names):
+    """Latest time (a Unix timestamp) any of ``names`` was bumped, or None if unknown."""
+    found = get_cache().get_many([_bumped_at_key(name) for name in names])
+    return max(found.values()) if found else None
+
+
+def set_bumped_at(name, timestamp):
+    """Record ``timestamp`` for ``name`` unless a bump already recorded one."""
+    get_cache().add(_bumped_at_key(name), timestamp, None)
+
+
+def merchant_generation(merchant_id):
+    return f'merchant:{merchant_id}'
+
+
+def user_generation(user_id):
+    return f'user:{user_id}'
+
+
+def _counter(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def record(name, hit):
+    """Count a hit or miss for ``name`` and report it on the current request."""
+    if not getattr(settings, 'SNEAT_CACHE_STATS', True):
+        return
+    cache = get_cache()
+    _counter(cache, f'sneat:{"hits" if hit else "misses"}:{name}')
+    if name not in _counted_names:
+        names = cache.get(COUNTED_NAMES_KEY) or set()
+        if name not in names:
+            cache.set(COUNTED_NAMES_KEY, names | {name}, None)
+        _counted_names.add(name)
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.record_cache(hit)
+
+
+def hit_rates():
+    """``{name: (hits, misses, hit_rate)}`` for every counted name."""
+    cache = get_cache()
+    names = sorted(cache.get(COUNTED_NAMES_KEY) or ())
+    counts = cache.get_many([f'sneat:{kind}:{name}' for name in names for kind in ('hits', 'misses')])
+    rates = {}
+    for name in names:
+        hits = counts.get(f'sneat:hits:{name}', 0)
+        misses = counts.get(f'sneat:misses:{name}', 0)
+        rates[name] = (hits, misses, hits / (hits + misses) if hits + misses else 0.0)
+    return rates
+
+
+def reset_hit_rates():
+    cache = get_cache()
+    names = cache.get(COUNTED_NAMES_KEY) or ()
+    cache.delete_many([f'sneat:{kind}:{name}' for name in names for kind in ('hits', 'misses')])
+
+
+def bump_on_commit(*names):
+    """Bump once the current transaction commits, so no reader caches uncommitted data."""
+    transaction.on_commit(lambda: bump(*names))
+
+
+def cached(name, compute, depends_on=(), fresh_for=DEFAULT_FRESH_FOR):
+    """
+    Return ``compute()``, cached under ``name`` until a generation in
+    ``depends_on`` moves or ``fresh_for`` seconds pass.
+    """
+    cache = get_cache()
+    key = f'sneat:cached:{name}'
+    version = generations(depends_on)
+    entry = cache.get(key)
+    if entry is not None and entry['version'] == version and entry['fresh_until'] > time.time():
+        record(name, hit=True)
+        return entry['value']
+    record(name, hit=False)
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if entry is not None:
+            # Someone else is recomputing; the previous value will do until they finish.
+            return entry['value']
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['value']
+        # The recomputing caller died or is very slow; compute without the lock.
+        return compute()
+
+    try:
+        # Stored under the current generation, so never read from a lagging replica
+        with read_primary():
+            value = compute()
+        cache.set(key, {
+            'version': version,
+            'fresh_until': time.time() + fresh_for,
+            'value': value,
+        }, getattr(settings, 'SNEAT_CACHE_MAX_AGE', DEFAULT_MAX_AGE))
+        return value
+    finally:
+        cache.delete(lock_key)
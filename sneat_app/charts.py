@@ -0,0 +1,220 @@
+"""
+Revenue time series for the dashboard charts.
+
+``revenue_series`` answers a window of daily, weekly or monthly credit and
+debit totals with one grouped query over the ``RevenueRollup`` rows (weeks
+are summed from daily rows), fills empty buckets with zero, and merges
+adjacent buckets when there are more than the chart has room for, so the
+payload never outgrows the chart's width.
+
+The ``revenue`` view serves it as JSON with an ETag built from the
+``transactions`` generation and a Last-Modified from when that generation
+was last bumped, both read from the cache. A dashboard polling a chart
+whose data has not changed gets a 304 without the series being queried.
+Computed series are cached under the same ETag.
+"""
+import hashlib
+import math
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
+
+from . import caching, rollups
+from .models import Merchant, RevenueRollup, Transaction
+from .replicas import read_primary
+
+INTERVALS = ('day', 'week', 'month')
+# Buckets shown when the request does not say
+DEFAULT_PERIODS = {'day': 30, 'week': 26, 'month': 12}
+MAX_PERIODS = 1000
+DEFAULT_POINTS = 120
+MAX_POINTS = 1000
+
+TRUNCATORS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+ZERO = Decimal('0.00')
+
+
+def period_start(value, interval):
+    """Start of the UTC day, ISO week (Monday) or month containing ``value``."""
+    start = rollups.bucket_start(value, 'month' if interval == 'month' else 'day')
+    if interval == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def next_period(start, interval):
+    if interval == 'day':
+        return start + timedelta(days=1)
+    if interval == 'week':
+        return start + timedelta(weeks=1)
+    return rollups._next_month(start)
+
+
+def window(interval, periods, now=None):
+    """Starts of the last ``periods`` buckets, oldest first, ending with the current one."""
+    start = period_start(now or timezone.now(), interval)
+    starts = [start]
+    while len(starts) < periods:
+        start = period_start(start - timedelta(days=1), interval)
+        starts.append(start)
+    return starts[::-1]
+
+
+def downsample(starts, series, points):
+    """
+    Merge runs of adjacent buckets so at most ``points`` remain.
+
+    Totals are summed, so the chart still adds up. Runs end at the newest
+    bucket; only the oldest point may cover fewer buckets than the rest.
+    Returns ``(starts, series, buckets_per_point)``.
+    """
+    size = math.ceil(len(starts) / points)
+    if size <= 1:
+        return starts, series, 1
+    first = len(starts) % size or size
+    bounds = [0, *range(first, len(starts), size)]
+    ends = [*bounds[1:], len(starts)]
+    merged = {
+        name: [sum(values[lo:hi], ZERO) for lo, hi in zip(bounds, ends)]
+        for name, values in series.items()
+    }
+    return [starts[lo] for lo in bounds], merged, size
+
+
+def revenue_series(interval='day', periods=None, merchant_id=None, points=DEFAULT_POINTS, now=None):
+    """Credit and debit totals per bucket for one merchant, or all of them when ``merchant_id`` is None."""
+    starts = window(interval, periods or DEFAULT_PERIODS[interval], now)
+    end = next_period(starts[-1], interval)
+
+    rows = RevenueRollup.objects.filter(
+        granularity='month' if interval == 'month' else 'day',
+        bucket_start__gte=starts[0],
+        bucket_start__lt=end,
+        merchant_id=merchant_id,
+    ).order_by().annotate(
+        period=TRUNCATORS[interval]('bucket_start', tzinfo=dt_timezone.utc),
+    ).values('period', 'type').annotate(total_sum=Sum('total'))
+
+    positions = {start: position for position, start in enumerate(starts)}
+    series = {type_: [ZERO] * len(starts) for type_, _ in Transaction.TYPE_CHOICES}
+    for row in rows:
+        series[row['type']][positions[rollups._utc(row['period'])]] += row['total_sum']
+
+    labels, series, size = downsample(starts, series, points)
+    return {
+        'interval': interval,
+        'merchant': merchant_id,
+        'start': starts[0],
+        'end': end,
+        'buckets_per_point': size,
+        'labels': [start.date().isoformat() for start in labels],
+        # Plotted, not summed again, so floats are precise enough.
+        'series': {type_: [float(total) for total in totals] for type_, totals in series.items()},
+    }
+
+
+def _bounded_int(data, name, default, maximum):
+    value = data.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a whole number.')
+    if not 1 <= value <= maximum:
+        raise ValueError(f'{name} must be between 1 and {maximum}.')
+    return value
+
+
+def parse_params(data):
+    """``revenue_series`` arguments from a query string; raises ValueError when malformed."""
+    interval = data.get('interval') or 'day'
+    if interval not in INTERVALS:
+        raise ValueError(f'interval must be one of: {", ".join(INTERVALS)}.')
+    merchant_id = data.get('merchant') or None
+    if merchant_id is not None:
+        try:
+            merchant_id = int(merchant_id)
+        except ValueError:
+            raise ValueError('merchant must be a merchant id.')
+    return {
+        'interval': interval,
+        'periods': _bounded_int(data, 'periods', DEFAULT_PERIODS[interval], MAX_PERIODS),
+        'merchant_id': merchant_id,
+        'points': _bounded_int(data, 'points', DEFAULT_POINTS, MAX_POINTS),
+    }
+
+
+def last_modified(current_start):
+    """When the chart last changed: the last transactions bump, or the current bucket opening."""
+    bumped = caching.bumped_at([caching.TRANSACTIONS])
+    if bumped is None:
+        # The cache was cleared; recover from the rollups once and remember it.
+        with read_primary():
+            latest = RevenueRollup.objects.aggregate(latest=Max('updated_at'))['latest']
+        bumped = latest.timestamp() if latest else 0
+        caching.set_bumped_at(caching.TRANSACTIONS, bumped)
+    return math.ceil(max(bumped, current_start.timestamp()))
+
+
+@require_GET
+@login_required
+def revenue(request):
+    """
+    ``GET ?interval=day|week|month&periods=&points=&merchant=``
+
+    Super admins may chart any merchant, or all of them by leaving out
+    ``merchant``; a merchant always gets their own series.
+    """
+    try:
+        params = parse_params(request.GET)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    if not request.user.is_superuser:
+        own = None
+        if request.user.is_staff:
+            own = Merchant.objects.filter(user=request.user).values_list('pk', flat=True).first()
+        if own is None or params['merchant_id'] not in (None, own):
+            return HttpResponseForbidden()
+        params['merchant_id'] = own
+
+    now = timezone.now()
+    current_start = period_start(now, params['interval'])
+    # The window moves when a new bucket opens, so its position is part of the ETag.
+    version = (sorted(params.items()), current_start.isoformat(), caching.generations([caching.TRANSACTIONS]))
+    digest = hashlib.md5(repr(version).encode()).hexdigest()
+    etag = quote_etag(digest)
+    modified = last_modified(current_start)
+
+    response = get_conditional_response(request, etag=etag, last_modified=modified)
+    if response is None:
+        cache = caching.get_cache()
+        key = f'sneat:chart:revenue:{digest}'
+        series = cache.get(key)
+        caching.record('chart:revenue', hit=series is not None)
+        if series is None:
+            # Cached and tagged under the current generation, so read from the primary
+            with read_primary():
+                series = revenue_series(now=now, **params)
+            cache.set(key, series, getattr(settings, 'SNEAT_CACHE_MAX_AGE', caching.DEFAULT_MAX_AGE))
+        response = JsonResponse(series)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    # Stored by the browser but revalidated on every poll.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,126 @@
+"""
+Streaming transaction exports.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` so no model
+instances are built and only one chunk is held in memory at a time, and they
+are encoded and yielded as they arrive so the first bytes go out right away.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import search
+from .models import Transaction
+
+DEFAULT_CHUNK_SIZE = 2000
+
+COLUMNS = [
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('merchant_id', 'merchant_id'),
+    ('business_name', 'merchant__business_name'),
+    ('username', 'merchant__user__username'),
+    ('type', 'type'),
+    ('amount', 'amount'),
+    ('description', 'description'),
+]
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_day(value, end=False):
+    """Parse ``YYYY-MM-DD`` into an aware datetime (exclusive upper bound when ``end``)."""
+    if not value:
+        return None
+    try:
+        # None when malformed; ValueError for impossible days such as 2024-02-30
+        day = parse_date(value)
+        if day is not None and end:
+            day += timedelta(days=1)
+    except (ValueError, OverflowError):
+        day = None
+    if day is None:
+        raise ExportError(f'Invalid date: {value!r}. Use YYYY-MM-DD.')
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(search_query='', type_filter='', start=None, end=None):
+    """Transactions matching the ``transaction_list`` filters plus a ``[start, end)`` range."""
+    transactions = Transaction.objects.all()
+    if type_filter:
+        transactions = transactions.filter(type=type_filter)
+    if start is not None:
+        transactions = transactions.filter(created_at__gte=start)
+    if end is not None:
+        transactions = transactions.filter(created_at__lt=end)
+    if search_query:
+        transactions = search.filter_queryset(transactions, search_query)
+    return transactions.order_by('pk')
+
+
+def iter_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    return queryset.values_list(*[lookup for _, lookup in COLUMNS]).iterator(chunk_size=chunk_size)
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class _Echo:
+    """File-like object whose ``write`` just returns the value, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, header=True, batch_size=DEFAULT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    buffer = []
+    if header:
+        buffer.append(writer.writerow([name for name, _ in COLUMNS]))
+    for row in rows:
+        buffer.append(writer.writerow([_text(value) for value in row]))
+        if len(buffer) >= batch_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_jsonl(rows, batch_size=DEFAULT_CHUNK_SIZE):
+    names = [name for name, _ in COLUMNS]
+    buffer = []
+    for row in rows:
+        record = dict(zip(names, row))
+        record['created_at'] = _text(record['created_at'])
+        record['amount'] = _text(record['amount'])
+        buffer.append(json.dumps(record, separators=(',', ':')) + '\n')
+        if len(buffer) >= batch_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream(queryset, export_format='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the export as text chunks of roughly ``chunk_size`` rows each."""
+    if export_format not in FORMATS:
+        raise ExportError(f'Unsupported format: {export_format!r}. Use one of: {", ".join(FORMATS)}.')
+    rows = iter_rows(queryset, chunk_size=chunk_size)
+    if export_format == 'jsonl':
+        return iter_jsonl(rows, batch_size=chunk_size)
+    return iter_csv(rows, batch_size=chunk_size)
@@ -0,0 +1,90 @@
+"""
+Model fields.
+
+``MinorUnitsField`` stores a money amount as an integer count of minor units
+(cents) in a ``BIGINT`` column but reads and writes ``Decimal`` in Python,
+so forms, the admin and ``Sum()`` keep working in currency units. Sums are
+exact integer additions in the database instead of ``REAL`` arithmetic on
+SQLite, and the range is that of a 64-bit integer rather than
+``max_digits``.
+
+To skip the ``Decimal`` conversion, e.g. to load millions of amounts into
+NumPy (``sneat_app.analytics``), select ``minor_units('amount')``, which
+returns the stored integers.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django import forms
+from django.core import exceptions, validators
+from django.db import models
+from django.db.models import ExpressionWrapper, F
+
+
+class MinorUnitsField(models.Field):
+    description = 'Money amount stored as an integer number of minor units'
+
+    def __init__(self, *args, decimal_places=2, max_digits=18, **kwargs):
+        # max_digits keeps amounts inside a signed 64-bit integer of minor units.
+        self.decimal_places = decimal_places
+        self.max_digits = max_digits
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.decimal_places != 2:
+            kwargs['decimal_places'] = self.decimal_places
+        if self.max_digits != 18:
+            kwargs['max_digits'] = self.max_digits
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'BigIntegerField'
+
+    @property
+    def validators(self):
+        return [*super().validators, validators.DecimalValidator(self.max_digits, self.decimal_places)]
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value))
+        except (InvalidOperation, ValueError):
+            raise exceptions.ValidationError(
+                self.error_messages['invalid'], code='invalid', params={'value': value},
+            )
+
+    def to_minor_units(self, value):
+        """``Decimal('12.34')`` -> ``1234``, rounding past ``decimal_places`` as ``DecimalField`` does."""
+        value = self.to_python(value)
+        return int(value.quantize(Decimal(1).scaleb(-self.decimal_places)).scaleb(self.decimal_places))
+
+    def from_minor_units(self, value):
+        return Decimal(value).scaleb(-self.decimal_places)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        return self.to_minor_units(value)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        if isinstance(value, float):
+            # e.g. Avg(); keep the fraction of a minor unit
+            return Decimal(str(value)).scaleb(-self.decimal_places)
+        return self.from_minor_units(value)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{
+            'form_class': forms.DecimalField,
+            'max_digits': self.max_digits,
+            'decimal_places': self.decimal_places,
+            **kwargs,
+        })
+
+
+def minor_units(name):
+    """Select a ``MinorUnitsField`` column as its stored integers."""
+    return ExpressionWrapper(F(name), output_field=models.BigIntegerField())
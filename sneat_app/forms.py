@@ -28,13 +28,8 @@ class UnifiedLoginForm(AuthenticationForm):
         password = self.cleaned_data.get('password')
         
         if username and password:
-            user = authenticate(username=username, password=password)
-            if user is None:
-                try:
-                    user_obj = User.objects.get(email=username)
-                    user = authenticate(username=user_obj.username, password=password)
-                except User.DoesNotExist:
-                    pass
+            # EmailOrUsernameBackend accepts either in one lookup and one password hash
+            user = authenticate(self.request, username=username, password=password)
             
             if user is None:
                 raise forms.ValidationError('Invalid username/email or password.')
@@ -83,6 +78,17 @@ class TransactionForm(forms.ModelForm):
             'type': forms.Select(attrs={'class': 'form-select'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Each option's label is Merchant.__str__, which reads merchant.user
+        self.fields['merchant'].queryset = Merchant.objects.select_related('user').only(
+            'id', 'business_name', 'user__first_name', 'user__last_name',
+        )
+
+class TransactionImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV or JSONL with merchant_id or username, amount, type, and optional description and created_at')
+    resume = forms.BooleanField(required=False, help_text='Continue a previous import of a file with the same name and size')
 
 class ChangePasswordForm(forms.Form):
     current_password = forms.CharField(
@@ -0,0 +1,84 @@
+"""
+Cached rendering of dashboard fragments.
+
+The role dashboards are split into ``partials/`` templates: the sidebar and
+navbar chrome, which hardly ever change, and the data panels. Each fragment
+is rendered to HTML once and cached under its template name, a key (usually
+the user) and the generations it depends on (see ``sneat_app.caching``), so
+a write to the merchant's rows re-renders only that merchant's panels.
+
+Context for a fragment may be passed as a callable; it is only called on a
+miss, so a cached panel skips its queries as well as its rendering. Misses
+are computed and rendered on the primary database, never a replica. Async
+views use ``arender_fragment``, whose context callable may be a coroutine
+function that gathers its queries concurrently.
+"""
+import hashlib
+import inspect
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import aio, caching
+from .replicas import read_primary
+
+DEFAULT_TIMEOUT = 24 * 60 * 60
+
+
+def fragment_key(template_name, key, versions):
+    raw = '|'.join([template_name, *map(str, key), *map(str, versions)])
+    return 'sneat:fragment:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def lookup(template_name, key=(), depends_on=()):
+    """``(cache_key, html)``; ``html`` is None on a miss."""
+    cache_key = fragment_key(template_name, key, caching.generations(depends_on))
+    html = caching.get_cache().get(cache_key)
+    caching.record(template_name, hit=html is not None)
+    return cache_key, html
+
+
+def render_and_store(request, template_name, context, cache_key, timeout=None):
+    with read_primary():
+        html = render_to_string(template_name, context or {}, request)
+    if timeout is None:
+        timeout = getattr(settings, 'SNEAT_FRAGMENT_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+    caching.get_cache().set(cache_key, html, timeout)
+    return html
+
+
+def render_fragment(request, template_name, context=None, key=(), depends_on=(), timeout=None):
+    """Render ``template_name`` or return its cached HTML."""
+    cache_key, html = lookup(template_name, key, depends_on)
+    if html is None:
+        if callable(context):
+            with read_primary():
+                context = context()
+        html = render_and_store(request, template_name, context, cache_key, timeout)
+    return mark_safe(html)
+
+
+async def arender_fragment(request, template_name, context=None, key=(), depends_on=(), timeout=None):
+    """``render_fragment`` for async views; ``context`` may be a coroutine function."""
+    cache_key, html = await aio.run_sync(lookup, template_name, key, depends_on)
+    if html is None:
+        with read_primary():
+            if callable(context):
+                context = context()
+            if inspect.isawaitable(context):
+                context = await context
+        html = await aio.run_sync(render_and_store, request, template_name, context, cache_key, timeout)
+    return mark_safe(html)
+
+
+def chrome(request, role):
+    """The sidebar and navbar for ``role``'s dashboard; the navbar shows the user's name."""
+    user_generation = caching.user_generation(request.user.pk)
+    return {
+        'sidebar': render_fragment(request, f'{role}/partials/sidebar.html'),
+        'navbar': render_fragment(
+            request, f'{role}/partials/navbar.html', {'user': request.user},
+            key=(request.user.pk,), depends_on=(user_generation,),
+        ),
+    }
@@ -0,0 +1,283 @@
+"""
+Bulk transaction import pipeline.
+
+Settlement files (CSV or JSONL) are parsed as a stream, validated a batch at
+a time, and inserted with ``bulk_create`` inside chunked database
+transactions. Each chunk also advances an ``ImportCheckpoint`` row in the
+same transaction, so an interrupted import resumes exactly after the last
+committed chunk. Rejected rows are written to an error file instead of
+aborting the import.
+
+Each row needs ``amount`` and ``type``, plus either ``merchant_id`` or
+``username`` (the merchant's login). ``description`` and ``created_at``
+(ISO 8601 date or datetime) are optional.
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime, time as dt_time
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import caching, ledger, live, search, writes
+from .models import ImportCheckpoint, Merchant, Transaction
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_COMMIT_EVERY = 10000
+
+TYPES = {choice for choice, _ in Transaction.TYPE_CHOICES}
+AMOUNT_FIELD = Transaction._meta.get_field('amount')
+MAX_AMOUNT = Decimal(10) ** (AMOUNT_FIELD.max_digits - AMOUNT_FIELD.decimal_places)
+CENT = Decimal(1).scaleb(-AMOUNT_FIELD.decimal_places)
+
+
+class ImportResult:
+    def __init__(self, inserted=0, rejected=0, skipped=0, elapsed=0.0, line=0):
+        self.inserted = inserted
+        self.rejected = rejected
+        self.skipped = skipped
+        self.elapsed = elapsed
+        self.line = line
+        # Rows handled by this run, excluding those committed before a resume
+        self.processed = 0
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+def insert_transactions(transactions, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    ``bulk_create`` transactions and apply the side effects signals would have.
+
+    ``bulk_create`` sends no ``post_save``, so the ledger, rollups, search
+    index and cached statistics are updated here, once per batch. Call inside
+    ``writes.atomic_write()``.
+    """
+    created = Transaction.objects.bulk_create(transactions, batch_size=batch_size)
+    ledger.record_created(created)
+    pks = [obj.pk for obj in created if obj.pk is not None]
+    if pks:
+        search.index(Transaction, pks)
+    caching.bump_on_commit(caching.TRANSACTIONS, *[
+        caching.merchant_generation(merchant_id) for merchant_id in {obj.merchant_id for obj in created}
+    ])
+    # One totals refresh for live dashboards rather than an event per row
+    live.totals_changed_on_commit()
+    return created
+
+
+def detect_format(name):
+    return 'jsonl' if name.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, file_format):
+    """Yield ``(line_number, row_dict)`` from a text stream, one row at a time."""
+    if file_format == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {'__error__': f'Invalid JSON: {e}', '__raw__': line.rstrip('\n')}
+            if not isinstance(row, dict):
+                row = {'__error__': 'Expected a JSON object', '__raw__': line.rstrip('\n')}
+            yield line_number, row
+        return
+
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # Line numbers count the header, matching what an editor shows.
+        yield reader.line_num, row
+
+
+def _parse_created_at(value):
+    if value in (None, ''):
+        return timezone.now()
+    value = str(value).strip()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid created_at: {value!r}')
+        parsed = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'Invalid amount: {value!r}')
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError(f'Amount must be a positive number: {value!r}')
+    # Before quantizing, which raises InvalidOperation past the context's precision (e.g. 1e400)
+    if amount >= MAX_AMOUNT:
+        raise ValueError(f'Amount is too large: {value!r}')
+    if amount != amount.quantize(CENT):
+        raise ValueError(f'Amount has more than {AMOUNT_FIELD.decimal_places} decimal places: {value!r}')
+    return amount.quantize(CENT)
+
+
+def _merchant_ids(rows):
+    """Resolve every merchant referenced by a batch with at most two queries."""
+    ids, usernames = set(), set()
+    for _, row in rows:
+        if row.get('merchant_id') not in (None, ''):
+            try:
+                ids.add(int(row['merchant_id']))
+            except (TypeError, ValueError):
+                pass
+        elif row.get('username'):
+            usernames.add(str(row['username']))
+    known_ids = set(Merchant.objects.filter(id__in=ids).values_list('id', flat=True)) if ids else set()
+    by_username = dict(
+        Merchant.objects.filter(user__username__in=usernames).values_list('user__username', 'id')
+    ) if usernames else {}
+    return known_ids, by_username
+
+
+def validate_batch(rows):
+    """
+    Validate a batch of ``(line_number, row)`` pairs.
+
+    Returns ``(transactions, errors)`` where ``errors`` is a list of
+    ``(line_number, message, row)``.
+    """
+    known_ids, by_username = _merchant_ids(rows)
+    transactions, errors = [], []
+    for line_number, row in rows:
+        if '__error__' in row:
+            errors.append((line_number, row['__error__'], row))
+            continue
+        try:
+            if row.get('merchant_id') not in (None, ''):
+                try:
+                    merchant_id = int(row['merchant_id'])
+                except (TypeError, ValueError):
+                    raise ValueError(f'Invalid merchant_id: {row["merchant_id"]!r}')
+                if merchant_id not in known_ids:
+                    raise ValueError(f'Unknown merchant_id: {merchant_id}')
+            elif row.get('username'):
+                merchant_id = by_username.get(str(row['username']))
+                if merchant_id is None:
+                    raise ValueError(f'No merchant for username: {row["username"]!r}')
+            else:
+                raise ValueError('Missing merchant_id or username')
+
+            type_ = str(row.get('type') or '').strip().lower()
+            if type_ not in TYPES:
+                raise ValueError(f'Invalid type: {row.get("type")!r}')
+
+            transactions.append(Transaction(
+                merchant_id=merchant_id,
+                amount=_parse_amount(row.get('amount')),
+                type=type_,
+                description=str(row.get('description') or ''),
+                created_at=_parse_created_at(row.get('created_at')),
+            ))
+        except ValueError as e:
+            errors.append((line_number, str(e), row))
+    return transactions, errors
+
+
+class ErrorWriter:
+    """Write rejected rows as CSV: line, error, original row as JSON."""
+
+    def __init__(self, output):
+        self.output = output
+        self.writer = None
+
+    def write(self, errors):
+        if not errors or self.output is None:
+            return
+        if self.writer is None:
+            self.writer = csv.writer(self.output)
+            if self.output.tell() == 0:
+                self.writer.writerow(['line', 'error', 'row'])
+        for line_number, message, row in errors:
+            raw = row.get('__raw__') if '__raw__' in row else json.dumps(row, default=str)
+            self.writer.writerow([line_number, message, raw])
+
+
+def import_transactions(stream, source, file_format='csv', batch_size=DEFAULT_BATCH_SIZE,
+                        commit_every=DEFAULT_COMMIT_EVERY, error_output=None, resume=False,
+                        progress=None):
+    """
+    Import transactions from a text ``stream``.
+
+    ``source`` identifies the import for checkpointing; with ``resume=True``
+    rows up to the last committed line of that source are skipped.
+    ``progress`` is called with the running ``ImportResult`` after each
+    committed chunk.
+    """
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=source)
+    if resume:
+        start_line = checkpoint.line
+        result = ImportResult(inserted=checkpoint.inserted, rejected=checkpoint.rejected, line=start_line)
+    else:
+        start_line = 0
+        result = ImportResult()
+    errors_out = ErrorWriter(error_output)
+    started = time.monotonic()
+    chunk_rows = 0
+    batch = []
+    pending = []
+
+    def flush_batch():
+        transactions, errors = validate_batch(batch)
+        pending.append((transactions, errors, batch[-1][0]))
+
+    def commit_chunk():
+        with writes.atomic_write():
+            for transactions, errors, last_line in pending:
+                if transactions:
+                    insert_transactions(transactions, batch_size=batch_size)
+                result.inserted += len(transactions)
+                result.rejected += len(errors)
+                result.processed += len(transactions) + len(errors)
+                result.line = last_line
+            ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                line=result.line, inserted=result.inserted, rejected=result.rejected,
+                completed=False, updated_at=timezone.now(),
+            )
+        # Only report rejected rows once their chunk is committed, so a resumed
+        # import does not list them twice.
+        for _, errors, _ in pending:
+            errors_out.write(errors)
+        pending.clear()
+        result.elapsed = time.monotonic() - started
+        if progress:
+            progress(result)
+
+    for line_number, row in read_rows(stream, file_format):
+        if line_number <= start_line:
+            result.skipped += 1
+            continue
+        batch.append((line_number, row))
+        if len(batch) >= batch_size:
+            flush_batch()
+            chunk_rows += len(batch)
+            batch = []
+            if chunk_rows >= commit_every:
+                commit_chunk()
+                chunk_rows = 0
+    if batch:
+        flush_batch()
+    if pending:
+        commit_chunk()
+
+    ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(completed=True, updated_at=timezone.now())
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+def open_text(uploaded_file):
+    """Wrap a binary upload so it can be read as UTF-8 text, line by line."""
+    return io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
@@ -0,0 +1,238 @@
+"""
+Materialized per-merchant ledger.
+
+Every change to a ``Transaction`` is turned into a signed ledger entry and
+applied to the merchant's ``MerchantBalance`` row, so the dashboards and
+reports read precomputed totals instead of aggregating the whole
+``Transaction`` table on every request.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import caching, rollups, upserts, writes
+from .models import Merchant, MerchantBalance, Transaction
+
+ZERO = Decimal('0.00')
+
+
+def entry_for(obj, sign=1):
+    """Build a ledger entry ``(merchant_id, type, amount, created_at, sign)``."""
+    return (obj.merchant_id, obj.type, Decimal(str(obj.amount)), obj.created_at, sign)
+
+
+def _collect(entries):
+    deltas = {}
+    for merchant_id, type_, amount, created_at, sign in entries:
+        delta = deltas.setdefault(merchant_id, {
+            'credit_total': ZERO,
+            'debit_total': ZERO,
+            'credit_count': 0,
+            'debit_count': 0,
+            'last_activity_at': None,
+            'added': False,
+            'removed': False,
+        })
+        delta[f'{type_}_total'] += amount * sign
+        delta[f'{type_}_count'] += sign
+        if sign > 0:
+            delta['added'] = True
+            if delta['last_activity_at'] is None or created_at > delta['last_activity_at']:
+                delta['last_activity_at'] = created_at
+        else:
+            delta['removed'] = True
+    return deltas
+
+
+def _apply_delta(merchant_id, delta):
+    credit_total = delta['credit_total']
+    debit_total = delta['debit_total']
+    updates = {
+        'credit_total': F('credit_total') + credit_total,
+        'debit_total': F('debit_total') + debit_total,
+        'net_total': F('net_total') + (credit_total - debit_total),
+        'credit_count': F('credit_count') + delta['credit_count'],
+        'debit_count': F('debit_count') + delta['debit_count'],
+        'transaction_count': F('transaction_count') + delta['credit_count'] + delta['debit_count'],
+        'updated_at': timezone.now(),
+    }
+    last_activity_at = delta['last_activity_at']
+    if last_activity_at is not None:
+        updates['last_activity_at'] = Greatest(
+            Coalesce(F('last_activity_at'), Value(last_activity_at)), Value(last_activity_at)
+        )
+
+    balances = MerchantBalance.objects.filter(merchant_id=merchant_id)
+    if not balances.update(**updates):
+        if not delta['added'] or not Merchant.objects.filter(pk=merchant_id).exists():
+            # Nothing to reverse (e.g. the merchant is being cascade-deleted).
+            return
+        try:
+            with transaction.atomic():
+                MerchantBalance.objects.create(
+                    merchant_id=merchant_id,
+                    credit_total=credit_total,
+                    debit_total=debit_total,
+                    net_total=credit_total - debit_total,
+                    credit_count=delta['credit_count'],
+                    debit_count=delta['debit_count'],
+                    transaction_count=delta['credit_count'] + delta['debit_count'],
+                    last_activity_at=last_activity_at,
+                )
+        except IntegrityError:
+            # Another writer created the row first; apply on top of it.
+            balances.update(**updates)
+
+    if delta['removed']:
+        latest = Transaction.objects.filter(merchant_id=merchant_id).aggregate(latest=Max('created_at'))['latest']
+        balances.update(last_activity_at=latest)
+
+
+def _upsert_additions(deltas):
+    """Add deltas that only add transactions to their balances, in one statement per few hundred merchants."""
+    now = timezone.now()
+    rows = []
+    for merchant_id in sorted(deltas):
+        delta = deltas[merchant_id]
+        rows.append({
+            'merchant': merchant_id,
+            'credit_total': delta['credit_total'],
+            'debit_total': delta['debit_total'],
+            'net_total': delta['credit_total'] - delta['debit_total'],
+            'credit_count': delta['credit_count'],
+            'debit_count': delta['debit_count'],
+            'transaction_count': delta['credit_count'] + delta['debit_count'],
+            'last_activity_at': delta['last_activity_at'],
+            'updated_at': now,
+        })
+    upserts.increment(
+        MerchantBalance, rows, keys=('merchant',),
+        increments=(
+            'credit_total', 'debit_total', 'net_total', 'credit_count', 'debit_count', 'transaction_count',
+        ),
+        replace=('updated_at',), latest=('last_activity_at',),
+    )
+
+
+def apply_entries(entries):
+    """
+    Apply ledger entries to ``MerchantBalance`` and the revenue rollups.
+
+    Entries are folded into one delta per merchant (and per bucket) first.
+    Merchants that only gained transactions, all of them for bulk writers,
+    are then upserted together; the rest pay an ``UPDATE`` each.
+    """
+    entries = list(entries)
+    deltas = _collect(entries)
+    if not deltas:
+        return
+    with writes.atomic_write():
+        if upserts.supported(MerchantBalance):
+            additions = {
+                merchant_id: delta for merchant_id, delta in deltas.items() if not delta['removed']
+            }
+            _upsert_additions(additions)
+            deltas = {merchant_id: delta for merchant_id, delta in deltas.items() if merchant_id not in additions}
+        for merchant_id in sorted(deltas):
+            _apply_delta(merchant_id, deltas[merchant_id])
+        rollups.apply_entries(entries)
+
+
+def remove_merchant(merchant_id):
+    """Drop a merchant's balance and its share of the global rollups, ahead of deleting it."""
+    with writes.atomic_write():
+        MerchantBalance.objects.filter(merchant_id=merchant_id).delete()
+        rollups.remove_merchant(merchant_id)
+
+
+def record_created(transactions):
+    """Apply newly inserted transactions, e.g. after ``bulk_create``."""
+    apply_entries(entry_for(obj) for obj in transactions)
+
+
+def balance_for(merchant):
+    """Return the merchant's balance, or an unsaved zero balance if none exists yet."""
+    try:
+        return merchant.balance
+    except MerchantBalance.DoesNotExist:
+        return MerchantBalance(merchant=merchant)
+
+
+def global_totals():
+    """Sum the materialized balances across all merchants."""
+    totals = MerchantBalance.objects.aggregate(
+        credit_total=Sum('credit_total'),
+        debit_total=Sum('debit_total'),
+        net_total=Sum('net_total'),
+        credit_count=Sum('credit_count'),
+        debit_count=Sum('debit_count'),
+        transaction_count=Sum('transaction_count'),
+    )
+    for key, value in totals.items():
+        if value is None:
+            totals[key] = ZERO if key.endswith('_total') else 0
+    return totals
+
+
+def compute_balances():
+    """Recompute every merchant's balance from the ``Transaction`` table."""
+    rows = Transaction.objects.order_by().values('merchant_id').annotate(
+        credit_total=Sum('amount', filter=Q(type='credit')),
+        debit_total=Sum('amount', filter=Q(type='debit')),
+        credit_count=Count('id', filter=Q(type='credit')),
+        debit_count=Count('id', filter=Q(type='debit')),
+        last_activity_at=Max('created_at'),
+    )
+    balances = {}
+    for merchant_id in Merchant.objects.values_list('id', flat=True):
+        balances[merchant_id] = MerchantBalance(merchant_id=merchant_id)
+    for row in rows:
+        credit_total = row['credit_total'] or ZERO
+        debit_total = row['debit_total'] or ZERO
+        balances[row['merchant_id']] = MerchantBalance(
+            merchant_id=row['merchant_id'],
+            credit_total=credit_total,
+            debit_total=debit_total,
+            net_total=credit_total - debit_total,
+            credit_count=row['credit_count'],
+            debit_count=row['debit_count'],
+            transaction_count=row['credit_count'] + row['debit_count'],
+            last_activity_at=row['last_activity_at'],
+        )
+    return balances
+
+
+BALANCE_FIELDS = [
+    'credit_total', 'debit_total', 'net_total', 'credit_count',
+    'debit_count', 'transaction_count', 'last_activity_at',
+]
+
+
+def rebuild_balances(batch_size=1000):
+    """Replace all ``MerchantBalance`` rows with freshly computed ones."""
+    balances = compute_balances()
+    with writes.atomic_write():
+        MerchantBalance.objects.all().delete()
+        MerchantBalance.objects.bulk_create(balances.values(), batch_size=batch_size)
+        caching.bump_on_commit(caching.TRANSACTIONS, *map(caching.merchant_generation, balances))
+    return len(balances)
+
+
+def verify_balances():
+    """Return ``(merchant_id, field, stored, expected)`` for every drifted value."""
+    expected = compute_balances()
+    stored = {balance.merchant_id: balance for balance in MerchantBalance.objects.all()}
+    mismatches = []
+    for merchant_id, fresh in expected.items():
+        current = stored.get(merchant_id)
+        for field in BALANCE_FIELDS:
+            expected_value = getattr(fresh, field)
+            stored_value = getattr(current, field) if current else None
+            if current is None and not expected_value:
+                continue
+            if stored_value != expected_value:
+                mismatches.append((merchant_id, field, stored_value, expected_value))
+    return mismatches
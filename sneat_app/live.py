@@ -0,0 +1,270 @@
+"""
+Live super admin dashboard updates over Server-Sent Events.
+
+``sneat_project/asgi.py`` serves the stream through ``mount()``: each
+connected dashboard is an ``asyncio`` queue waiting on the event loop, not a
+thread, so one worker can hold thousands of idle connections. Updates come
+from an in-process broker:
+
+* ``signals.py`` publishes a ``transaction`` event once a new transaction
+  commits; bulk writes (``imports.insert_transactions``) only mark the totals
+  as changed.
+* Any change schedules one ``totals`` event per event loop, at most every
+  ``SNEAT_LIVE_TOTALS_INTERVAL`` seconds, computed from the cached
+  ``stats.platform_stats()``. However many dashboards are open, a burst of
+  writes costs one aggregation per interval.
+
+Each event is encoded once and the same bytes are queued for every client.
+A client that stops reading gets its backlog dropped and a ``resync``
+event, which makes the page reload, instead of growing the queue.
+
+The broker is per process: with several workers, each worker's clients see
+the writes made through that worker. Under WSGI (``runserver``) the
+``events`` view sends a single snapshot and tells the browser to reconnect
+after ``SNEAT_LIVE_RETRY_MS``, which degrades to polling.
+"""
+import asyncio
+import io
+import json
+import threading
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib import auth
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import reverse
+from django.utils import dateformat
+from django.utils.timezone import template_localtime
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+
+from . import aio, stats
+
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_HEARTBEAT = 15
+DEFAULT_TOTALS_INTERVAL = 1.0
+DEFAULT_RETRY_MS = 5000
+
+TOTALS_FIELDS = ('total_merchants', 'active_merchants', 'total_transactions', 'total_revenue')
+# A comment line; keeps proxies from timing out idle connections
+HEARTBEAT = b': keepalive\n\n'
+
+
+def encode(event, data):
+    """One SSE message; data is JSON on a single line."""
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'.encode()
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client is not keeping up; skip what it missed and have it reload.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(encode('resync', {}))
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Broker:
+    """Fans events out to the subscriptions on every event loop in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._totals_pending = set()
+
+    def subscribe(self):
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(getattr(settings, 'SNEAT_LIVE_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+        with self._lock:
+            self._subscriptions.setdefault(loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for loop, subscriptions in list(self._subscriptions.items()):
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[loop]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def _loops(self):
+        with self._lock:
+            return [loop for loop in self._subscriptions if not loop.is_closed()]
+
+    def publish(self, event, data):
+        """Send ``event`` to every subscriber; safe to call from any thread."""
+        loops = self._loops()
+        if not loops:
+            return
+        message = encode(event, data)
+        for loop in loops:
+            loop.call_soon_threadsafe(self._deliver, loop, message)
+
+    def totals_changed(self):
+        """Schedule a ``totals`` event on every loop that has subscribers."""
+        for loop in self._loops():
+            loop.call_soon_threadsafe(self._schedule_totals, loop)
+
+    def _deliver(self, loop, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(loop, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def _schedule_totals(self, loop):
+        if loop not in self._totals_pending:
+            self._totals_pending.add(loop)
+            loop.create_task(self._send_totals(loop))
+
+    async def _send_totals(self, loop):
+        try:
+            await asyncio.sleep(getattr(settings, 'SNEAT_LIVE_TOTALS_INTERVAL', DEFAULT_TOTALS_INTERVAL))
+        finally:
+            # Writes from here on schedule the next update.
+            self._totals_pending.discard(loop)
+        self._deliver(loop, encode('totals', await current_totals()))
+
+
+broker = Broker()
+
+
+async def current_totals():
+    platform = await aio.run_sync(stats.platform_stats)
+    return {field: platform[field] for field in TOTALS_FIELDS}
+
+
+def transaction_event(instance):
+    return {
+        'id': instance.pk,
+        'merchant_id': instance.merchant_id,
+        'merchant': instance.merchant.business_name,
+        'amount': instance.amount,
+        'type': instance.type,
+        'type_display': instance.get_type_display(),
+        'date': dateformat.format(template_localtime(instance.created_at), 'M d, Y'),
+    }
+
+
+def publish_transaction_on_commit(instance):
+    data = transaction_event(instance)
+
+    def publish():
+        broker.publish('transaction', data)
+        broker.totals_changed()
+    transaction.on_commit(publish)
+
+
+def totals_changed_on_commit():
+    transaction.on_commit(broker.totals_changed)
+
+
+def is_superuser(scope):
+    """Whether the session cookie in ``scope`` belongs to an active superuser."""
+    request = ASGIRequest(scope, io.BytesIO())
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    user = auth.get_user(request)
+    return user.is_authenticated and user.is_active and user.is_superuser
+
+
+def retry():
+    return f'retry: {getattr(settings, "SNEAT_LIVE_RETRY_MS", DEFAULT_RETRY_MS)}\n'.encode()
+
+
+async def send_events(send, subscription):
+    initial = retry() + encode('totals', await current_totals())
+    await send({'type': 'http.response.body', 'body': initial, 'more_body': True})
+    timeout = getattr(settings, 'SNEAT_LIVE_HEARTBEAT', DEFAULT_HEARTBEAT)
+    while True:
+        try:
+            message = await subscription.get(timeout)
+        except asyncio.TimeoutError:
+            message = HEARTBEAT
+        await send({'type': 'http.response.body', 'body': message, 'more_body': True})
+
+
+async def respond(send, status, body=b''):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def stream_application(scope, receive, send):
+    """
+    The event stream as a bare ASGI application.
+
+    Django runs every ASGI request in its own ``ThreadSensitiveContext``,
+    whose executor thread lives as long as the request does once any sync
+    middleware has run, i.e. one idle thread per open stream. Served from
+    here, a connection is two tasks on the event loop; the session lookup
+    and totals borrow a pooled thread and give it back.
+    """
+    if scope['method'] != 'GET':
+        await respond(send, 405, b'Method Not Allowed')
+        return
+    if not await aio.run_sync(is_superuser, scope):
+        await respond(send, 403, b'Forbidden')
+        return
+
+    # Subscribe before reading the totals so nothing committed in between is missed.
+    subscription = broker.subscribe()
+    sender = None
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache, no-store, must-revalidate, private'),
+            # Stop nginx and similar proxies from buffering the stream.
+            (b'x-accel-buffering', b'no'),
+        ]})
+        sender = asyncio.create_task(send_events(send, subscription))
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+    finally:
+        if sender is not None:
+            sender.cancel()
+        broker.unsubscribe(subscription)
+
+
+def mount(django_application):
+    """Wrap the Django ASGI application, answering the stream's URL directly."""
+    path = None
+
+    async def application(scope, receive, send):
+        nonlocal path
+        if path is None:
+            path = reverse('sneat_app:live_events')
+        if scope['type'] == 'http' and scope['path'] == path:
+            await stream_application(scope, receive, send)
+        else:
+            await django_application(scope, receive, send)
+    return application
+
+
+@require_GET
+@never_cache
+async def events(request):
+    """
+    The current totals as a one-message event stream.
+
+    Under ASGI ``mount()`` answers this URL with the live stream before
+    Django sees it. Under WSGI, which cannot hold the connection open, the
+    browser gets this snapshot and reconnects after the ``retry`` delay,
+    i.e. polls.
+    """
+    user = await request.auser()
+    if not (user.is_authenticated and user.is_superuser):
+        return HttpResponseForbidden()
+    return HttpResponse(retry() + encode('totals', await current_totals()), content_type='text/event-stream')
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import analytics
+from sneat_app.models import Merchant, Transaction
+
+class Command(BaseCommand):
+    help = (
+        'Prints exact transaction totals, amount percentiles and the top merchants by revenue, computed '
+        'over integer cents by sneat_app.analytics'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--merchant', type=int, help='Only this merchant\'s transactions')
+        parser.add_argument('--top', type=int, default=10, help='Merchants to list by credit total')
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Also time the same totals summed as one Decimal per row, and check they agree',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Transaction.objects.all()
+        if options['merchant'] is not None:
+            if not Merchant.objects.filter(pk=options['merchant']).exists():
+                raise CommandError(f'Merchant {options["merchant"]} does not exist.')
+            queryset = queryset.filter(merchant_id=options['merchant'])
+
+        started = time.perf_counter()
+        columns = analytics.load(queryset)
+        loaded = time.perf_counter()
+        totals = analytics.totals(columns)
+        percentiles = analytics.percentiles(columns)
+        merchants = analytics.by_merchant(columns)
+        finished = time.perf_counter()
+
+        engine = 'NumPy' if analytics.np is not None else 'Python ints (NumPy not installed)'
+        self.stdout.write(
+            f'{totals["count"]} transactions loaded in {loaded - started:.3f}s, '
+            f'aggregated in {finished - loaded:.3f}s with {engine}'
+        )
+        for name in ('credit', 'debit', 'net'):
+            self.stdout.write(f'{name.title():<8}${analytics.to_decimal(totals[name]):>20,}')
+        for percent, cents in percentiles.items():
+            value = '-' if cents is None else f'${analytics.to_decimal(cents):,}'
+            self.stdout.write(f'p{percent:<7}{value:>21}')
+
+        top = sorted(merchants.items(), key=lambda item: item[1]['credit'], reverse=True)[:options['top']]
+        if top:
+            names = dict(Merchant.objects.filter(pk__in=[pk for pk, _ in top]).values_list('pk', 'business_name'))
+            self.stdout.write(f'Top {len(top)} of {len(merchants)} merchants by credit:')
+            for pk, group in top:
+                self.stdout.write(
+                    f'  {names.get(pk, pk)!s:<30}${analytics.to_decimal(group["credit"]):>18,}'
+                    f'  {group["count"]:>8} transactions'
+                )
+
+        if options['compare']:
+            self.compare(queryset, totals, finished - started)
+
+    def compare(self, queryset, totals, elapsed):
+        started = time.perf_counter()
+        credit = debit = 0
+        for amount, type_ in queryset.order_by().values_list('amount', 'type').iterator(
+            chunk_size=analytics.DEFAULT_CHUNK_SIZE,
+        ):
+            if type_ == 'credit':
+                credit += amount
+            else:
+                debit += amount
+        decimal_elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Decimal per row: {decimal_elapsed:.3f}s for the totals alone; '
+            f'integer columns: {elapsed:.3f}s for everything above'
+        )
+        if (credit, debit) != (analytics.to_decimal(totals['credit']), analytics.to_decimal(totals['debit'])):
+            raise CommandError(f'Totals disagree: Decimal sums are credit {credit}, debit {debit}.')
+        self.stdout.write(self.style.SUCCESS('Both paths agree to the cent.'))
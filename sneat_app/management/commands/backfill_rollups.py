@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sneat_app import rollups
+
+class Command(BaseCommand):
+    help = 'Rebuilds the hourly/daily/monthly revenue rollups from the Transaction table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--granularity',
+            action='append',
+            choices=rollups.GRANULARITIES,
+            help='Only rebuild this granularity (can be repeated). Defaults to all.',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only rebuild buckets from the one containing this date (YYYY-MM-DD) onwards',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = timezone.make_aware(datetime.strptime(options['since'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format.')
+
+        written = rollups.backfill(
+            granularities=options['granularity'] or rollups.GRANULARITIES,
+            since=since,
+        )
+        for granularity, count in written.items():
+            self.stdout.write(self.style.SUCCESS(f'Wrote {count} {granularity} rollup rows.'))
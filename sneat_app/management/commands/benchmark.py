@@ -0,0 +1,129 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sneat_app import benchmarks
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a database per scale and drives every sneat_app route with concurrent clients for each role, '
+        'reporting throughput, p50/p95/p99 latency, query counts and peak RSS; compares with a baseline run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=list(benchmarks.DEFAULT_SCALES),
+                            help='Transactions per seeded database')
+        parser.add_argument('--requests', type=int, default=benchmarks.DEFAULT_REQUESTS,
+                            help='Measured requests per route and role')
+        parser.add_argument('--concurrency', type=int, default=benchmarks.DEFAULT_CONCURRENCY,
+                            help='Client threads sending requests at once')
+        parser.add_argument('--warmup', type=int, default=benchmarks.DEFAULT_WARMUP,
+                            help='Unmeasured requests sent first to each route and role')
+        parser.add_argument('--route', action='append', dest='routes', help='Only this route name; repeatable')
+        parser.add_argument('--role', action='append', dest='roles', choices=benchmarks.ROLES + benchmarks.ANONYMOUS,
+                            help='Only this role; repeatable')
+        parser.add_argument('--cold', action='store_true', help='Disable the cache so every request misses')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the generated data')
+        parser.add_argument('--reseed', action='store_true', help='Seed the databases again even if they exist')
+        parser.add_argument('--data-dir', help='Where the seeded databases live (default: SNEAT_BENCHMARK_ROOT)')
+        parser.add_argument('--output', '-o', help='Results file (default: <data dir>/results-<timestamp>.json)')
+        parser.add_argument('--baseline', help='Earlier results file to compare with; regressions fail the command')
+        parser.add_argument('--threshold', type=float, default=benchmarks.DEFAULT_THRESHOLD,
+                            help='Relative change in latency, throughput or RSS counted as a regression')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['warmup'] < 0:
+            raise CommandError('--requests and --concurrency must be at least 1, --warmup at least 0.')
+        unknown = set(options['routes'] or []) - set(benchmarks.ROUTES)
+        if unknown:
+            raise CommandError(f'Unknown route(s): {", ".join(sorted(unknown))}.')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read baseline {options["baseline"]}: {e}')
+
+        directory = options['data_dir'] or getattr(settings, 'SNEAT_BENCHMARK_ROOT', 'benchmarks')
+
+        def progress(scale, step):
+            if step == 'seed':
+                self.stdout.write(f'Seeding {scale} transactions into {benchmarks.database_path(scale, directory)}...')
+            else:
+                self.stdout.write(f'Benchmarking {scale} transactions...')
+
+        try:
+            document = benchmarks.run(
+                scales=options['scales'],
+                directory=directory,
+                reseed=options['reseed'],
+                seed=options['seed'],
+                progress=progress,
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                warmup=options['warmup'],
+                routes=options['routes'],
+                roles=options['roles'],
+                cold=options['cold'],
+            )
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(str(e))
+
+        for scale, entry in document['scales'].items():
+            self.report(scale, entry)
+
+        output = options['output'] or os.path.join(
+            directory, f'results-{timezone.now():%Y%m%d-%H%M%S}.json',
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+        failures = []
+        # A valid request answered with a 5xx is a bug to fix, not a number to report
+        errors = benchmarks.server_errors(document)
+        for scale, key, count in errors:
+            self.stdout.write(self.style.WARNING(f'[{scale}] {key}: {count} server error(s)'))
+        if errors:
+            failures.append(f'{len(errors)} scenario(s) answered with server errors')
+
+        if baseline is not None:
+            regressions = benchmarks.compare(baseline, document, options['threshold'])
+            for scale, key, metric, before, after in regressions:
+                self.stdout.write(self.style.WARNING(
+                    f'[{scale}] {key}: {metric} {self.format(before)} -> {self.format(after)}'
+                ))
+            if regressions:
+                failures.append(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}.'))
+
+        if failures:
+            raise CommandError('; '.join(failures) + '.')
+
+    def report(self, scale, entry):
+        self.stdout.write(f'\n{scale} transactions ({entry["database_bytes"] / 2 ** 20:,.0f} MiB database)')
+        if 'seed_timings' in entry:
+            self.stdout.write('seeded: ' + ', '.join(
+                f'{step} {seconds:.1f}s' for step, seconds in entry['seed_timings'].items()
+            ))
+        self.stdout.write(
+            f'{"scenario":<58}{"status":>8}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+            f'{"queries":>9}{"RSS MiB":>9}'
+        )
+        for result in entry['results']:
+            statuses = '/'.join(result['statuses'])
+            queries = '-' if result['max_queries'] is None else f'{result["max_queries"]}'
+            self.stdout.write(
+                f'{result["key"]:<58}{statuses:>8}{result["throughput"]:>8.0f}{result["p50_ms"]:>9.1f}'
+                f'{result["p95_ms"]:>9.1f}{result["p99_ms"]:>9.1f}{queries:>9}{result["peak_rss_kb"] / 1024:>9.0f}'
+            )
+
+    @staticmethod
+    def format(value):
+        return f'{value:.1f}' if isinstance(value, float) else str(value)
@@ -0,0 +1,196 @@
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+
+from sneat_app.models import Merchant
+
+PATHS = {
+    'reports': ('/super-admin/reports/', 'admin'),
+    'super_admin_dashboard': ('/super-admin/dashboard/', 'admin'),
+    'merchant_dashboard': ('/merchant/dashboard/', 'merchant'),
+}
+# Every cache read misses, so each request runs its full set of queries.
+COLD_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+def add_latency(seconds):
+    """Sleep before every query on every connection, in every thread."""
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender=None, connection=None, **kwargs):
+        # connection_created fires again whenever a closed connection reconnects.
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+    for connection in connections.all(initialized_only=True):
+        install(connection=connection)
+
+class Command(BaseCommand):
+    help = (
+        'Compares p50/p99 latency and throughput of the async dashboard and report views served by the '
+        'ASGI application against the WSGI handler on a thread pool, under concurrent load'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Requests per view and server')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at once')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads')
+        parser.add_argument('--cache', choices=['warm', 'cold', 'both'], default='both')
+        parser.add_argument(
+            '--db-latency', type=float, default=0.0,
+            help='Milliseconds added to every query, as a round trip to a database server would',
+        )
+
+    def handle(self, *args, **options):
+        sessions = self.sessions()
+        if options['db_latency']:
+            add_latency(options['db_latency'] / 1000)
+        modes = ['warm', 'cold'] if options['cache'] == 'both' else [options['cache']]
+        self.stdout.write(
+            f'{options["requests"]} requests per row, {options["concurrency"]} in flight; '
+            f'WSGI on {options["threads"]} threads, ASGI on one event loop; '
+            f'{options["db_latency"]:g}ms added per query'
+        )
+        self.stdout.write(f'{"view":<24}{"cache":<7}{"server":<7}{"p50 ms":>9}{"p99 ms":>9}{"req/s":>9}')
+        try:
+            for mode in modes:
+                with override_settings(**({'CACHES': COLD_CACHES} if mode == 'cold' else {})):
+                    for name, (path, role) in PATHS.items():
+                        if role not in sessions:
+                            continue
+                        for server in ('wsgi', 'asgi'):
+                            latencies, elapsed = self.run(server, path, sessions[role], options)
+                            self.report(name, mode, server, latencies, elapsed)
+        finally:
+            for client in sessions.values():
+                client.logout()
+
+    def sessions(self):
+        admin = User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+        if admin is None:
+            raise CommandError('No active superuser; create one with createsuperadmin.')
+        users = {'admin': admin}
+        merchant = Merchant.objects.filter(
+            user__is_staff=True, user__is_superuser=False, user__is_active=True,
+        ).select_related('user').order_by('pk').first()
+        if merchant is None:
+            self.stdout.write(self.style.WARNING('No merchant user; skipping merchant_dashboard.'))
+        else:
+            users['merchant'] = merchant.user
+        sessions = {}
+        for role, user in users.items():
+            sessions[role] = Client()
+            sessions[role].force_login(user)
+        return sessions
+
+    def run(self, server, path, client, options):
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        if server == 'wsgi':
+            return self.run_wsgi(path, cookie, options)
+        return asyncio.run(self.run_asgi(path, cookie, options))
+
+    def run_wsgi(self, path, cookie, options):
+        handler = WSGIHandler()
+
+        def request(submitted):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'HTTP_HOST': 'testserver',
+                'HTTP_COOKIE': cookie,
+                'wsgi.input': io.BytesIO(),
+                'wsgi.errors': io.StringIO(),
+                'wsgi.url_scheme': 'http',
+            }
+            statuses = []
+            response = handler(environ, lambda status, headers: statuses.append(status))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            if not statuses[0].startswith('200'):
+                raise CommandError(f'{path} answered {statuses[0]} under WSGI')
+            return time.perf_counter() - submitted
+
+        # Requests beyond the worker threads wait in the pool's queue, as behind a real server.
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['threads']) as pool:
+            pending = []
+            latencies = []
+            for _ in range(options['requests']):
+                if len(pending) >= options['concurrency']:
+                    latencies.append(pending.pop(0).result())
+                pending.append(pool.submit(request, time.perf_counter()))
+            latencies.extend(future.result() for future in pending)
+        return latencies, time.perf_counter() - started
+
+    async def run_asgi(self, path, cookie, options):
+        from sneat_project.asgi import application
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        slots = asyncio.Semaphore(options['concurrency'])
+
+        async def request():
+            async with slots:
+                submitted = time.perf_counter()
+                finished = asyncio.Event()
+                requested = []
+                statuses = []
+
+                async def receive():
+                    if not requested:
+                        requested.append(True)
+                        return {'type': 'http.request', 'body': b'', 'more_body': False}
+                    await finished.wait()
+                    return {'type': 'http.disconnect'}
+
+                async def send(message):
+                    if message['type'] == 'http.response.start':
+                        statuses.append(message['status'])
+                    elif not message.get('more_body'):
+                        finished.set()
+
+                await application(scope, receive, send)
+                if statuses != [200]:
+                    raise CommandError(f'{path} answered {statuses} under ASGI')
+                return time.perf_counter() - submitted
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(request() for _ in range(options['requests'])))
+        return latencies, time.perf_counter() - started
+
+    def report(self, name, mode, server, latencies, elapsed):
+        latencies = sorted(latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f'{name:<24}{mode:<7}{server:<7}{statistics.median(latencies) * 1000:>9.1f}'
+            f'{p99 * 1000:>9.1f}{len(latencies) / elapsed:>9.0f}'
+        )
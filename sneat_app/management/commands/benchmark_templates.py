@@ -0,0 +1,103 @@
+import re
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine, engines
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+
+from sneat_app.models import Merchant, Transaction
+from sneat_app.pagination import CursorPage
+
+# The row loop up to its "no transactions" {% else %} branch
+ROW_LOOP_RE = re.compile(r'{% for transaction in page_obj %}.*?</tr>(?=\s*{% else %})', re.DOTALL)
+# Jinja filter calls that are otherwise Django syntax: |date("...") -> |date:"..."
+FILTER_CALL_RE = re.compile(r'\|(\w+)\(([^()]*)\)')
+REPORT_TOTALS = [
+    'total_revenue', 'total_debits', 'net_revenue', 'monthly_revenue', 'total_merchants', 'active_merchants',
+    'inactive_merchants', 'total_transactions', 'credit_transactions', 'debit_transactions',
+]
+
+class Command(BaseCommand):
+    help = 'Measures render time of the biggest list pages, and Jinja2 against the Django engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Rows per list page')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rows, iterations = options['rows'], options['iterations']
+        request = RequestFactory().get('/')
+        request.user = User(username='benchmark', is_superuser=True)
+        page = CursorPage(self.transactions(rows), next_cursor='x', count=rows * 10, count_is_exact=True)
+        merchants = [transaction.merchant for transaction in page.object_list]
+
+        self.stdout.write(f'Full pages, {rows} rows, {iterations} renders each (Jinja2):')
+        pages = [
+            ('super_admin/transaction_list.html', {'page_obj': page, 'filter_query': ''}),
+            ('super_admin/merchant_list.html', {'page_obj': CursorPage(merchants, count=rows), 'filter_query': ''}),
+            ('super_admin/reports.html', {
+                **dict.fromkeys(REPORT_TOTALS, Decimal('1234.50')),
+                'top_merchants': merchants[:10],
+            }),
+        ]
+        for name, context in pages:
+            self.report(name, self.time(lambda: render_to_string(name, context, request), iterations))
+
+        self.stdout.write(f'\nTransaction rows only, {rows} rows: Django engine vs Jinja2')
+        jinja_source, django_source = self.row_templates()
+        jinja_template = engines['jinja2'].env.from_string(jinja_source)
+        django_template = Engine(
+            libraries={}, builtins=['django.template.defaultfilters', 'django.template.defaulttags'],
+        ).from_string(django_source)
+        context = {'page_obj': page}
+        django_times = self.time(lambda: django_template.render(Context(context)), iterations)
+        jinja_times = self.time(lambda: jinja_template.render(context), iterations)
+        self.report('django', django_times)
+        self.report('jinja2', jinja_times)
+        speedup = statistics.mean(django_times) / statistics.mean(jinja_times)
+        self.stdout.write(self.style.SUCCESS(f'Jinja2 renders the rows {speedup:.1f}x faster.'))
+
+    def transactions(self, count):
+        now = timezone.now()
+        result = []
+        for i in range(count):
+            merchant = Merchant(id=i, business_name=f'Business {i}', status='active', created_at=now)
+            merchant.user = User(first_name='Merchant', last_name=str(i), email=f'm{i}@example.com')
+            transaction = Transaction(
+                id=i, merchant=merchant, amount=Decimal('12.50') + i, type='credit' if i % 3 else 'debit',
+                description='Settlement ' * (i % 8), created_at=now - timedelta(minutes=i),
+            )
+            transaction.merchant_name = f'Merchant {i}'
+            merchant.name, merchant.email, merchant.total_revenue = f'Merchant {i}', merchant.user.email, i
+            result.append(transaction)
+        return result
+
+    def row_templates(self):
+        """The transaction_list row markup, as Jinja2 and translated to Django syntax."""
+        path = Path(settings.BASE_DIR) / 'templates' / 'super_admin' / 'transaction_list.html'
+        jinja_source = ROW_LOOP_RE.search(path.read_text()).group(0) + '{% endfor %}'
+        return jinja_source, FILTER_CALL_RE.sub(r'|\1:\2', jinja_source)
+
+    def time(self, render, iterations):
+        render()
+        times = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            render()
+            times.append(time.perf_counter() - started)
+        return times
+
+    def report(self, name, times):
+        times = sorted(times)
+        p95 = times[int(len(times) * 0.95) - 1]
+        self.stdout.write(
+            f'  {name:<40} mean {statistics.mean(times) * 1000:7.2f}ms  p95 {p95 * 1000:7.2f}ms'
+        )
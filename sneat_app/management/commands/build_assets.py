@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import assets
+
+class Command(BaseCommand):
+    help = 'Bundles, minifies and fingerprints the site CSS/JS and writes gzip/brotli variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bundles', nargs='*', help='Only rebuild these bundles (e.g. core.js)')
+        parser.add_argument('--no-compress', action='store_true', help='Skip the .gz/.br variants')
+        parser.add_argument('--clean', action='store_true', help='Delete bundles no longer in the manifest')
+
+    def handle(self, *args, **options):
+        unknown = [name for name in options['bundles'] if name not in assets.BUNDLES]
+        if unknown:
+            raise CommandError(f'Unknown bundle(s): {", ".join(unknown)}. Choose from {", ".join(assets.BUNDLES)}.')
+        if assets.brotli is None and not options['no_compress']:
+            self.stdout.write(self.style.WARNING('brotli is not installed; writing gzip variants only.'))
+        if assets.rjsmin is None:
+            self.stdout.write(self.style.WARNING('rjsmin is not installed; JS bundles are concatenated, not minified.'))
+
+        try:
+            entries = assets.build(options['bundles'] or None, compress=not options['no_compress'], clean=options['clean'])
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+
+        totals = {'source_bytes': 0, 'bytes': 0, 'gzip_bytes': 0, 'brotli_bytes': 0}
+        for name, entry in sorted(entries.items()):
+            for key in totals:
+                totals[key] += entry.get(key, 0)
+            line = (
+                f"{entry['file']:<32} {len(entry['sources'])} files  "
+                f"{entry['source_bytes'] / 1024:8.1f} KB -> {entry['bytes'] / 1024:8.1f} KB"
+            )
+            if 'gzip_bytes' in entry:
+                line += f"  gzip {entry['gzip_bytes'] / 1024:7.1f} KB"
+            if 'brotli_bytes' in entry:
+                line += f"  br {entry['brotli_bytes'] / 1024:7.1f} KB"
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {len(entries)} bundles in {assets.output_dir()}: "
+            f"{totals['source_bytes'] / 1024:.1f} KB of sources -> {totals['bytes'] / 1024:.1f} KB "
+            f"({totals['gzip_bytes'] / 1024:.1f} KB gzipped)."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from sneat_app import caching
+
+class Command(BaseCommand):
+    help = 'Shows cache hit rates for cached statistics and dashboard fragments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        rates = caching.hit_rates()
+        if not rates:
+            self.stdout.write('No cache lookups recorded yet.')
+        width = max([len(name) for name in rates] + [4])
+        for name, (hits, misses, rate) in rates.items():
+            self.stdout.write(f'{name:<{width}}  {hits:>8} hits  {misses:>8} misses  {rate:>6.1%}')
+
+        if options['reset']:
+            caching.reset_hit_rates()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from sneat_app import query_plans
+
+class Command(BaseCommand):
+    help = 'Explains every registered hot query and fails if any of them needs a full table scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Only check these queries')
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Also fail when a query sorts in a temporary B-tree instead of reading an index in order',
+        )
+        parser.add_argument('--show-plans', action='store_true', help='Print every query plan')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans reads SQLite EXPLAIN QUERY PLAN output; use a SQLite database.')
+
+        names = options['names'] or list(query_plans.HOT_QUERIES)
+        unknown = set(names) - set(query_plans.HOT_QUERIES)
+        if unknown:
+            raise CommandError(f'Unknown queries: {", ".join(sorted(unknown))}')
+
+        failures = 0
+        for name in names:
+            plan = query_plans.explain(query_plans.HOT_QUERIES[name]())
+            found = query_plans.problems(plan, allow_temp_sort=not options['strict'])
+            if found:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'{name}: {"; ".join(found)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+            if found or options['show_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+
+        if failures:
+            raise CommandError(f'{failures} hot query plan(s) fall back to a full table scan.')
@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from jinja2 import TemplateSyntaxError
+
+class Command(BaseCommand):
+    help = 'Compiles every Jinja2 template, filling the bytecode cache and reporting syntax errors'
+
+    def handle(self, *args, **options):
+        backend = engines['jinja2']
+        env = backend.env
+        if env.bytecode_cache is None:
+            self.stdout.write(self.style.WARNING('SNEAT_JINJA2_BYTECODE_CACHE is off; only checking syntax.'))
+
+        compiled, failures = 0, 0
+        for directory in backend.template_dirs:
+            for path in sorted(Path(directory).rglob('*.html')):
+                name = path.relative_to(directory).as_posix()
+                try:
+                    env.get_template(name)
+                except TemplateSyntaxError as e:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f'{name}:{e.lineno}: {e.message}'))
+                else:
+                    compiled += 1
+
+        if failures:
+            raise CommandError(f'{failures} template(s) failed to compile.')
+        self.stdout.write(self.style.SUCCESS(f'Compiled {compiled} templates.'))
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import api
+
+class Command(BaseCommand):
+    help = 'Creates a bearer token for the transaction ingestion API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Superuser the token acts as')
+        parser.add_argument('--name', default='default', help='Label to tell tokens apart')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User "{options["username"]}" does not exist.')
+        if not user.is_superuser:
+            raise CommandError('API tokens can only be created for superusers.')
+
+        token, key = api.create_token(user, options['name'])
+        self.stdout.write(self.style.SUCCESS(f'Created API token "{token.name}" for {user.username}.'))
+        self.stdout.write(f'Token: {key}')
+        self.stdout.write(self.style.WARNING('Store it now; it cannot be shown again.'))
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import exports
+
+class Command(BaseCommand):
+    help = 'Streams transactions to CSV or JSONL in constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(exports.FORMATS), default='csv')
+        parser.add_argument('--search', default='', help='Same as the search box on the transaction list')
+        parser.add_argument('--type', choices=['credit', 'debit'], default='')
+        parser.add_argument('--start', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--output', '-o', default='-', help='Output file (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=exports.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            start = exports.parse_day(options['start'])
+            end = exports.parse_day(options['end'], end=True)
+        except exports.ExportError as e:
+            raise CommandError(str(e))
+
+        transactions = exports.export_queryset(
+            search_query=options['search'],
+            type_filter=options['type'],
+            start=start,
+            end=end,
+        )
+        chunks = exports.stream(transactions, options['format'], chunk_size=options['chunk_size'])
+
+        if options['output'] == '-':
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Exported transactions to {options["output"]}'))
@@ -0,0 +1,66 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import exports, statements
+
+class Command(BaseCommand):
+    help = (
+        'Writes a statement (opening balance, transactions, closing balance) for every merchant, '
+        'from one ordered scan of the period\'s transactions, rendered by a pool of worker processes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Statement month, YYYY-MM (default: last full month)')
+        parser.add_argument('--start', help='First day of a custom period (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day of a custom period (YYYY-MM-DD)')
+        parser.add_argument('--format', action='append', choices=list(statements.FORMATS), dest='formats',
+                            help='Repeat for several formats (default: all)')
+        parser.add_argument('--merchant', action='append', type=int, dest='merchants',
+                            help='Only this merchant id; repeatable')
+        parser.add_argument('--output', '-o', help='Directory for the files (default: <SNEAT_STATEMENT_ROOT>/<period>)')
+        parser.add_argument('--workers', type=int, default=0, help='Rendering processes (default: one per CPU)')
+        parser.add_argument('--batch-size', type=int, default=statements.DEFAULT_BATCH_SIZE,
+                            help='Statements handed to a worker at a time')
+
+    def handle(self, *args, **options):
+        try:
+            if options['start'] or options['end']:
+                if options['month']:
+                    raise CommandError('Use either --month or --start/--end.')
+                start = exports.parse_day(options['start'])
+                end = exports.parse_day(options['end'], end=True)
+                if start is None or end is None or start >= end:
+                    raise CommandError('A custom period needs --start and --end, with --start first.')
+            elif options['month']:
+                start, end = statements.month_period(options['month'])
+            else:
+                start, end = statements.previous_month()
+        except (exports.ExportError, statements.StatementError) as e:
+            raise CommandError(str(e))
+
+        label = statements.period_label(start, end)
+        directory = options['output'] or os.path.join(
+            getattr(settings, 'SNEAT_STATEMENT_ROOT', 'statements'), label,
+        )
+        reported = [0]
+
+        def progress(count, lines):
+            if count - reported[0] >= 5000:
+                reported[0] = count
+                self.stdout.write(f'{count} statements, {lines} transactions')
+
+        result = statements.generate(
+            start, end, str(directory),
+            formats=options['formats'] or list(statements.FORMATS),
+            workers=options['workers'] or None,
+            batch_size=options['batch_size'],
+            merchant_ids=options['merchants'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {result["statements"]} statements for {label} ({result["lines"]} transactions) '
+            f'to {directory} in {result["elapsed"]:.1f}s '
+            f'({result["statements"] / max(result["elapsed"], 1e-9):,.0f} statements/sec)'
+        ))
@@ -0,0 +1,56 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import imports
+
+class Command(BaseCommand):
+    help = 'Bulk imports transactions from a CSV or JSONL settlement file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=imports.DEFAULT_BATCH_SIZE,
+                            help='Rows validated and inserted per bulk_create')
+        parser.add_argument('--commit-every', type=int, default=imports.DEFAULT_COMMIT_EVERY,
+                            help='Rows per database transaction (and checkpoint)')
+        parser.add_argument('--errors', help='Where to write rejected rows (default: <path>.errors.csv)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue after the last committed chunk of a previous run of this file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+
+        file_format = options['format'] or imports.detect_format(path)
+        errors_path = options['errors'] or f'{path}.errors.csv'
+        source = os.path.abspath(path)
+
+        def progress(result):
+            self.stdout.write(
+                f'line {result.line}: {result.inserted} inserted, {result.rejected} rejected '
+                f'({result.rows_per_second:,.0f} rows/sec)'
+            )
+
+        with open(path, newline='', encoding='utf-8-sig') as stream, \
+                open(errors_path, 'a' if options['resume'] else 'w', newline='', encoding='utf-8') as errors:
+            result = imports.import_transactions(
+                stream,
+                source=source,
+                file_format=file_format,
+                batch_size=options['batch_size'],
+                commit_every=options['commit_every'],
+                error_output=errors,
+                resume=options['resume'],
+                progress=progress,
+            )
+
+        if not result.rejected and os.path.getsize(errors_path) == 0:
+            os.remove(errors_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.inserted} transactions, rejected {result.rejected} '
+            f'in {result.elapsed:.1f}s ({result.rows_per_second:,.0f} rows/sec).'
+        ))
+        if result.rejected:
+            self.stdout.write(self.style.WARNING(f'Rejected rows written to {errors_path}'))
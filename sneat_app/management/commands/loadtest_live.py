@@ -0,0 +1,187 @@
+import asyncio
+import json
+import resource
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from sneat_app import live
+
+class Command(BaseCommand):
+    help = (
+        'Holds many idle connections to the live dashboard stream on the ASGI application, in this one '
+        'process, then publishes transaction events and measures how long each takes to reach every client'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=20)
+        parser.add_argument('--interval', type=float, default=0.05, help='Seconds between published events')
+        parser.add_argument('--username', help='Superuser to connect as (default: the first one)')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_superuser=True, is_active=True)
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.order_by('pk').first()
+        if user is None:
+            raise CommandError('No active superuser to connect as; create one with createsuperadmin.')
+
+        client = Client()
+        client.force_login(user)
+        try:
+            result = asyncio.run(self.run(
+                client.cookies[settings.SESSION_COOKIE_NAME].value,
+                options['connections'], options['events'], options['interval'],
+            ))
+        finally:
+            client.logout()
+        self.report(result, options['connections'], options['events'])
+
+    async def run(self, session_key, connections, events, interval):
+        from sneat_project.asgi import application
+
+        threads_before = threading.active_count()
+        clients = [LiveClient(application, session_key) for _ in range(connections)]
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(client.run()) for client in clients]
+        await asyncio.wait_for(asyncio.gather(*(client.ready.wait() for client in clients)), timeout=120)
+        connect_time = time.perf_counter() - started
+
+        result = {
+            'connect_time': connect_time,
+            'statuses': {client.status for client in clients},
+            'subscribers': live.broker.subscriber_count(),
+            'threads_before': threads_before,
+            'threads_connected': threading.active_count(),
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+        sent = {}
+        for event_id in range(1, events + 1):
+            sent[event_id] = time.perf_counter()
+            # Published from another thread, as a post-commit hook in a sync view would.
+            await asyncio.to_thread(live.broker.publish, 'transaction', {'id': event_id})
+            await asyncio.sleep(interval)
+        # Let the last events drain.
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and any(len(client.received) < events for client in clients):
+            await asyncio.sleep(0.05)
+
+        latencies, fan_out = [], []
+        for event_id, sent_at in sent.items():
+            arrivals = [client.received[event_id] for client in clients if event_id in client.received]
+            latencies.extend(arrival - sent_at for arrival in arrivals)
+            if len(arrivals) == connections:
+                fan_out.append(max(arrivals) - sent_at)
+        result.update({
+            'delivered': sum(len(client.received) for client in clients),
+            'latencies': sorted(latencies),
+            'fan_out': fan_out,
+            'threads_peak': threading.active_count(),
+        })
+
+        for client in clients:
+            client.disconnect.set()
+        await asyncio.gather(*tasks)
+        result['subscribers_after'] = live.broker.subscriber_count()
+        return result
+
+    def report(self, result, connections, events):
+        if result['statuses'] != {200}:
+            raise CommandError(f'Unexpected response statuses: {sorted(result["statuses"])}')
+        self.stdout.write(
+            f'{connections} connections open in {result["connect_time"]:.2f}s; '
+            f'{result["subscribers"]} subscribers on the broker'
+        )
+        self.stdout.write(
+            f'Threads: {result["threads_before"]} before, {result["threads_connected"]} with every client '
+            f'connected, {result["threads_peak"]} after publishing'
+        )
+        self.stdout.write(f'Peak RSS: {result["max_rss_kb"] / 1024:.1f} MB')
+
+        expected = connections * events
+        latencies = result['latencies']
+        self.stdout.write(f'Delivered {result["delivered"]}/{expected} events')
+        if latencies:
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f'Latency per client: median {statistics.median(latencies) * 1000:.1f}ms, '
+                f'p99 {p99 * 1000:.1f}ms, max {latencies[-1] * 1000:.1f}ms'
+            )
+        if result['fan_out']:
+            self.stdout.write(
+                f'Time to reach all {connections} clients: median {statistics.median(result["fan_out"]) * 1000:.1f}ms'
+            )
+        self.stdout.write(f'Subscribers after disconnecting: {result["subscribers_after"]}')
+
+        if result['delivered'] < expected or result['subscribers_after']:
+            raise CommandError('Not every event was delivered, or subscriptions leaked.')
+        self.stdout.write(self.style.SUCCESS('Every client received every event.'))
+
+
+class LiveClient:
+    """One ASGI connection to the live stream, reading it the way a browser would."""
+
+    def __init__(self, application, session_key):
+        self.application = application
+        self.session_key = session_key
+        self.status = None
+        self.received = {}
+        self.ready = asyncio.Event()
+        self.disconnect = asyncio.Event()
+        self._requested = False
+        self._buffer = b''
+
+    def scope(self):
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': '/super-admin/live/',
+            'raw_path': b'/super-admin/live/',
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'accept', b'text/event-stream'),
+                (b'cookie', f'{settings.SESSION_COOKIE_NAME}={self.session_key}'.encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+
+    async def receive(self):
+        if not self._requested:
+            self._requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            if self.status != 200:
+                self.ready.set()
+            return
+        self._buffer += message.get('body', b'')
+        while b'\n\n' in self._buffer:
+            raw, self._buffer = self._buffer.split(b'\n\n', 1)
+            self.on_message(raw.decode())
+
+    def on_message(self, raw):
+        fields = dict(line.split(': ', 1) for line in raw.split('\n') if ': ' in line and not line.startswith(':'))
+        if fields.get('event') == 'totals':
+            self.ready.set()
+        elif fields.get('event') == 'transaction':
+            self.received[json.loads(fields['data'])['id']] = time.perf_counter()
+
+    async def run(self):
+        await self.application(self.scope(), self.receive, self.send)
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sneat_app.models import IdempotencyKey
+
+class Command(BaseCommand):
+    help = 'Deletes stored Idempotency-Key responses older than the retry window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Retry window to keep (default: 24)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} idempotency keys.'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import ledger
+
+class Command(BaseCommand):
+    help = 'Rebuilds (or verifies) the materialized MerchantBalance ledger from the Transaction table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare stored balances with the Transaction table without changing anything',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = ledger.verify_balances()
+            for merchant_id, field, stored, expected in mismatches:
+                self.stdout.write(
+                    self.style.WARNING(f'Merchant {merchant_id}: {field} is {stored}, expected {expected}')
+                )
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} balance value(s) out of date. Run rebuild_balances to fix.')
+            self.stdout.write(self.style.SUCCESS('All merchant balances are up to date.'))
+            return
+
+        count = ledger.rebuild_balances(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt balances for {count} merchants.'))
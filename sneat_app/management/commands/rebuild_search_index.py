@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from sneat_app import search
+
+class Command(BaseCommand):
+    help = 'Rebuilds the transaction and merchant search index from scratch'
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Search index rebuilt using {backend.__class__.__name__}.')
+        )
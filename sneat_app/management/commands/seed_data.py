@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import seeding
+
+class Command(BaseCommand):
+    help = (
+        'Generates synthetic merchants, users and transactions with realistic skew (power-law merchant sizes, '
+        'diurnal timestamps, a credit/debit mix) for scale testing, then rebuilds balances, rollups and search'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--merchants', type=int, default=1000, help='Merchants to create, each with a user')
+        parser.add_argument('--users', type=int, default=0, help='Plain (non-merchant) users to create')
+        parser.add_argument('--transactions', type=int, default=100000, help='Transactions to create')
+        parser.add_argument('--seed', type=int, default=0, help='The same seed always produces the same data')
+        parser.add_argument('--days', type=int, default=seeding.DEFAULT_DAYS,
+                            help='Spread transactions over this many days up to now')
+        parser.add_argument('--alpha', type=float, default=seeding.DEFAULT_ALPHA,
+                            help='Power-law exponent of merchant sizes (higher: more skewed)')
+        parser.add_argument('--credit-ratio', type=float, default=seeding.DEFAULT_CREDIT_RATIO,
+                            help='Share of transactions that are credits')
+        parser.add_argument('--inactive-ratio', type=float, default=seeding.DEFAULT_INACTIVE_RATIO,
+                            help='Share of merchants created inactive')
+        parser.add_argument('--prefix', default='seed', help='Usernames are <prefix>_merchant_<n> / <prefix>_user_<n>')
+        parser.add_argument('--password', default=seeding.DEFAULT_PASSWORD, help='Password of every seeded user')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Processes generating transactions (default: one per CPU)')
+        parser.add_argument('--chunk-size', type=int, default=seeding.DEFAULT_CHUNK_SIZE,
+                            help='Transactions generated and inserted per database transaction')
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='Keep the Transaction indexes during the load instead of rebuilding them after')
+
+    def handle(self, *args, **options):
+        for name in ('merchants', 'users', 'transactions'):
+            if options[name] < 0:
+                raise CommandError(f'--{name} cannot be negative.')
+        if not 0 <= options['credit_ratio'] <= 1 or not 0 <= options['inactive_ratio'] <= 1:
+            raise CommandError('--credit-ratio and --inactive-ratio must be between 0 and 1.')
+        if options['days'] < 1 or options['chunk_size'] < 1 or options['alpha'] <= 0:
+            raise CommandError('--days and --chunk-size must be at least 1, and --alpha positive.')
+        reported = [0]
+
+        def progress(count):
+            if count - reported[0] >= 500000 or count == options['transactions']:
+                reported[0] = count
+                self.stdout.write(f'{count} transactions')
+
+        try:
+            result = seeding.seed(
+                merchants=options['merchants'],
+                transactions=options['transactions'],
+                users=options['users'],
+                seed=options['seed'],
+                prefix=options['prefix'],
+                password=options['password'],
+                days=options['days'],
+                alpha=options['alpha'],
+                credit_ratio=options['credit_ratio'],
+                inactive_ratio=options['inactive_ratio'],
+                workers=options['workers'] or None,
+                chunk_size=options['chunk_size'],
+                defer_indexes=not options['keep_indexes'],
+                progress=progress,
+            )
+        except seeding.SeedError as e:
+            raise CommandError(str(e))
+
+        timings = result['timings']
+        self.stdout.write(', '.join(f'{step} {seconds:.1f}s' for step, seconds in timings.items()))
+        rate = result['transactions'] / max(timings.get('transactions', 0), 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result["merchants"]} merchants, {result["users"]} users and {result["transactions"]} '
+            f'transactions in {sum(timings.values()):.1f}s ({rate:,.0f} transactions/sec inserted).'
+        ))
+        if result['merchants'] or result['users']:
+            self.stdout.write(f'Seeded users log in with password {options["password"]!r}.')
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import stress
+
+class Command(BaseCommand):
+    help = (
+        'Runs concurrent reader and writer processes against copies of a seeded SQLite database with '
+        "Django's plain backend, the tuned one and the single-writer queue, and compares their throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', action='append', dest='modes', choices=list(stress.MODES),
+                            help='Only this mode; repeatable (default: all)')
+        parser.add_argument('--transactions', type=int, default=stress.DEFAULT_TRANSACTIONS,
+                            help='Transactions in the seeded database')
+        parser.add_argument('--readers', type=int, default=stress.DEFAULT_READERS, help='Reader processes')
+        parser.add_argument('--writers', type=int, default=stress.DEFAULT_WRITERS, help='Writer processes')
+        parser.add_argument('--writer-threads', type=int, default=stress.DEFAULT_WRITER_THREADS,
+                            help='Threads writing in each writer process')
+        parser.add_argument('--duration', type=float, default=stress.DEFAULT_DURATION,
+                            help='Seconds each mode runs for')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the generated data')
+        parser.add_argument('--reseed', action='store_true', help='Seed the database again even if it exists')
+        parser.add_argument('--data-dir', help='Where the databases live (default: SNEAT_BENCHMARK_ROOT/stress)')
+
+    def handle(self, *args, **options):
+        if options['readers'] < 0 or options['writers'] < 0 or options['readers'] + options['writers'] < 1:
+            raise CommandError('Run at least one reader or writer process.')
+        if options['writer_threads'] < 1 or options['duration'] <= 0:
+            raise CommandError('--writer-threads must be at least 1 and --duration positive.')
+
+        def progress(step):
+            if step == 'seed':
+                self.stdout.write(f'Seeding {options["transactions"]} transactions...')
+            else:
+                self.stdout.write(f'Stressing {step} for {options["duration"]:g}s...')
+
+        try:
+            results = stress.run(
+                modes=options['modes'] or tuple(stress.MODES),
+                directory=options['data_dir'],
+                transactions=options['transactions'],
+                reseed=options['reseed'],
+                seed=options['seed'],
+                progress=progress,
+                readers=options['readers'],
+                writers=options['writers'],
+                threads=options['writer_threads'],
+                duration=options['duration'],
+            )
+        except stress.StressError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f'\n{"mode":<8}{"reads/s":>10}{"p50 ms":>9}{"p99 ms":>9}{"errors":>8}'
+            f'{"writes/s":>10}{"p50 ms":>9}{"p99 ms":>9}{"errors":>8}'
+        )
+        for mode, result in results.items():
+            row = f'{mode:<8}'
+            for kind in ('reads', 'writes'):
+                summary = result[kind]
+                row += f'{summary["throughput"]:>{10}.1f}{self.format(summary["p50_ms"])}' \
+                       f'{self.format(summary["p99_ms"])}{summary["errors"]:>8}'
+            self.stdout.write(row)
+
+    @staticmethod
+    def format(value):
+        return f'{"-":>9}' if value is None else f'{value:>9.1f}'
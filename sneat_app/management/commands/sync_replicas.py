@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sneat_app import replicas
+
+class Command(BaseCommand):
+    help = 'Copies the SQLite primary database into the SQLite read replicas (SNEAT_DATABASE_REPLICAS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', action='append', dest='aliases', help='Only this replica alias; repeatable')
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep copying every this many seconds, like a replica lagging behind by up to that long',
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or replicas.replicas()
+        unknown = set(aliases) - set(replicas.replicas())
+        if unknown:
+            raise CommandError(f'Not a read replica: {", ".join(sorted(unknown))}.')
+        if not aliases:
+            raise CommandError('No read replicas configured; set SNEAT_DATABASE_REPLICAS.')
+        if options['interval'] is not None and options['interval'] <= 0:
+            raise CommandError('--interval must be positive.')
+
+        while True:
+            try:
+                timings = replicas.copy_to_replicas(aliases)
+            except replicas.ReplicaError as e:
+                raise CommandError(str(e))
+            for alias, seconds in timings.items():
+                self.stdout.write(self.style.SUCCESS(f'Copied the primary to {alias} in {seconds:.2f}s.'))
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,249 @@
+"""
+Per-request query and render instrumentation.
+
+``QueryInstrumentationMiddleware`` (sync and async) records, through an
+``execute_wrapper`` on every database connection, the number of queries,
+the time spent in SQL, how often each query *fingerprint* (the SQL with
+literals and ``IN`` lists collapsed) repeats, and the time spent rendering
+templates. The numbers go out as a ``Server-Timing`` header and as
+one JSON log line on the ``sneat_app.requests`` logger.
+
+``SNEAT_QUERY_BUDGETS`` maps URL names (``'sneat_app:merchant_list'``) to the
+most queries a request to that view may run. Going over budget logs a
+warning, or raises ``QueryBudgetExceeded`` when ``SNEAT_QUERY_BUDGET_STRICT``
+is on, as it is under ``manage.py test`` (and in ``sneat_app.testing``'s
+``QueryBudgetMixin``), so an N+1 fails the tests.
+"""
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import base as template_base
+from django.template.backends import jinja2 as jinja2_backend
+
+logger = logging.getLogger('sneat_app.requests')
+
+# Metrics of the request being handled in this context, if any. Context
+# variables follow sync_to_async into worker threads, so queries an async
+# view runs on a thread pool are counted against its request too.
+_current = contextvars.ContextVar('sneat_request_metrics', default=None)
+# Nesting depth of Template.render, so includes are not counted twice
+_render_depth = contextvars.ContextVar('sneat_render_depth', default=0)
+# Callables notified with every finished request's metrics (see sneat_app.testing).
+listeners = []
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Normalise ``sql`` so queries differing only in their parameters compare equal."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self.fingerprints = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.view_name = None
+        self.status_code = None
+        self.path = ''
+        self.method = ''
+        # Async views record from several threads at once
+        self._lock = threading.Lock()
+
+    @property
+    def duplicates(self):
+        """Fingerprints run more than once, most repeated first."""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > 1]
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for _, count in self.duplicates)
+
+    def record_query(self, sql, elapsed):
+        sql = fingerprint(sql)
+        with self._lock:
+            self.queries += 1
+            self.sql_time += elapsed
+            self.fingerprints[sql] += 1
+
+    def record_cache(self, hit):
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f};desc="Template render"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'method': self.method,
+            'path': self.path,
+            'view': self.view_name,
+            'status': self.status_code,
+            'queries': self.queries,
+            'duplicate_queries': self.duplicate_queries,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+            'duplicates': [{'sql': sql, 'count': count} for sql, count in self.duplicates[:5]],
+        }
+
+
+def current_metrics():
+    return _current.get()
+
+
+def _timed_render(render):
+    def wrapper(self, context=None, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return render(self, context, *args, **kwargs)
+        depth = _render_depth.get()
+        _render_depth.set(depth + 1)
+        started = time.perf_counter()
+        try:
+            return render(self, context, *args, **kwargs)
+        finally:
+            _render_depth.set(depth)
+            if depth == 0:
+                with metrics._lock:
+                    metrics.template_time += time.perf_counter() - started
+    wrapper.__wrapped__ = render
+    return wrapper
+
+
+def install_template_timer():
+    """Time Django and Jinja2 template rendering for instrumented requests."""
+    for template_class in (template_base.Template, jinja2_backend.Template):
+        render = template_class.render
+        if not hasattr(render, '__wrapped__'):
+            template_class.render = _timed_render(render)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+def _add_query_recorder(sender=None, connection=None, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def install_query_recorder():
+    """
+    Record queries on every connection, in every thread, for the request
+    whose metrics are current in that context.
+    """
+    connection_created.connect(_add_query_recorder, dispatch_uid='sneat_query_recorder')
+    for connection in connections.all(initialized_only=True):
+        _add_query_recorder(connection=connection)
+
+
+def query_budget(view_name):
+    return getattr(settings, 'SNEAT_QUERY_BUDGETS', {}).get(view_name)
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_template_timer()
+        install_query_recorder()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = self.start(request)
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = self.start(request)
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self, request):
+        metrics = RequestMetrics()
+        metrics.method = request.method
+        metrics.path = request.path
+        return metrics
+
+    def finish(self, request, response, metrics):
+        metrics.finish()
+        match = getattr(request, 'resolver_match', None)
+        metrics.view_name = match.view_name if match else None
+        metrics.status_code = response.status_code
+        if getattr(settings, 'SNEAT_SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = metrics.server_timing()
+        logger.info(json.dumps(metrics.as_dict()))
+        for listener in listeners:
+            listener(metrics)
+        self.check_budget(metrics)
+        return response
+
+    def check_budget(self, metrics):
+        budget = query_budget(metrics.view_name)
+        if budget is None or metrics.queries <= budget:
+            return
+        message = f'{metrics.view_name} ran {metrics.queries} queries (budget {budget}).'
+        if metrics.duplicates:
+            sql, count = metrics.duplicates[0]
+            message += f' Most repeated ({count}x): {sql}'
+        if getattr(settings, 'SNEAT_QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
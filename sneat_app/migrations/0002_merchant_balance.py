@@ -0,0 +1,69 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+
+def backfill_balances(apps, schema_editor):
+    Merchant = apps.get_model('sneat_app', 'Merchant')
+    MerchantBalance = apps.get_model('sneat_app', 'MerchantBalance')
+    Transaction = apps.get_model('sneat_app', 'Transaction')
+
+    rows = {
+        row['merchant_id']: row
+        for row in Transaction.objects.order_by().values('merchant_id').annotate(
+            credit_total=Sum('amount', filter=Q(type='credit')),
+            debit_total=Sum('amount', filter=Q(type='debit')),
+            credit_count=Count('id', filter=Q(type='credit')),
+            debit_count=Count('id', filter=Q(type='debit')),
+            last_activity_at=Max('created_at'),
+        )
+    }
+    balances = []
+    for merchant_id in Merchant.objects.values_list('id', flat=True):
+        row = rows.get(merchant_id)
+        if row is None:
+            balances.append(MerchantBalance(merchant_id=merchant_id))
+            continue
+        credit_total = row['credit_total'] or 0
+        debit_total = row['debit_total'] or 0
+        balances.append(MerchantBalance(
+            merchant_id=merchant_id,
+            credit_total=credit_total,
+            debit_total=debit_total,
+            net_total=credit_total - debit_total,
+            credit_count=row['credit_count'],
+            debit_count=row['debit_count'],
+            transaction_count=row['credit_count'] + row['debit_count'],
+            last_activity_at=row['last_activity_at'],
+        ))
+    MerchantBalance.objects.bulk_create(balances, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sneat_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MerchantBalance',
+            fields=[
+                ('merchant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='sneat_app.merchant')),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('net_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('credit_count', models.PositiveIntegerField(default=0)),
+                ('debit_count', models.PositiveIntegerField(default=0)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-credit_total'],
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:22
+
+import django.db.models.deletion
+from datetime import timezone
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    RevenueRollup = apps.get_model('sneat_app', 'RevenueRollup')
+    Transaction = apps.get_model('sneat_app', 'Transaction')
+
+    for granularity, trunc in (('hour', TruncHour), ('day', TruncDay), ('month', TruncMonth)):
+        rows = Transaction.objects.order_by().annotate(
+            bucket=trunc('created_at', tzinfo=timezone.utc)
+        ).values('bucket', 'merchant_id', 'type').annotate(total=Sum('amount'), count=Count('id'))
+        global_totals = {}
+        rollups = []
+        for row in rows:
+            total, count = global_totals.get((row['bucket'], row['type']), (0, 0))
+            global_totals[(row['bucket'], row['type'])] = (total + row['total'], count + row['count'])
+            rollups.append(RevenueRollup(
+                granularity=granularity, bucket_start=row['bucket'], merchant_id=row['merchant_id'],
+                type=row['type'], total=row['total'], count=row['count'],
+            ))
+        for (bucket, type_), (total, count) in global_totals.items():
+            rollups.append(RevenueRollup(
+                granularity=granularity, bucket_start=bucket, type=type_, total=total, count=count,
+            ))
+        RevenueRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sneat_app', '0002_merchant_balance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily'), ('month', 'Monthly')], max_length=5)),
+                ('bucket_start', models.DateTimeField()),
+                ('type', models.CharField(choices=[('credit', 'Credit'), ('debit', 'Debit')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('merchant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='sneat_app.merchant')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='revenuerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('merchant__isnull', False)), fields=('merchant', 'granularity', 'bucket_start', 'type'), name='unique_merchant_revenue_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='revenuerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('merchant__isnull', True)), fields=('granularity', 'bucket_start', 'type'), name='unique_global_revenue_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
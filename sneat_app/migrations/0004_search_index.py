@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from sneat_app.search.backends import create_fts_tables, drop_fts_tables
+
+
+def create_search_index(apps, schema_editor):
+    create_fts_tables(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    drop_fts_tables(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sneat_app', '0003_revenue_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.2 on 2026-10-17 10:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sneat_app', '0004_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='merchant',
+            index=models.Index(fields=['created_at', 'id'], name='merchant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='merchant',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='merchant_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='merchantbalance',
+            index=models.Index(fields=['-credit_total'], name='balance_credit_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['created_at', 'id'], name='transaction_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['type', 'created_at', 'id'], name='transaction_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['merchant', 'created_at', 'id'], name='transaction_merchant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['merchant', 'type', 'created_at', 'amount'], name='transaction_merchant_type_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F
+from django.db.models.functions import Cast, Round
+
+import sneat_app.fields
+
+
+def amounts_to_minor_units(apps, schema_editor):
+    Transaction = apps.get_model('sneat_app', 'Transaction')
+    # amount has at most two decimal places, so rounding amount * 100 only
+    # absorbs the binary error of SQLite's REAL storage; nothing is lost.
+    Transaction.objects.using(schema_editor.connection.alias).update(
+        amount_minor=Cast(Round(F('amount') * 100), models.BigIntegerField()),
+    )
+
+
+def minor_units_to_amounts(apps, schema_editor):
+    Transaction = apps.get_model('sneat_app', 'Transaction')
+    Transaction.objects.using(schema_editor.connection.alias).update(
+        # A float divisor: SQLite divides integers by integers with truncation.
+        amount=ExpressionWrapper(
+            F('amount_minor') / 100.0, output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sneat_app', '0007_api_tokens_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_merchant_type_idx',
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='currency',
+            field=models.CharField(default='USD', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='amount_minor',
+            field=models.BigIntegerField(null=True),
+        ),
+        # Nullable so that reversing can add the column back before refilling it.
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(amounts_to_minor_units, minor_units_to_amounts),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='amount',
+        ),
+        migrations.RenameField(
+            model_name='transaction',
+            old_name='amount_minor',
+            new_name='amount',
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=sneat_app.fields.MinorUnitsField(),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['merchant', 'type', 'created_at', 'amount'], name='transaction_merchant_type_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-17 16:05
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sneat_app', '0008_transaction_amount_minor_units'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # auth_user belongs to django.contrib.auth, so its index is created here rather than in a Meta;
+    # LOWER(email) matches the case-insensitive lookup in sneat_app.backends.
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX auth_user_email_lower_idx ON auth_user (LOWER(email))',
+            'DROP INDEX auth_user_email_lower_idx',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 13:19
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sneat_app', '0009_user_email_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='transaction',
+            name='currency',
+        ),
+    ]
@@ -2,6 +2,9 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from . import writes
+from .fields import MinorUnitsField
+
 class Merchant(models.Model):
     STATUS_CHOICES = [
         ('active', 'Active'),
@@ -21,6 +24,11 @@ class Merchant(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # merchant_list pages by (created_at, id), optionally filtered by status
+            models.Index(fields=['created_at', 'id'], name='merchant_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='merchant_status_created_idx'),
+        ]
 
 class Transaction(models.Model):
     TYPE_CHOICES = [
@@ -30,13 +38,137 @@ class Transaction(models.Model):
     
     id = models.AutoField(primary_key=True)
     merchant = models.ForeignKey(Merchant, on_delete=models.CASCADE, related_name='transactions')
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Stored as integer cents; a Decimal in Python (see fields.py)
+    amount = MinorUnitsField()
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     description = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add, so bulk imports can keep the original settlement timestamps
+    created_at = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         return f"{self.merchant.user.get_full_name()} - {self.type} - ${self.amount}"
     
+    def save(self, *args, **kwargs):
+        # Keep the row and its MerchantBalance update (see signals.py) in one transaction.
+        with writes.atomic_write(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with writes.atomic_write(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # transaction_list and the admin changelist page by (created_at, id), optionally by type
+            models.Index(fields=['created_at', 'id'], name='transaction_created_idx'),
+            models.Index(fields=['type', 'created_at', 'id'], name='transaction_type_created_idx'),
+            # A merchant's recent transactions and last activity
+            models.Index(fields=['merchant', 'created_at', 'id'], name='transaction_merchant_idx'),
+            # Covers per-merchant credit/debit sums (ledger rebuilds, statements)
+            models.Index(fields=['merchant', 'type', 'created_at', 'amount'], name='transaction_merchant_type_idx'),
+        ]
+
+class MerchantBalance(models.Model):
+    """Running totals for a merchant, maintained by ``sneat_app.ledger``."""
+    merchant = models.OneToOneField(Merchant, on_delete=models.CASCADE, primary_key=True, related_name='balance')
+    credit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    debit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    net_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    credit_count = models.PositiveIntegerField(default=0)
+    debit_count = models.PositiveIntegerField(default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.merchant.business_name} - ${self.net_total}"
+    
+    class Meta:
+        ordering = ['-credit_total']
+        indexes = [
+            # reports' top merchants by revenue
+            models.Index(fields=['-credit_total'], name='balance_credit_total_idx'),
+        ]
+
+class ImportCheckpoint(models.Model):
+    """Progress of a bulk transaction import, committed together with each chunk."""
+    source = models.CharField(max_length=255, unique=True)
+    line = models.PositiveBigIntegerField(default=0)
+    inserted = models.PositiveBigIntegerField(default=0)
+    rejected = models.PositiveBigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.source} - line {self.line}"
+
+class RevenueRollup(models.Model):
+    """Per-bucket transaction totals, maintained by ``sneat_app.rollups``.
+
+    Rows with no merchant hold the global totals for the bucket.
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+        ('month', 'Monthly'),
+    ]
+    
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    merchant = models.ForeignKey(Merchant, on_delete=models.CASCADE, related_name='revenue_rollups', blank=True, null=True)
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES)
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        scope = self.merchant.business_name if self.merchant_id else 'All merchants'
+        return f"{scope} - {self.granularity} {self.bucket_start:%Y-%m-%d %H:00} - {self.type} - ${self.total}"
+    
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['merchant', 'granularity', 'bucket_start', 'type'],
+                condition=models.Q(merchant__isnull=False),
+                name='unique_merchant_revenue_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'type'],
+                condition=models.Q(merchant__isnull=True),
+                name='unique_global_revenue_rollup',
+            ),
+        ]
+
+class ApiToken(models.Model):
+    """Bearer token for the JSON API. Only a SHA-256 hash of the token is stored."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100)
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.name}"
+
+class IdempotencyKey(models.Model):
+    """Stored response for an ``Idempotency-Key``, so client retries never double-post."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response_body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.key}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
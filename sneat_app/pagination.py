@@ -0,0 +1,194 @@
+"""
+Keyset (cursor) pagination.
+
+Unlike ``django.core.paginator.Paginator`` this never issues ``COUNT(*)``
+or ``OFFSET``: each page is a range scan that starts right after the last
+row of the previous page, keyed on ``(created_at, id)`` to match the
+``-created_at`` ordering of ``Merchant`` and ``Transaction``.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_COUNT_LIMIT = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk, direction):
+    payload = json.dumps([created_at.isoformat(), pk, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, pk, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = parse_datetime(created_at)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise InvalidCursor(token)
+    if created_at is None or not isinstance(pk, int) or direction not in ('next', 'prev'):
+        raise InvalidCursor(token)
+    return created_at, pk, direction
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor='', previous_cursor='', count=None, count_is_exact=False):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.count_is_exact = count_is_exact
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return bool(self.next_cursor)
+
+    @property
+    def has_previous(self):
+        return bool(self.previous_cursor)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class CursorPaginator:
+    """Paginate a queryset newest-first by ``(created_at, id)``."""
+
+    def __init__(self, queryset, per_page, count_limit=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        if count_limit is None:
+            count_limit = getattr(settings, 'SNEAT_PAGINATION_COUNT_LIMIT', DEFAULT_COUNT_LIMIT)
+        self.count_limit = count_limit
+
+    def get_page(self, cursor=None):
+        """Return the page after/before ``cursor``, or the first page for a missing/invalid cursor."""
+        position = None
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+            except InvalidCursor:
+                position = None
+
+        if position is None:
+            rows = list(self.queryset.order_by('-created_at', '-pk')[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            has_previous = False
+        else:
+            created_at, pk, direction = position
+            if direction == 'next':
+                rows = list(
+                    self.queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+                    .order_by('-created_at', '-pk')[:self.per_page + 1]
+                )
+                has_next = len(rows) > self.per_page
+                has_previous = True
+            else:
+                rows = list(
+                    self.queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+                    .order_by('created_at', 'pk')[:self.per_page + 1]
+                )
+                has_previous = len(rows) > self.per_page
+                has_next = True
+                rows = rows[:self.per_page][::-1]
+        rows = rows[:self.per_page]
+
+        next_cursor = previous_cursor = ''
+        if rows and has_next:
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].pk, 'next')
+        if rows and has_previous:
+            previous_cursor = encode_cursor(rows[0].created_at, rows[0].pk, 'prev')
+
+        count, exact = (None, False)
+        if self.count_limit:
+            count, exact = approximate_count(self.queryset, self.count_limit)
+        return CursorPage(rows, next_cursor, previous_cursor, count, exact)
+
+
+class RankedPaginator:
+    """
+    Paginate a precomputed, bounded list of primary keys in rank order.
+
+    Used for search results, where the order comes from the search index
+    rather than ``created_at``. The cursor is simply the offset into the
+    id list, and only the rows of the requested page are loaded.
+    """
+
+    def __init__(self, queryset, ranked_ids, per_page, count_is_exact=True):
+        self.queryset = queryset
+        self.ranked_ids = list(ranked_ids)
+        self.per_page = per_page
+        self.count_is_exact = count_is_exact
+
+    def get_page(self, cursor=None):
+        try:
+            offset = max(int(cursor or 0), 0)
+        except ValueError:
+            offset = 0
+        page_ids = self.ranked_ids[offset:offset + self.per_page]
+        objects = {obj.pk: obj for obj in self.queryset.filter(pk__in=page_ids)}
+        rows = [objects[pk] for pk in page_ids if pk in objects]
+
+        next_cursor = previous_cursor = ''
+        if offset + self.per_page < len(self.ranked_ids):
+            next_cursor = str(offset + self.per_page)
+        if offset > 0:
+            previous_cursor = str(max(offset - self.per_page, 0))
+        return CursorPage(rows, next_cursor, previous_cursor, len(self.ranked_ids), self.count_is_exact)
+
+
+def _table_estimate(model, using):
+    """Planner row estimate for an unfiltered table, or ``None`` if unavailable."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # The first number of every stat row is the table's row count.
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None:
+        return None
+    try:
+        estimate = int(str(row[0]).split()[0])
+    except ValueError:
+        return None
+    return estimate if estimate >= 0 else None
+
+
+def approximate_count(queryset, limit=DEFAULT_COUNT_LIMIT):
+    """
+    Return ``(count, is_exact)`` without counting more than ``limit`` rows.
+
+    Unfiltered querysets use the database's table statistics when they are
+    available. Otherwise at most ``limit + 1`` rows are counted, and when the
+    cap is hit ``limit`` is returned with ``is_exact=False`` (rendered as
+    "1000+").
+    """
+    if not queryset.query.where:
+        estimate = _table_estimate(queryset.model, queryset.db)
+        if estimate is not None and estimate > limit:
+            return estimate, False
+    capped = queryset.order_by().values('pk')[:limit + 1].count()
+    if capped > limit:
+        return limit, False
+    return capped, True
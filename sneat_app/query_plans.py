@@ -0,0 +1,112 @@
+"""
+Registry of hot queries whose plans must stay index-backed.
+
+Each entry builds the same queryset a view or admin page runs on every
+request. ``manage.py check_query_plans`` explains them and fails when one
+of them needs a full table scan, so a missing or unusable index is caught
+before it ships.
+"""
+import re
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .backends import candidates
+from .models import Merchant, RevenueRollup, Transaction
+from .views import merchant_rows, transaction_rows
+
+HOT_QUERIES = {}
+
+# "SCAN <table>" without "USING [COVERING] INDEX" is a full table scan.
+FULL_SCAN_RE = re.compile(r'\bSCAN (?!.*\bUSING\b.*\bINDEX\b)(\S+)')
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY')
+
+
+def hot_query(name):
+    def register(builder):
+        HOT_QUERIES[name] = builder
+        return builder
+    return register
+
+
+def _cursor_position():
+    return timezone.now() - timedelta(days=1), 1
+
+
+@hot_query('transaction_list')
+def transaction_list():
+    return transaction_rows(Transaction.objects.order_by('-created_at', '-pk'))[:11]
+
+
+@hot_query('transaction_list_next_page')
+def transaction_list_next_page():
+    created_at, pk = _cursor_position()
+    return transaction_rows(Transaction.objects.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+    )).order_by('-created_at', '-pk')[:11]
+
+
+@hot_query('transaction_list_by_type')
+def transaction_list_by_type():
+    return transaction_rows(Transaction.objects.filter(type='credit')).order_by('-created_at', '-pk')[:11]
+
+
+@hot_query('merchant_dashboard_recent_transactions')
+def merchant_dashboard_recent_transactions():
+    return Transaction.objects.filter(merchant_id=1).order_by('-created_at')[:5]
+
+
+@hot_query('merchant_last_activity')
+def merchant_last_activity():
+    return Transaction.objects.filter(merchant_id=1).order_by('-created_at').values('created_at')[:1]
+
+
+@hot_query('merchant_credit_total')
+def merchant_credit_total():
+    return Transaction.objects.filter(merchant_id=1, type='credit').order_by().values('amount')
+
+
+@hot_query('merchant_list')
+def merchant_list():
+    return merchant_rows(Merchant.objects.order_by('-created_at', '-pk'))[:11]
+
+
+@hot_query('merchant_list_by_status')
+def merchant_list_by_status():
+    return merchant_rows(Merchant.objects.filter(status='active')).order_by('-created_at', '-pk')[:11]
+
+
+@hot_query('reports_top_merchants')
+def reports_top_merchants():
+    return Merchant.objects.filter(balance__isnull=False).annotate(
+        total_revenue=F('balance__credit_total'),
+        email=F('user__email'),
+    ).order_by('-balance__credit_total')[:10]
+
+
+@hot_query('reports_rollup_range')
+def reports_rollup_range():
+    now = timezone.now()
+    return RevenueRollup.objects.filter(
+        merchant__isnull=True, granularity='day',
+        bucket_start__gte=now - timedelta(days=30), bucket_start__lt=now,
+    ).order_by().values('type')
+
+
+@hot_query('login_lookup')
+def login_lookup():
+    return candidates('someone@example.com')
+
+
+def explain(queryset):
+    """Return the query plan as text."""
+    return queryset.explain()
+
+
+def problems(plan, allow_temp_sort=True):
+    """List the full scans (and optionally temp sorts) found in ``plan``."""
+    found = [f'full table scan of {table}' for table in FULL_SCAN_RE.findall(plan)]
+    if not allow_temp_sort and TEMP_SORT_RE.search(plan):
+        found.append('sort in a temporary B-tree')
+    return found
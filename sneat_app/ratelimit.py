@@ -0,0 +1,272 @@
+"""
+Rate limits on the login, registration and write views.
+
+``SNEAT_RATE_LIMITS`` maps URL names (``'sneat_app:unified_login'``) to
+rules written ``"<key>:<count>/<period>"``, e.g. ``'ip:20/m'`` or
+``'user:60/5m'`` (periods in ``s``, ``m``, ``h`` or ``d``). The key says
+whose requests are counted together:
+
+* ``ip``: the client address;
+* ``username``: the username or email a login form posts, so one
+  account cannot be guessed at from many addresses;
+* ``user``: the signed-in user, read from the session.
+
+``RateLimitMiddleware`` (sync and async) checks the rules of the resolved
+URL name for unsafe methods only, before the view runs and before the
+user is loaded, so a throttled request costs no password hash and no
+write. ``ip`` and ``username`` rules go first because they need no
+database at all; a ``user`` rule loads the session. Over the limit, the
+response is a 429 with a ``Retry-After`` header.
+
+Counts are sliding windows: the current fixed window's count plus the
+previous window's, weighted by how much of it still overlaps the last
+``period`` seconds. That needs two counters per key and never lets a
+burst at a window boundary through twice. ``SNEAT_RATE_LIMIT_BACKEND``
+chooses where the counters live:
+
+* ``memory``: a dict in each process, behind striped locks so concurrent
+  requests for different keys rarely wait on each other. No I/O, but
+  every worker process counts on its own.
+* ``cache``: the ``SNEAT_RATE_LIMIT_CACHE`` cache, shared by all workers,
+  using atomic ``add``/``incr`` (atomic on Redis and locmem).
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+KEYS = ('ip', 'username', 'user')
+# Keys identified without touching the session, checked before the others
+SESSIONLESS_KEYS = ('ip', 'username')
+UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+CACHE_PREFIX = 'sneat:ratelimit'
+DEFAULT_MAX_KEYS = 100000
+
+_RULE_RE = re.compile(r'^(?P<key>\w+):(?P<count>\d+)/(?P<periods>\d*)(?P<unit>[smhd])$')
+
+Rule = namedtuple('Rule', ['text', 'key', 'limit', 'window'])
+
+
+class RateLimitError(ValueError):
+    pass
+
+
+def parse_rule(text):
+    """``'ip:20/m'`` -> ``Rule(text, 'ip', 20, 60)``."""
+    match = _RULE_RE.match(text.replace(' ', ''))
+    if match is None or match['key'] not in KEYS:
+        raise RateLimitError(
+            f'Invalid rate limit {text!r}: use "<key>:<count>/<period>" with key one of {", ".join(KEYS)}.'
+        )
+    window = int(match['periods'] or 1) * UNITS[match['unit']]
+    if not window or not int(match['count']):
+        raise RateLimitError(f'Invalid rate limit {text!r}: count and period must be positive.')
+    return Rule(text, match['key'], int(match['count']), window)
+
+
+@lru_cache(maxsize=None)
+def _parse_rules(texts):
+    rules = [parse_rule(text) for text in texts]
+    return tuple(sorted(rules, key=lambda rule: rule.key not in SESSIONLESS_KEYS))
+
+
+def rules_for(view_name):
+    """The parsed rules of ``view_name``, session-less keys first."""
+    return _parse_rules(tuple(getattr(settings, 'SNEAT_RATE_LIMITS', {}).get(view_name, ())))
+
+
+def estimate(previous, current, elapsed, window):
+    """Requests in the sliding window ending now, from two fixed windows' counts."""
+    return previous * (1 - elapsed / window) + current
+
+
+def retry_after(previous, current, limit, elapsed, window):
+    """Whole seconds until ``estimate`` is back within ``limit``, assuming no more requests."""
+    if current <= limit and previous:
+        # The previous window's share shrinks until the estimate fits
+        wait = window * (1 - (limit - current) / previous) - elapsed
+    else:
+        # Only the next window starts from zero
+        wait = window - elapsed
+    return max(math.ceil(wait), 1)
+
+
+class MemoryBackend:
+    """Counters in this process: ``key -> [window index, previous count, current count]``."""
+    stripes = 64
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self._stripes = [({}, threading.Lock()) for _ in range(self.stripes)]
+        self._max_keys = max(max_keys // self.stripes, 1)
+
+    def hit(self, key, window, now):
+        """Count a request for ``key``; returns ``(previous, current)`` window counts."""
+        counters, lock = self._stripes[hash(key) % self.stripes]
+        index = int(now // window)
+        with lock:
+            state = counters.get(key)
+            if state is None or state[0] < index - 1:
+                state = counters[key] = [index, 0, 0]
+            elif state[0] == index - 1:
+                state[:] = [index, state[2], 0]
+            state[2] += 1
+            previous, current = state[1], state[2]
+            if len(counters) > self._max_keys:
+                self._evict(counters)
+        return previous, current
+
+    async def ahit(self, key, window, now):
+        return self.hit(key, window, now)
+
+    def _evict(self, counters):
+        # Keys are inserted in first-seen order; drop the oldest half of the stripe
+        for key in list(counters)[:len(counters) // 2]:
+            del counters[key]
+
+
+class CacheBackend:
+    """Counters in a Django cache, one entry per key and fixed window."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _keys(self, key, window, now):
+        index = int(now // window)
+        return f'{CACHE_PREFIX}:{key}:{index - 1}', f'{CACHE_PREFIX}:{key}:{index}'
+
+    def hit(self, key, window, now):
+        previous_key, current_key = self._keys(key, window, now)
+        # Kept for two windows: as the current window, then as the previous one
+        self.cache.add(current_key, 0, timeout=window * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add and incr
+            self.cache.set(current_key, 1, timeout=window * 2)
+            current = 1
+        return self.cache.get(previous_key, 0), current
+
+    async def ahit(self, key, window, now):
+        previous_key, current_key = self._keys(key, window, now)
+        await self.cache.aadd(current_key, 0, timeout=window * 2)
+        try:
+            current = await self.cache.aincr(current_key)
+        except ValueError:
+            await self.cache.aset(current_key, 1, timeout=window * 2)
+            current = 1
+        return await self.cache.aget(previous_key, 0), current
+
+
+@lru_cache(maxsize=None)
+def _backend(name, alias):
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'cache':
+        return CacheBackend(alias)
+    raise RateLimitError(f'Unknown SNEAT_RATE_LIMIT_BACKEND {name!r}: use "memory" or "cache".')
+
+
+def backend():
+    return _backend(
+        getattr(settings, 'SNEAT_RATE_LIMIT_BACKEND', 'memory'),
+        getattr(settings, 'SNEAT_RATE_LIMIT_CACHE', 'default'),
+    )
+
+
+def identify(request, key):
+    """Who ``request`` counts against for ``key``, or None when the rule does not apply."""
+    if key == 'ip':
+        return request.META.get('REMOTE_ADDR') or None
+    if key == 'username':
+        return request.POST.get('username', '').strip().lower() or None
+    session = getattr(request, 'session', None)
+    return session.get(SESSION_KEY) if session is not None else None
+
+
+def counter_key(view_name, rule, identity):
+    # Hashed: usernames are arbitrary user input, unfit for cache keys as they are
+    digest = hashlib.sha256(str(identity).encode()).hexdigest()[:32]
+    return f'{view_name}:{rule.key}:{rule.limit}/{rule.window}:{digest}'
+
+
+def too_many_requests(retry_after_seconds):
+    response = HttpResponse(
+        'Too many requests. Please try again later.\n', status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(retry_after_seconds)
+    return response
+
+
+class RateLimitMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        view_name, rules = self.rules(request)
+        limiter = backend()
+        for rule in rules:
+            identity = identify(request, rule.key)
+            if identity is None:
+                continue
+            now = time.time()
+            counts = limiter.hit(counter_key(view_name, rule, identity), rule.window, now)
+            response = self.check(rule, counts, now)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        view_name, rules = self.rules(request)
+        limiter = backend()
+        for rule in rules:
+            if rule.key in SESSIONLESS_KEYS:
+                identity = identify(request, rule.key)
+            else:
+                # Sessions load through the synchronous ORM
+                identity = await sync_to_async(identify)(request, rule.key)
+            if identity is None:
+                continue
+            now = time.time()
+            counts = await limiter.ahit(counter_key(view_name, rule, identity), rule.window, now)
+            response = self.check(rule, counts, now)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def rules(self, request):
+        if request.method in SAFE_METHODS:
+            return None, ()
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return None, ()
+        return view_name, rules_for(view_name)
+
+    def check(self, rule, counts, now):
+        previous, current = counts
+        elapsed = now % rule.window
+        if estimate(previous, current, elapsed, rule.window) <= rule.limit:
+            return None
+        return too_many_requests(retry_after(previous, current, rule.limit, elapsed, rule.window))
@@ -0,0 +1,192 @@
+"""
+Read replicas for the read-heavy views.
+
+``SNEAT_READ_REPLICAS`` names database aliases holding copies of
+``default``. ``ReplicaMiddleware`` (sync and async) picks one of them at
+random for a GET or HEAD to a view listed in ``SNEAT_REPLICA_VIEWS``, and
+``ReplicaRouter`` sends that request's reads there. Everything else reads
+and writes the primary:
+
+* every other request, and all code outside a request (commands, workers);
+* models of ``PRIMARY_APPS`` (sessions, users), which must never be seen
+  stale or a fresh login would look signed out;
+* reads after the request's first write, so it sees what it wrote.
+
+Read-your-writes across requests: a request that writes, and any POST,
+sets the ``sneat_primary_until`` cookie for ``SNEAT_REPLICA_PIN_SECONDS``
+(longer than the replicas lag behind), and that browser's requests read
+the primary until it expires; e.g. the transaction list shown after
+adding a transaction. Streaming responses (exports, live events) run
+their queries after the middleware returns and so read the primary.
+
+Values cached for every request (``caching.cached``, dashboard fragments,
+the revenue chart) are computed inside ``read_primary()``: the cache keys them by the
+current generation, and a replica lagging behind that generation would
+otherwise be served to everyone until the next write.
+
+Connections to every alias persist for ``CONN_MAX_AGE`` seconds and are
+checked with ``CONN_HEALTH_CHECKS`` before reuse. With SQLite, each path in
+``SNEAT_DATABASE_REPLICAS`` becomes a replica alias and ``manage.py
+sync_replicas`` copies the primary into them, once or every few seconds;
+with PostgreSQL, add the streaming replicas to ``DATABASES`` (with
+``'TEST': {'MIRROR': 'default'}``) and list their aliases. Either way,
+reading from more replicas is a matter of adding aliases.
+"""
+import contextvars
+import math
+import random
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import Resolver404, resolve
+
+PRIMARY = DEFAULT_DB_ALIAS
+PRIMARY_APPS = ('auth', 'sessions', 'contenttypes', 'admin')
+PIN_COOKIE = 'sneat_primary_until'
+DEFAULT_PIN_SECONDS = 10
+SAFE_METHODS = ('GET', 'HEAD')
+
+# Routing state of the request being handled in this context. Context variables follow
+# sync_to_async into worker threads (see sneat_app.aio), so reads an async view runs on
+# the shared pool go to the same replica.
+_current = contextvars.ContextVar('sneat_replica_state', default=None)
+
+
+class ReplicaError(ValueError):
+    pass
+
+
+class RequestState:
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, 'SNEAT_READ_REPLICAS', [])
+
+
+def pin_seconds():
+    return getattr(settings, 'SNEAT_REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+
+
+def current_replica():
+    """The replica the current request reads from, or None when it reads the primary."""
+    state = _current.get()
+    return state.replica if state is not None and not state.wrote else None
+
+
+@contextmanager
+def read_primary():
+    """Send this block's reads to the primary, even in a request reading a replica."""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = current_replica()
+        if replica is None or model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        return replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema from the primary, with the data
+        return False if db in replicas() else None
+
+
+def copy_to_replicas(aliases=None):
+    """
+    Copy the SQLite primary into SQLite replicas with the online backup
+    API: the local stand-in for replication. Returns seconds per alias.
+    """
+    aliases = replicas() if aliases is None else aliases
+    if any(connections[alias].vendor != 'sqlite' for alias in [PRIMARY, *aliases]):
+        raise ReplicaError('Only SQLite replicas are copied; other databases replicate on their own.')
+    timings = {}
+    with closing(sqlite3.connect(connections[PRIMARY].settings_dict['NAME'])) as primary:
+        for alias in aliases:
+            started = time.perf_counter()
+            with closing(sqlite3.connect(connections[alias].settings_dict['NAME'])) as replica:
+                primary.backup(replica)
+            timings[alias] = time.perf_counter() - started
+    return timings
+
+
+def pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def choose_replica(request):
+    """The replica ``request`` may read from, or None for the primary."""
+    aliases = replicas()
+    if not aliases or request.method not in SAFE_METHODS or pinned(request):
+        return None
+    try:
+        view_name = resolve(request.path_info).view_name
+    except Resolver404:
+        return None
+    if view_name not in getattr(settings, 'SNEAT_REPLICA_VIEWS', ()):
+        return None
+    return random.choice(aliases)
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestState(choose_replica(request))
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = RequestState(choose_replica(request))
+        token = _current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, state)
+
+    def finish(self, request, response, state):
+        if replicas() and (state.wrote or request.method not in SAFE_METHODS):
+            seconds = pin_seconds()
+            response.set_cookie(
+                PIN_COOKIE, f'{time.time() + seconds:.3f}', max_age=math.ceil(seconds),
+                httponly=True, samesite='Lax',
+            )
+        return response
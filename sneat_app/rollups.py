@@ -0,0 +1,328 @@
+"""
+Time-bucketed revenue rollups.
+
+``RevenueRollup`` keeps hourly, daily and monthly credit/debit totals per
+merchant and globally. They are updated incrementally from the same ledger
+entries as ``MerchantBalance`` and let the reports answer any date range by
+summing a handful of bucket rows instead of scanning ``Transaction``.
+Bucket boundaries are in UTC and ranges are resolved to the hour.
+"""
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, Exists, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth
+from django.utils import timezone
+
+from . import caching, upserts, writes
+from .models import RevenueRollup, Transaction
+
+GRANULARITIES = ('hour', 'day', 'month')
+
+TRUNCATORS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+    'month': TruncMonth,
+}
+
+ZERO = Decimal('0.00')
+# Transaction amounts are stored in cents. A float divisor makes SQLite divide as
+# REAL (how it stores decimals anyway) rather than truncate; NUMERIC columns on
+# other backends round the quotient back to cents.
+CENTS = Value(float(10 ** Transaction._meta.get_field('amount').decimal_places))
+
+
+def _utc(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.astimezone(dt_timezone.utc)
+
+
+def bucket_start(value, granularity):
+    """Truncate ``value`` to the start of its UTC bucket."""
+    value = _utc(value).replace(minute=0, second=0, microsecond=0)
+    if granularity in ('day', 'month'):
+        value = value.replace(hour=0)
+    if granularity == 'month':
+        value = value.replace(day=1)
+    return value
+
+
+def _next_month(value):
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def _ceil(value, granularity):
+    start = bucket_start(value, granularity)
+    if start == value:
+        return start
+    if granularity == 'hour':
+        return start + timedelta(hours=1)
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    return _next_month(start)
+
+
+def _collect(entries):
+    deltas = {}
+    for merchant_id, type_, amount, created_at, sign in entries:
+        for granularity in GRANULARITIES:
+            start = bucket_start(created_at, granularity)
+            for scope in (merchant_id, None):
+                delta = deltas.setdefault((granularity, start, scope, type_), [ZERO, 0])
+                delta[0] += amount * sign
+                delta[1] += sign
+    return deltas
+
+
+def _increment(granularity, start, merchant_id, type_, total, count, now):
+    rollups = RevenueRollup.objects.filter(
+        granularity=granularity, bucket_start=start, merchant_id=merchant_id, type=type_
+    )
+    updated = rollups.update(total=F('total') + total, count=F('count') + count, updated_at=now)
+    if updated or count <= 0:
+        # Removals for buckets that were never rolled up have nothing to reverse.
+        return
+    try:
+        with transaction.atomic():
+            RevenueRollup.objects.create(
+                granularity=granularity, bucket_start=start, merchant_id=merchant_id,
+                type=type_, total=total, count=count,
+            )
+    except IntegrityError:
+        rollups.update(total=F('total') + total, count=F('count') + count, updated_at=now)
+
+
+def apply_entries(entries):
+    """
+    Apply ledger entries ``(merchant_id, type, amount, created_at, sign)`` to the rollups.
+
+    Buckets gaining transactions are upserted together, one statement per
+    few hundred buckets for the merchant rows and one for the global rows,
+    so a bulk insert costs a handful of statements however many buckets it
+    touches. Buckets only losing transactions are updated one by one.
+    """
+    deltas = _collect(entries)
+    now = timezone.now()
+    changes = [
+        (*key, total, count)
+        for key, (total, count) in sorted(
+            deltas.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or 0, item[0][3])
+        )
+        if total or count
+    ]
+    one_by_one = changes
+    with writes.atomic_write():
+        if upserts.supported(RevenueRollup):
+            one_by_one = [change for change in changes if change[5] <= 0]
+            merchant = connections[router.db_for_write(RevenueRollup)].ops.quote_name(
+                RevenueRollup._meta.get_field('merchant').column
+            )
+            # Merchant and global rows are unique over different (partial) indexes
+            for per_merchant, keys, condition in (
+                (True, ('merchant', 'granularity', 'bucket_start', 'type'), f'{merchant} IS NOT NULL'),
+                (False, ('granularity', 'bucket_start', 'type'), f'{merchant} IS NULL'),
+            ):
+                rows = [
+                    {'granularity': granularity, 'bucket_start': start, 'merchant': merchant_id, 'type': type_,
+                     'total': total, 'count': count, 'updated_at': now}
+                    for granularity, start, merchant_id, type_, total, count in changes
+                    if count > 0 and (merchant_id is not None) == per_merchant
+                ]
+                upserts.increment(
+                    RevenueRollup, rows, keys, increments=('total', 'count'), replace=('updated_at',),
+                    condition=condition,
+                )
+        for change in one_by_one:
+            _increment(*change, now)
+
+
+def remove_merchant(merchant_id):
+    """
+    Subtract a merchant's rollups from the global rows, in one ``UPDATE``.
+
+    For a merchant about to be deleted: its own rows go with it, but the
+    global rows would otherwise keep counting its transactions.
+    """
+    contribution = RevenueRollup.objects.order_by().filter(
+        merchant_id=merchant_id, granularity=OuterRef('granularity'),
+        bucket_start=OuterRef('bucket_start'), type=OuterRef('type'),
+    )
+    RevenueRollup.objects.filter(Exists(contribution), merchant__isnull=True).update(
+        total=F('total') - Subquery(contribution.values('total')[:1]),
+        count=F('count') - Subquery(contribution.values('count')[:1]),
+        updated_at=timezone.now(),
+    )
+
+
+def segments(start, end):
+    """
+    Split ``[start, end)`` into ``(granularity, lo, hi)`` bucket ranges.
+
+    Whole months are read from monthly rows, whole days from daily rows and
+    the ragged edges from hourly rows, so a range never needs more than a
+    few dozen buckets.
+    """
+    start = bucket_start(start, 'hour')
+    end = _ceil(_utc(end), 'hour')
+    if start >= end:
+        return []
+
+    first_day = _ceil(start, 'day')
+    last_day = bucket_start(end, 'day')
+    if first_day >= last_day:
+        return [('hour', start, end)]
+
+    result = []
+    if start < first_day:
+        result.append(('hour', start, first_day))
+
+    first_month = _ceil(first_day, 'month')
+    last_month = bucket_start(last_day, 'month')
+    if first_month >= last_month:
+        result.append(('day', first_day, last_day))
+    else:
+        if first_day < first_month:
+            result.append(('day', first_day, first_month))
+        result.append(('month', first_month, last_month))
+        if last_month < last_day:
+            result.append(('day', last_month, last_day))
+
+    if last_day < end:
+        result.append(('hour', last_day, end))
+    return result
+
+
+def totals_between(start, end, merchant=None):
+    """
+    Return ``{'credit': {'total', 'count'}, 'debit': {...}}`` for ``[start, end)``.
+
+    Answered with a single query over the rollup rows covering the range.
+    """
+    totals = {type_: {'total': ZERO, 'count': 0} for type_, _ in Transaction.TYPE_CHOICES}
+    ranges = segments(start, end)
+    if not ranges:
+        return totals
+
+    condition = Q()
+    for granularity, lo, hi in ranges:
+        condition |= Q(granularity=granularity, bucket_start__gte=lo, bucket_start__lt=hi)
+    rollups = RevenueRollup.objects.filter(condition)
+    if merchant is None:
+        rollups = rollups.filter(merchant__isnull=True)
+    else:
+        rollups = rollups.filter(merchant=merchant)
+
+    for row in rollups.order_by().values('type').annotate(total_sum=Sum('total'), count_sum=Sum('count')):
+        totals[row['type']] = {'total': row['total_sum'] or ZERO, 'count': row['count_sum'] or 0}
+    return totals
+
+
+def totals_by_merchant(start, end, merchant_ids=None):
+    """
+    Return ``{merchant_id: {'credit': total, 'debit': total}}`` for ``[start, end)``.
+
+    ``totals_between`` for every merchant (or those in ``merchant_ids``) at
+    once, in a single grouped query. Merchants without rollups are left out.
+    """
+    ranges = segments(start, end)
+    if not ranges:
+        return {}
+
+    condition = Q()
+    for granularity, lo, hi in ranges:
+        condition |= Q(granularity=granularity, bucket_start__gte=lo, bucket_start__lt=hi)
+    rollups = RevenueRollup.objects.filter(condition, merchant__isnull=False)
+    if merchant_ids is not None:
+        rollups = rollups.filter(merchant_id__in=merchant_ids)
+
+    totals = {}
+    for row in rollups.order_by().values('merchant_id', 'type').annotate(total_sum=Sum('total')):
+        merchant_totals = totals.setdefault(row['merchant_id'], {type_: ZERO for type_, _ in Transaction.TYPE_CHOICES})
+        merchant_totals[row['type']] = row['total_sum'] or ZERO
+    return totals
+
+
+def _insert_rows(rows, granularity, per_merchant=True):
+    """
+    ``INSERT ... SELECT`` rollup rows from ``rows``, a grouped queryset with
+    ``bucket``, ``type``, ``total_sum``, ``count_sum`` (and ``merchant_id``).
+    Returns the number of rows written.
+    """
+    connection = connections[rows.db]
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(RevenueRollup._meta.get_field(name).column) for name in (
+        'granularity', 'bucket_start', 'merchant', 'type', 'total', 'count', 'updated_at',
+    ))
+    merchant = 'grouped.merchant_id' if per_merchant else 'NULL'
+    sql, params = rows.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(RevenueRollup._meta.db_table)} ({columns}) '
+            f'SELECT %s, grouped.bucket, {merchant}, grouped.type, grouped.total_sum, grouped.count_sum, %s '
+            f'FROM ({sql}) grouped',
+            (granularity, connection.ops.adapt_datetimefield_value(timezone.now()), *params),
+        )
+        return cursor.rowcount
+
+
+def backfill(granularities=GRANULARITIES, since=None):
+    """
+    Rebuild rollups from the ``Transaction`` table.
+
+    Existing rows for the given granularities (from the start of the
+    coarsest requested bucket containing ``since`` onwards, if set) are
+    replaced. Each granularity is written by the database in one
+    ``INSERT ... SELECT``: the finest requested one from ``Transaction``,
+    each coarser one by summing the rows just rebuilt below it, and the
+    global rows from the merchant rows. Returns the number of rows written
+    per granularity.
+    """
+    granularities = [granularity for granularity in GRANULARITIES if granularity in granularities]
+    if since is not None and granularities:
+        since = bucket_start(since, granularities[-1])
+    written = {}
+    finer = None
+    with writes.atomic_write():
+        for granularity in granularities:
+            existing = RevenueRollup.objects.filter(granularity=granularity)
+            if since is not None:
+                existing = existing.filter(bucket_start__gte=since)
+            existing.delete()
+
+            if finer is None:
+                source = Transaction.objects.order_by()
+                if since is not None:
+                    source = source.filter(created_at__gte=since)
+                rows = source.annotate(
+                    bucket=TRUNCATORS[granularity]('created_at', tzinfo=dt_timezone.utc),
+                ).values('bucket', 'merchant_id', 'type').annotate(
+                    total_sum=ExpressionWrapper(Sum('amount') / CENTS, output_field=FloatField()),
+                    count_sum=Count('id'),
+                )
+            else:
+                source = RevenueRollup.objects.order_by().filter(granularity=finer, merchant__isnull=False)
+                if since is not None:
+                    source = source.filter(bucket_start__gte=since)
+                rows = source.annotate(
+                    bucket=TRUNCATORS[granularity]('bucket_start', tzinfo=dt_timezone.utc),
+                ).values('bucket', 'merchant_id', 'type').annotate(
+                    total_sum=Sum('total'), count_sum=Sum('count'),
+                )
+            written[granularity] = _insert_rows(rows, granularity)
+
+            merchant_rows = RevenueRollup.objects.order_by().filter(granularity=granularity, merchant__isnull=False)
+            if since is not None:
+                merchant_rows = merchant_rows.filter(bucket_start__gte=since)
+            written[granularity] += _insert_rows(
+                merchant_rows.annotate(bucket=F('bucket_start')).values('bucket', 'type').annotate(
+                    total_sum=Sum('total'), count_sum=Sum('count'),
+                ),
+                granularity, per_merchant=False,
+            )
+            finer = granularity
+        caching.bump_on_commit(caching.TRANSACTIONS)
+    return written
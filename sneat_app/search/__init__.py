@@ -0,0 +1,68 @@
+"""
+Search over transactions and merchants.
+
+The configured backend (``SNEAT_SEARCH_BACKEND``) keeps a denormalized
+document per ``Transaction`` and ``Merchant`` in sync through the signals in
+``sneat_app.signals``. When the backend's index is unavailable (e.g. before
+migrating, or on a database without FTS5) searches fall back to plain
+``icontains`` lookups.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .backends import DatabaseSearchBackend
+
+DEFAULT_BACKEND = 'sneat_app.search.backends.SQLiteFTSBackend'
+DEFAULT_RESULT_LIMIT = 500
+
+_backends = {}
+
+
+def get_backend():
+    path = getattr(settings, 'SNEAT_SEARCH_BACKEND', DEFAULT_BACKEND)
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    backend = _backends[path]
+    if not backend.is_available():
+        return DatabaseSearchBackend()
+    return backend
+
+
+def result_limit():
+    return getattr(settings, 'SNEAT_SEARCH_RESULT_LIMIT', DEFAULT_RESULT_LIMIT)
+
+
+def ranked_ids(queryset, query, limit=None):
+    """
+    Return the primary keys of ``queryset`` rows matching ``query``, best first.
+
+    Filters already applied to ``queryset`` are applied by the search itself,
+    so up to ``limit`` of the best matches among its rows are returned; fewer
+    than ``limit`` means every match was found.
+    """
+    return get_backend().search(queryset, query, limit or result_limit())
+
+
+def filter_queryset(queryset, query):
+    """Restrict ``queryset`` to every match, without ranking or a result cap."""
+    return get_backend().filter_queryset(queryset, query)
+
+
+def index(model, pks):
+    get_backend().index(model, pks)
+
+
+def index_merchants(merchant_ids):
+    get_backend().index_merchants(merchant_ids)
+
+
+def remove(model, pks):
+    get_backend().remove(model, pks)
+
+
+def remove_merchants(merchant_ids):
+    get_backend().remove_merchants(merchant_ids)
+
+
+def rebuild():
+    get_backend().rebuild()
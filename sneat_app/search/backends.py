@@ -0,0 +1,210 @@
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from ..models import Transaction
+from .documents import DOCUMENTS, document_for, insert_sql
+
+# Keep IN (...) lists well below SQLite's host parameter limit.
+CHUNK_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def chunked(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements."""
+
+    def is_available(self):
+        return True
+
+    def search(self, queryset, query, limit):
+        """Return up to ``limit`` primary keys of ``queryset`` rows matching ``query``, best match first."""
+        raise NotImplementedError
+
+    def filter_queryset(self, queryset, query):
+        """Restrict ``queryset`` to every row matching ``query`` (unranked)."""
+        raise NotImplementedError
+
+    def index(self, model, pks):
+        pass
+
+    def index_merchants(self, merchant_ids):
+        """Reindex the merchants and every transaction that embeds their details."""
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def remove_merchants(self, merchant_ids):
+        """Remove the merchants and every transaction that embeds their details."""
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Fallback backend that searches the tables directly with ``icontains``.
+
+    It needs no index, but cannot rank results and gets slow on large tables.
+    """
+
+    LOOKUPS = {
+        'sneat_app.Transaction': [
+            'merchant__user__username', 'merchant__business_name', 'description',
+        ],
+        'sneat_app.Merchant': [
+            'user__username', 'user__first_name', 'user__last_name', 'user__email', 'business_name',
+        ],
+    }
+
+    def _condition(self, model, query):
+        condition = Q()
+        for lookup in self.LOOKUPS[model._meta.label]:
+            condition |= Q(**{f'{lookup}__icontains': query})
+        return condition
+
+    def search(self, queryset, query, limit):
+        return list(
+            queryset.filter(self._condition(queryset.model, query))
+            .order_by('-created_at', '-pk')
+            .values_list('pk', flat=True)[:limit]
+        )
+
+    def filter_queryset(self, queryset, query):
+        return queryset.filter(self._condition(queryset.model, query))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 index with bm25 ranking.
+
+    Each indexed model has its own FTS5 table whose ``rowid`` is the object's
+    primary key; the tables are created by migration 0004. Searches run on
+    the database the searched queryset reads from (a replica copies the
+    index with the tables), updates on the one its model writes to.
+    """
+
+    def __init__(self):
+        self._available = False
+
+    @staticmethod
+    def _writer(model=Transaction):
+        return connections[router.db_for_write(model)]
+
+    def is_available(self):
+        if self._available:
+            return True
+        connection = connections[router.db_for_read(Transaction)]
+        if connection.vendor != 'sqlite':
+            return False
+        tables = set(connection.introspection.table_names())
+        self._available = all(document.table in tables for document in DOCUMENTS.values())
+        return self._available
+
+    @staticmethod
+    def match_expression(query):
+        """Turn free text into an FTS5 query: every word must match as a prefix."""
+        tokens = TOKEN_RE.findall(query)
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, queryset, query, limit):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        document = document_for(queryset.model)
+        weights = ', '.join(str(weight) for weight in document.weights)
+        where, params = f'{document.table} MATCH %s', [expression]
+        if queryset.query.where:
+            # Filter inside the index query, so the limit counts only rows the caller can show
+            subquery, subquery_params = queryset.order_by().values('pk').query.sql_with_params()
+            where += f' AND rowid IN ({subquery})'
+            params.extend(subquery_params)
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {document.table} WHERE {where} '
+                f'ORDER BY bm25({document.table}, {weights}) LIMIT %s',
+                [*params, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter_queryset(self, queryset, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset.none()
+        document = document_for(queryset.model)
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {document.table} WHERE {document.table} MATCH %s', [expression]
+        ))
+
+    def index(self, model, pks):
+        document = document_for(model)
+        with self._writer(model).cursor() as cursor:
+            for chunk in chunked(pks):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {document.table} WHERE rowid IN ({placeholders})', chunk)
+                cursor.execute(insert_sql(document, f'WHERE {document.key} IN ({placeholders})'), chunk)
+
+    def index_merchants(self, merchant_ids):
+        with self._writer().cursor() as cursor:
+            for document in DOCUMENTS.values():
+                for chunk in chunked(merchant_ids):
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    where = f'WHERE {document.merchant_key} IN ({placeholders})'
+                    cursor.execute(
+                        f'DELETE FROM {document.table} WHERE rowid IN '
+                        f'(SELECT {document.key} FROM {document.source} {where})',
+                        chunk,
+                    )
+                    cursor.execute(insert_sql(document, where), chunk)
+
+    def remove(self, model, pks):
+        document = document_for(model)
+        with self._writer(model).cursor() as cursor:
+            for chunk in chunked(pks):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {document.table} WHERE rowid IN ({placeholders})', chunk)
+
+    def remove_merchants(self, merchant_ids):
+        with self._writer().cursor() as cursor:
+            for document in DOCUMENTS.values():
+                for chunk in chunked(merchant_ids):
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    cursor.execute(
+                        f'DELETE FROM {document.table} WHERE rowid IN (SELECT {document.key} '
+                        f'FROM {document.source} WHERE {document.merchant_key} IN ({placeholders}))',
+                        chunk,
+                    )
+
+    def rebuild(self):
+        with self._writer().cursor() as cursor:
+            for document in DOCUMENTS.values():
+                cursor.execute(f'DELETE FROM {document.table}')
+                cursor.execute(insert_sql(document))
+                cursor.execute(f"INSERT INTO {document.table}({document.table}) VALUES ('optimize')")
+
+
+def create_fts_tables(schema_editor):
+    """Create and populate the FTS5 tables (SQLite only)."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for document in DOCUMENTS.values():
+        columns = ', '.join(document.columns)
+        schema_editor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {document.table} USING fts5({columns})')
+        schema_editor.execute(insert_sql(document))
+
+
+def drop_fts_tables(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for document in DOCUMENTS.values():
+        schema_editor.execute(f'DROP TABLE IF EXISTS {document.table}')
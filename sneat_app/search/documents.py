@@ -0,0 +1,56 @@
+"""
+Denormalized search documents.
+
+Each document flattens the text a list page searches on (including the
+merchant's user for transactions) into one row of the search index, so a
+search never has to join across ``auth_user``, ``Merchant`` and
+``Transaction`` at query time.
+"""
+from collections import namedtuple
+
+Document = namedtuple('Document', ['table', 'columns', 'expressions', 'source', 'key', 'merchant_key', 'weights'])
+
+DOCUMENTS = {
+    'sneat_app.Transaction': Document(
+        table='sneat_app_transaction_fts',
+        columns=('merchant', 'business_name', 'description'),
+        expressions=(
+            "u.username || ' ' || u.first_name || ' ' || u.last_name",
+            'm.business_name',
+            't.description',
+        ),
+        source=(
+            'sneat_app_transaction t '
+            'JOIN sneat_app_merchant m ON m.id = t.merchant_id '
+            'JOIN auth_user u ON u.id = m.user_id'
+        ),
+        key='t.id',
+        merchant_key='t.merchant_id',
+        weights=(4.0, 4.0, 1.0),
+    ),
+    'sneat_app.Merchant': Document(
+        table='sneat_app_merchant_fts',
+        columns=('name', 'email', 'business_name', 'business_address'),
+        expressions=(
+            "u.username || ' ' || u.first_name || ' ' || u.last_name",
+            'u.email',
+            'm.business_name',
+            "COALESCE(m.business_address, '')",
+        ),
+        source='sneat_app_merchant m JOIN auth_user u ON u.id = m.user_id',
+        key='m.id',
+        merchant_key='m.id',
+        weights=(4.0, 2.0, 4.0, 1.0),
+    ),
+}
+
+
+def document_for(model):
+    return DOCUMENTS[model._meta.label]
+
+
+def insert_sql(document, where=''):
+    """``INSERT ... SELECT`` that (re)builds the documents matched by ``where``."""
+    columns = ', '.join(('rowid',) + document.columns)
+    expressions = ', '.join((document.key,) + document.expressions)
+    return f'INSERT INTO {document.table} ({columns}) SELECT {expressions} FROM {document.source} {where}'.rstrip()
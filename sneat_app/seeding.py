@@ -0,0 +1,369 @@
+"""
+Synthetic merchants and transactions for scale testing.
+
+``seed()`` creates users and merchants with ``bulk_create`` and then
+generates transactions with the skew real traffic has:
+
+* merchant sizes follow a power law (Zipf exponent ``alpha``): a few
+  merchants take most of the volume, most have a handful of transactions;
+* timestamps follow a diurnal and weekly cycle and a growth trend over the
+  window, drawn by stratified inverse-CDF sampling so they come out already
+  in time order (ids increase with ``created_at``, as in production);
+* a configurable credit/debit mix, with log-normal amounts per type.
+
+Transactions are generated in fixed-size chunks, each from its own RNG
+seeded with ``(seed, chunk)``, so the data depends on the seed only and not
+on the number of worker processes. Workers only generate rows; the main
+process inserts each chunk with a single ``executemany`` of values already
+in their database form, which skips the per-field ``Model`` preparation
+that dominates ``bulk_create`` at this volume. ``Transaction``'s secondary
+indexes are dropped for the load and rebuilt once at the end.
+
+As with ``bulk_create`` no signals are sent, so the ledger, rollups and
+search index are rebuilt from the tables afterwards.
+"""
+import math
+import multiprocessing
+import os
+import random
+import time
+from bisect import bisect_right
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+from functools import lru_cache
+from itertools import accumulate
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+
+from . import caching, ledger, rollups, search, writes
+from .models import Merchant, Transaction
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_ALPHA = 1.1
+DEFAULT_CREDIT_RATIO = 0.8
+DEFAULT_INACTIVE_RATIO = 0.1
+DEFAULT_DAYS = 365
+DEFAULT_PASSWORD = 'sneat-seed'
+
+# Relative volume per hour of day (UTC) and per weekday (Monday first)
+HOURLY_WEIGHTS = (
+    0.25, 0.18, 0.12, 0.10, 0.10, 0.15, 0.30, 0.55, 0.80, 0.95, 1.00, 1.05,
+    1.10, 1.05, 1.00, 1.00, 1.05, 1.10, 1.15, 1.10, 0.95, 0.75, 0.55, 0.38,
+)
+WEEKDAY_WEIGHTS = (1.0, 1.0, 1.0, 1.05, 1.15, 0.9, 0.75)
+# Volume at the end of the window relative to its start
+GROWTH = 2.0
+
+# (median amount in dollars, log-normal sigma, descriptions) per type
+AMOUNTS = {
+    'credit': (42.0, 1.0, (
+        'Card payment', 'Online order', 'Contactless payment', 'Invoice payment',
+        'Subscription renewal', 'Bank transfer received',
+    )),
+    'debit': (25.0, 1.2, (
+        'Refund', 'Chargeback', 'Processing fee', 'Payout to bank', 'Supplier payment',
+    )),
+}
+MAX_CENTS = 10 ** 8 - 1
+
+FIRST_NAMES = (
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Priya',
+    'Wei', 'Fatima', 'Kenji', 'Amara', 'Lucas', 'Sofia', 'Omar', 'Elena', 'Raj', 'Chloe',
+)
+LAST_NAMES = (
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee',
+    'Patel', 'Chen', 'Nguyen', 'Khan', 'Tanaka', 'Okafor', 'Rossi', 'Novak', 'Silva', 'Kim',
+)
+BUSINESS_WORDS = (
+    'Blue', 'Harbor', 'Summit', 'Maple', 'Golden', 'Urban', 'Coastal', 'Silver', 'Green', 'North',
+    'Crescent', 'Pioneer', 'Evergreen', 'Lakeside', 'Sunrise', 'Granite', 'Willow', 'Copper', 'Bright', 'Cedar',
+)
+BUSINESS_KINDS = (
+    'Coffee', 'Bakery', 'Books', 'Hardware', 'Florist', 'Outfitters', 'Pharmacy', 'Electronics', 'Studio',
+    'Kitchen', 'Market', 'Auto Repair', 'Fitness', 'Pet Supply', 'Boutique', 'Dental', 'Print Shop', 'Travel',
+)
+STREETS = ('Main St', 'Oak Ave', 'Park Rd', 'Market St', 'High St', 'Elm St', 'Lake Dr', 'Hill Rd', 'Bay St')
+CITIES = ('Springfield', 'Riverside', 'Fairview', 'Franklin', 'Greenville', 'Bristol', 'Madison', 'Georgetown')
+
+TRANSACTION_COLUMNS = ('merchant', 'amount', 'type', 'description', 'created_at')
+
+Plan = namedtuple('Plan', [
+    'seed', 'transactions', 'merchants', 'start', 'end', 'alpha', 'stride', 'credit_ratio', 'chunk_size',
+])
+
+
+class SeedError(ValueError):
+    pass
+
+
+def _rng(seed, *parts):
+    # str seeds are hashed with SHA-512: stable across runs and processes, unlike hash()
+    return random.Random(':'.join(map(str, (seed,) + parts)))
+
+
+def _batched(values, size):
+    for offset in range(0, len(values), size):
+        yield values[offset:offset + size]
+
+
+def create_users(count, prefix, password, seed=0, merchants=False, inactive_ratio=DEFAULT_INACTIVE_RATIO,
+                 batch_size=DEFAULT_BATCH_SIZE):
+    """
+    ``bulk_create`` ``count`` users named ``<prefix>_merchant_<n>`` (with a
+    ``Merchant`` each) or ``<prefix>_user_<n>``. Returns their merchant ids,
+    or user ids for plain users.
+    """
+    kind = 'merchant' if merchants else 'user'
+    rng = _rng(seed, kind)
+    # One hash for every seeded user; hashing each would take longer than the rest of the seed
+    password_hash = make_password(password)
+    width = len(str(count))
+    ids = []
+    for numbers in _batched(range(1, count + 1), batch_size):
+        users = []
+        for number in numbers:
+            username = f'{prefix}_{kind}_{number:0{width}d}'
+            users.append(User(
+                username=username,
+                email=f'{username}@example.com',
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                password=password_hash,
+                # Merchants are the staff (non-superuser) accounts; see views.is_merchant
+                is_staff=merchants,
+            ))
+        with writes.atomic_write():
+            User.objects.bulk_create(users)
+            # Not every backend returns primary keys from a bulk insert, so look them up
+            user_ids = list(User.objects.filter(
+                username__in=[user.username for user in users],
+            ).order_by('pk').values_list('pk', flat=True))
+            if not merchants:
+                ids.extend(user_ids)
+                continue
+            Merchant.objects.bulk_create([
+                Merchant(
+                    user_id=user_id,
+                    business_name=f'{rng.choice(BUSINESS_WORDS)} {rng.choice(BUSINESS_KINDS)}',
+                    business_address=f'{rng.randint(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}',
+                    status='inactive' if rng.random() < inactive_ratio else 'active',
+                )
+                for user_id in user_ids
+            ])
+            ids.extend(Merchant.objects.filter(user_id__in=user_ids).order_by('pk').values_list(
+                'pk', flat=True,
+            ))
+    return ids
+
+
+def plan(transactions, merchants, seed=0, days=DEFAULT_DAYS, alpha=DEFAULT_ALPHA,
+         credit_ratio=DEFAULT_CREDIT_RATIO, chunk_size=DEFAULT_CHUNK_SIZE, end=None):
+    """Describe a transaction load; everything a worker needs to generate any chunk of it."""
+    if merchants < 1:
+        raise SeedError('Transactions need at least one merchant.')
+    end = rollups.bucket_start(end or timezone.now(), 'hour')
+    # Spread merchant ranks over the id range so the biggest merchants are not simply the first ids
+    rng = _rng(seed, 'stride')
+    stride = 1
+    if merchants > 2:
+        stride = rng.randrange(1, merchants)
+        while math.gcd(stride, merchants) != 1:
+            stride = rng.randrange(1, merchants)
+    return Plan(seed, transactions, merchants, end - timedelta(days=days), end, alpha, stride, credit_ratio, chunk_size)
+
+
+def chunk_count(plan):
+    return math.ceil(plan.transactions / plan.chunk_size)
+
+
+@lru_cache(maxsize=4)
+def _hour_weights(start, hours):
+    """Cumulative volume over each hour of the window."""
+    weights = []
+    for hour in range(hours):
+        moment = start + timedelta(hours=hour)
+        trend = 1 + (GROWTH - 1) * hour / hours
+        weights.append(HOURLY_WEIGHTS[moment.hour] * WEEKDAY_WEIGHTS[moment.weekday()] * trend)
+    return list(accumulate(weights))
+
+
+def _merchant_index(plan, u):
+    """Map ``u`` in ``[0, 1)`` to a merchant index through the inverse CDF of a Zipf-like law."""
+    n, alpha = plan.merchants, plan.alpha
+    if alpha == 1:
+        rank = (n + 1) ** u
+    else:
+        rank = (((n + 1) ** (1 - alpha) - 1) * u + 1) ** (1 / (1 - alpha))
+    return (min(int(rank), n) - 1) * plan.stride % n
+
+
+def generate_chunk(plan, index):
+    """
+    Rows ``index * chunk_size`` onwards of ``plan``, as columns:
+    ``(merchant_indexes, cents, types, descriptions, created_at)``.
+
+    ``created_at`` values are already adapted for the database.
+    """
+    rng = _rng(plan.seed, 'chunk', index)
+    first = index * plan.chunk_size
+    last = min(first + plan.chunk_size, plan.transactions)
+    hours = int((plan.end - plan.start).total_seconds() // 3600)
+    cumulative = _hour_weights(plan.start, hours)
+    total = cumulative[-1]
+    adapt = connection.ops.adapt_datetimefield_value
+    amounts = {
+        type_: (math.log(median * 100), sigma, descriptions)
+        for type_, (median, sigma, descriptions) in AMOUNTS.items()
+    }
+
+    merchant_indexes, cents, types, descriptions, created = [], [], [], [], []
+    for row in range(first, last):
+        # Stratified: one draw per 1/n slice of the CDF keeps the timestamps sorted
+        target = (row + rng.random()) / plan.transactions * total
+        hour = min(bisect_right(cumulative, target), hours - 1)
+        before = cumulative[hour - 1] if hour else 0.0
+        offset = (target - before) / (cumulative[hour] - before)
+        created.append(adapt(plan.start + timedelta(hours=hour + min(offset, 0.999999))))
+
+        merchant_indexes.append(_merchant_index(plan, rng.random()))
+        type_ = 'credit' if rng.random() < plan.credit_ratio else 'debit'
+        mu, sigma, labels = amounts[type_]
+        types.append(type_)
+        cents.append(min(max(round(math.exp(rng.gauss(mu, sigma))), 1), MAX_CENTS))
+        descriptions.append(f'{rng.choice(labels)} #{rng.randrange(100000, 1000000)}')
+    return merchant_indexes, cents, types, descriptions, created
+
+
+def _insert_sql():
+    fields = [Transaction._meta.get_field(name) for name in TRANSACTION_COLUMNS]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    return f'INSERT INTO {connection.ops.quote_name(Transaction._meta.db_table)} ({columns}) VALUES ({placeholders})'
+
+
+def insert_chunk(plan, merchant_ids, columns):
+    merchant_indexes, cents, types, descriptions, created = columns
+    # ``amount`` is stored as integer cents (fields.MinorUnitsField), which is what ``cents`` already holds
+    rows = zip(map(merchant_ids.__getitem__, merchant_indexes), cents, types, descriptions, created)
+    with writes.atomic_write(), connection.cursor() as cursor:
+        cursor.executemany(_insert_sql(), rows)
+    return len(cents)
+
+
+@contextmanager
+def indexes_deferred(model):
+    """Drop ``model``'s ``Meta.indexes`` for a bulk load and build them again afterwards."""
+    indexes = list(model._meta.indexes)
+    with connection.schema_editor() as editor:
+        for index in indexes:
+            editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(model, index)
+
+
+def insert_transactions(plan, merchant_ids, workers=1, progress=None):
+    """
+    Generate and insert every chunk of ``plan``, in order.
+
+    With more than one worker, chunks are generated in a pool of
+    ``workers`` processes while this one inserts; at most two chunks per
+    worker wait in memory. ``progress`` is called with the running count.
+    Returns the number of rows inserted.
+    """
+    if len(merchant_ids) != plan.merchants:
+        raise SeedError(f'The plan is for {plan.merchants} merchants, got {len(merchant_ids)}.')
+    inserted = [0]
+
+    def insert(columns):
+        inserted[0] += insert_chunk(plan, merchant_ids, columns)
+        if progress is not None:
+            progress(inserted[0])
+
+    chunks = range(chunk_count(plan))
+    if workers == 1:
+        for index in chunks:
+            insert(generate_chunk(plan, index))
+        return inserted[0]
+
+    # spawn, not fork: a forked child would inherit the open database connection.
+    # Workers only generate rows and never query the database.
+    with ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+    ) as pool:
+        pending = deque()
+        for index in chunks:
+            pending.append(pool.submit(generate_chunk, plan, index))
+            if len(pending) >= workers * 2:
+                insert(pending.popleft().result())
+        while pending:
+            insert(pending.popleft().result())
+    return inserted[0]
+
+
+def rebuild_derived():
+    """Rebuild what signals would have maintained: balances, rollups and the search index."""
+    timings = {}
+    started = time.perf_counter()
+    ledger.rebuild_balances()
+    timings['balances'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rollups.backfill()
+    timings['rollups'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    search.get_backend().rebuild()
+    timings['search'] = time.perf_counter() - started
+    # The rebuilds above bump the transaction generations; merchant lists are cached too
+    caching.bump(caching.MERCHANTS)
+    return timings
+
+
+def seed(merchants, transactions, users=0, seed=0, prefix='seed', password=DEFAULT_PASSWORD, days=DEFAULT_DAYS,
+         alpha=DEFAULT_ALPHA, credit_ratio=DEFAULT_CREDIT_RATIO, inactive_ratio=DEFAULT_INACTIVE_RATIO,
+         workers=None, batch_size=DEFAULT_BATCH_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, defer_indexes=True,
+         progress=None):
+    """
+    Create ``merchants`` merchants, ``users`` plain users and ``transactions``
+    transactions, then rebuild the derived tables.
+
+    Returns ``{'merchants', 'users', 'transactions', 'timings'}`` with the
+    seconds each step took.
+    """
+    if transactions and not merchants:
+        raise SeedError('Transactions need at least one merchant.')
+    if User.objects.filter(username__startswith=f'{prefix}_').exists():
+        raise SeedError(f'Users named {prefix}_* already exist; choose another prefix.')
+    workers = workers or os.cpu_count() or 1
+    timings = {}
+
+    started = time.perf_counter()
+    merchant_ids = create_users(merchants, prefix, password, seed, merchants=True, inactive_ratio=inactive_ratio,
+                                batch_size=batch_size)
+    user_ids = create_users(users, prefix, password, seed, batch_size=batch_size)
+    timings['users'] = time.perf_counter() - started
+
+    inserted = 0
+    if transactions:
+        load = plan(transactions, len(merchant_ids), seed, days, alpha, credit_ratio, chunk_size)
+        started = time.perf_counter()
+        with indexes_deferred(Transaction) if defer_indexes else nullcontext():
+            inserted = insert_transactions(load, merchant_ids, workers, progress)
+            timings['transactions'] = time.perf_counter() - started
+        timings['indexes'] = time.perf_counter() - started - timings['transactions']
+
+    timings.update(rebuild_derived())
+    return {'merchants': len(merchant_ids), 'users': len(user_ids), 'transactions': inserted, 'timings': timings}
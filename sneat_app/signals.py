@@ -0,0 +1,133 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import caching, ledger, live, search
+from .models import Merchant, Transaction
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction(sender, instance, raw=False, **kwargs):
+    # Keep the stored row so an edit can be reversed before the new values are applied.
+    instance._ledger_previous = None
+    if instance.pk and not raw:
+        instance._ledger_previous = (
+            Transaction.objects.filter(pk=instance.pk)
+            .values_list('merchant_id', 'type', 'amount', 'created_at')
+            .first()
+        )
+
+
+def _merchant_deleted(instance, origin):
+    # Set by remove_merchant_transactions on the object whose delete() cascades here.
+    return instance.merchant_id in getattr(origin, '_sneat_deleted_merchants', ())
+
+
+@receiver(pre_delete, sender=Merchant)
+def remove_merchant_transactions(sender, instance, origin=None, **kwargs):
+    # Settle the merchant's transactions in a few set-based statements; the
+    # Transaction receivers below then skip the rows the cascade deletes.
+    if origin is None:
+        return
+    if not hasattr(origin, '_sneat_deleted_merchants'):
+        origin._sneat_deleted_merchants = set()
+    origin._sneat_deleted_merchants.add(instance.pk)
+    ledger.remove_merchant(instance.pk)
+    search.remove_merchants([instance.pk])
+    caching.bump_on_commit(caching.TRANSACTIONS, caching.merchant_generation(instance.pk))
+    live.totals_changed_on_commit()
+
+
+@receiver(post_save, sender=Transaction)
+def apply_transaction_to_ledger(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    entries = []
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is not None:
+        entries.append((*previous, -1))
+    entries.append(ledger.entry_for(instance))
+    ledger.apply_entries(entries)
+
+
+@receiver(post_delete, sender=Transaction)
+def reverse_transaction_in_ledger(sender, instance, origin=None, **kwargs):
+    if _merchant_deleted(instance, origin):
+        return
+    ledger.apply_entries([ledger.entry_for(instance, sign=-1)])
+
+
+@receiver(post_save, sender=Transaction)
+def index_transaction(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index(Transaction, [instance.pk])
+
+
+@receiver(post_delete, sender=Transaction)
+def unindex_transaction(sender, instance, origin=None, **kwargs):
+    if _merchant_deleted(instance, origin):
+        return
+    search.remove(Transaction, [instance.pk])
+
+
+@receiver(post_save, sender=Merchant)
+def index_merchant(sender, instance, raw=False, **kwargs):
+    # Transaction documents embed the merchant's details, so they are refreshed too.
+    if not raw:
+        search.index_merchants([instance.pk])
+
+
+@receiver(post_delete, sender=Merchant)
+def unindex_merchant(sender, instance, **kwargs):
+    search.remove(Merchant, [instance.pk])
+
+
+@receiver(post_save, sender=User)
+def index_merchant_user(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or created:
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login', 'password'}:
+        return
+    merchant_ids = list(Merchant.objects.filter(user=instance).values_list('pk', flat=True))
+    if merchant_ids:
+        search.index_merchants(merchant_ids)
+
+
+@receiver(post_save, sender=Merchant)
+@receiver(post_delete, sender=Merchant)
+def invalidate_merchant_stats(sender, instance, **kwargs):
+    caching.bump_on_commit(caching.MERCHANTS, caching.merchant_generation(instance.pk))
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_transaction_stats(sender, instance, origin=None, **kwargs):
+    if _merchant_deleted(instance, origin):
+        return
+    merchant_ids = {instance.merchant_id}
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is not None:
+        merchant_ids.add(previous[0])
+    caching.bump_on_commit(
+        caching.TRANSACTIONS, *[caching.merchant_generation(merchant_id) for merchant_id in merchant_ids]
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_fragments(sender, instance, raw=False, update_fields=None, **kwargs):
+    # The dashboards' navbar and welcome panel show the user's name and email.
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login', 'password'}):
+        return
+    caching.bump_on_commit(caching.user_generation(instance.pk))
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def publish_live_update(sender, instance, created=False, raw=False, origin=None, **kwargs):
+    # Registered after invalidate_transaction_stats, so totals are read after the bump.
+    if raw or _merchant_deleted(instance, origin):
+        return
+    if created:
+        live.publish_transaction_on_commit(instance)
+    else:
+        live.totals_changed_on_commit()
@@ -0,0 +1,33 @@
+"""
+SQLite database engine tuned for concurrent web traffic (``ENGINE: 'sneat_app.sqlite'``).
+
+Django's SQLite backend opens connections with SQLite's defaults: a
+rollback journal, so a writer blocks every reader; ``synchronous=FULL``;
+a 2 MiB page cache; and transactions that start as readers
+(``BEGIN DEFERRED``). Two such transactions that both go on to write
+deadlock, and SQLite fails one of them at once with "database is
+locked", whatever the busy timeout. This engine, for every new
+connection:
+
+* runs the ``pragmas`` from ``OPTIONS`` (see ``DEFAULT_PRAGMAS``):
+  ``busy_timeout`` first, so the rest wait for locks instead of failing,
+  then WAL (readers and the writer no longer block each other),
+  ``synchronous=NORMAL`` (in WAL, commits without an fsync and stays
+  consistent; only a power loss can undo the last commits), a memory map
+  and a larger page cache;
+* starts the transactions of ``sneat_app.writes.atomic_write()`` blocks
+  (``writes.run()``, the ledger, rollups and imports) with
+  ``BEGIN IMMEDIATE`` (the ``transaction_mode`` option, as in Django
+  5.1), taking the write lock up front so writers queue on the busy
+  timeout instead of deadlocking. Threads of one process first take
+  turns on a per-file lock: SQLite's busy handler polls with growing
+  sleeps, and with many threads polling at once the lock sits idle
+  between them and some wait out the whole timeout. This way only one
+  connection per process waits on SQLite.
+
+Any other ``transaction.atomic()`` block begins ``DEFERRED``, so read-only
+blocks run alongside writers without touching either lock; one that does
+write takes SQLite's lock at its first write, as with Django's backend.
+``pragmas`` replaces the defaults; pass ``{}`` for none. Queries outside
+``atomic()`` still autocommit one statement at a time.
+"""
@@ -0,0 +1,95 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 2 ** 20,
+    # Negative: KiB rather than pages
+    'cache_size': -64 * 2 ** 10,
+}
+DEFAULT_TRANSACTION_MODE = 'IMMEDIATE'
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+# One per database file: this process's threads take turns at its write lock
+_write_locks = defaultdict(threading.Lock)
+_write_locks_lock = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        # Depth of writing() blocks; see _start_transaction_under_autocommit
+        self._writing = 0
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', DEFAULT_PRAGMAS)
+        self.transaction_mode = options.get('transaction_mode', DEFAULT_TRANSACTION_MODE).upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'DATABASES[{self.alias!r}]["OPTIONS"]["transaction_mode"] must be one of '
+                f'{", ".join(TRANSACTION_MODES)}.'
+            )
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    @contextmanager
+    def writing(self):
+        """Begin transactions opened in this block as writers (``sneat_app.writes.atomic_write``)."""
+        self._writing += 1
+        try:
+            yield
+        finally:
+            self._writing -= 1
+
+    def _start_transaction_under_autocommit(self):
+        # Read-only blocks begin as readers and never wait for the write lock
+        if not self._writing or self.transaction_mode == 'DEFERRED' or self.is_in_memory_db():
+            self.cursor().execute('BEGIN DEFERRED')
+            return
+        with _write_locks_lock:
+            lock = _write_locks[self.settings_dict['NAME']]
+        lock.acquire()
+        try:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        except BaseException:
+            lock.release()
+            raise
+        self._write_lock = lock
+
+    def _release_write_lock(self):
+        lock = self.__dict__.pop('_write_lock', None)
+        if lock is not None:
+            lock.release()
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self._release_write_lock()
@@ -0,0 +1,253 @@
+"""
+Merchant statements: opening balance, the period's transactions, closing balance.
+
+``build()`` produces a statement for every merchant from three reads,
+however many merchants there are:
+
+* the merchants, ordered by id;
+* every merchant's opening balance, from one grouped query over the revenue
+  rollups (``rollups.totals_by_merchant``) up to the period start;
+* the period's transactions, one scan ordered by (merchant, created_at, id)
+  along ``transaction_merchant_idx``, streamed with ``iterator()`` and split
+  per merchant as it goes.
+
+Amounts are carried as integer cents. ``generate()`` hands batches of
+statements to a process pool whose workers render them to CSV and HTML
+files, so rendering runs on every core while the main process keeps
+reading. ``manage.py generate_statements`` runs it for all merchants; the
+statement views render a single merchant's statement the same way.
+"""
+import csv
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+from operator import itemgetter
+
+import django
+from django.db.models import Min
+from django.template.loader import get_template
+from django.utils import timezone
+
+from . import rollups
+from .fields import minor_units
+from .models import Merchant, RevenueRollup, Transaction
+
+FORMATS = {
+    'csv': 'text/csv',
+    'html': 'text/html',
+}
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_CHUNK_SIZE = 5000
+HTML_TEMPLATE = 'statements/statement.html'
+CSV_HEADER = ['date', 'transaction_id', 'type', 'description', 'credit', 'debit', 'balance']
+
+
+class StatementError(ValueError):
+    pass
+
+
+def month_period(value):
+    """``YYYY-MM`` -> the month's ``[start, end)`` in UTC."""
+    try:
+        start = datetime.strptime(value, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+    except (TypeError, ValueError):
+        raise StatementError(f'Invalid month: {value!r}. Use YYYY-MM.')
+    return start, rollups._next_month(start)
+
+
+def previous_month(now=None):
+    """The last full month before ``now``."""
+    end = rollups.bucket_start(now or timezone.now(), 'month')
+    return rollups.bucket_start(end - timedelta(days=1), 'month'), end
+
+
+def period_label(start, end):
+    if start.day == 1 and end == rollups._next_month(start):
+        return f'{start:%Y-%m}'
+    return f'{start:%Y-%m-%d}_{end:%Y-%m-%d}'
+
+
+def to_decimal(cents):
+    return Transaction._meta.get_field('amount').from_minor_units(cents)
+
+
+def opening_balances(start, merchant_ids=None):
+    """Net balance in cents of every merchant with activity before ``start``."""
+    first = RevenueRollup.objects.filter(merchant__isnull=False).aggregate(first=Min('bucket_start'))['first']
+    if first is None or first >= start:
+        return {}
+    field = Transaction._meta.get_field('amount')
+    return {
+        merchant_id: field.to_minor_units(totals['credit']) - field.to_minor_units(totals['debit'])
+        for merchant_id, totals in rollups.totals_by_merchant(first, start, merchant_ids).items()
+    }
+
+
+def build(start, end, merchant_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield each merchant's statement for ``[start, end)``, in merchant id order."""
+    merchants = Merchant.objects.order_by('pk').values_list(
+        'pk', 'business_name', 'user__first_name', 'user__last_name', 'user__email',
+    )
+    transactions = Transaction.objects.filter(created_at__gte=start, created_at__lt=end)
+    if merchant_ids is not None:
+        merchants = merchants.filter(pk__in=merchant_ids)
+        transactions = transactions.filter(merchant_id__in=merchant_ids)
+    merchants = list(merchants)
+    openings = opening_balances(start, merchant_ids)
+
+    rows = transactions.order_by('merchant_id', 'created_at', 'id').annotate(
+        cents=minor_units('amount'),
+    ).values_list('merchant_id', 'id', 'created_at', 'type', 'cents', 'description').iterator(chunk_size=chunk_size)
+    groups = groupby(rows, key=itemgetter(0))
+    group = next(groups, None)
+
+    for merchant_id, business_name, first_name, last_name, email in merchants:
+        # Skip transactions of merchants created after the merchant list was read
+        while group is not None and group[0] < merchant_id:
+            group = next(groups, None)
+        lines = []
+        if group is not None and group[0] == merchant_id:
+            lines = [row[1:] for row in group[1]]
+            group = next(groups, None)
+        yield {
+            'merchant_id': merchant_id,
+            'business_name': business_name,
+            'owner': f'{first_name} {last_name}'.strip(),
+            'email': email,
+            'start': start,
+            'end': end,
+            'opening': openings.get(merchant_id, 0),
+            'lines': lines,
+        }
+
+
+def summarize(statement):
+    """Each line with its running balance, plus the period's credit and debit totals."""
+    balance = statement['opening']
+    credits = debits = 0
+    lines = []
+    for transaction_id, created_at, type_, cents, description in statement['lines']:
+        if type_ == 'credit':
+            balance += cents
+            credits += cents
+        else:
+            balance -= cents
+            debits += cents
+        lines.append({
+            'id': transaction_id,
+            'created_at': created_at,
+            'type': type_,
+            'description': description,
+            'credit': to_decimal(cents) if type_ == 'credit' else None,
+            'debit': to_decimal(cents) if type_ != 'credit' else None,
+            'balance': to_decimal(balance),
+        })
+    return {
+        'lines': lines,
+        'opening': to_decimal(statement['opening']),
+        'credits': to_decimal(credits),
+        'debits': to_decimal(debits),
+        'closing': to_decimal(balance),
+    }
+
+
+def write_csv(statement, output, summary=None):
+    summary = summary or summarize(statement)
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    writer.writerow([statement['start'].isoformat(), '', 'opening', 'Opening balance', '', '', summary['opening']])
+    for line in summary['lines']:
+        writer.writerow([
+            line['created_at'].isoformat(), line['id'], line['type'], line['description'],
+            '' if line['credit'] is None else line['credit'],
+            '' if line['debit'] is None else line['debit'],
+            line['balance'],
+        ])
+    writer.writerow([
+        statement['end'].isoformat(), '', 'closing', 'Closing balance',
+        summary['credits'], summary['debits'], summary['closing'],
+    ])
+
+
+def render_html(statement, summary=None):
+    return get_template(HTML_TEMPLATE, using='jinja2').render({
+        'statement': statement,
+        'period': period_label(statement['start'], statement['end']),
+        **(summary or summarize(statement)),
+    })
+
+
+def filename(statement, file_format):
+    return f'merchant-{statement["merchant_id"]}.{file_format}'
+
+
+def render_batch(statements, directory, formats):
+    """Write each statement in each format under ``directory``; returns ``(statements, lines)``."""
+    for statement in statements:
+        summary = summarize(statement)
+        for file_format in formats:
+            path = os.path.join(directory, filename(statement, file_format))
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                if file_format == 'csv':
+                    write_csv(statement, output, summary)
+                else:
+                    output.write(render_html(statement, summary))
+    return len(statements), sum(len(statement['lines']) for statement in statements)
+
+
+def _batches(statements, batch_size):
+    batch = []
+    for statement in statements:
+        batch.append(statement)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(start, end, directory, formats=tuple(FORMATS), workers=None, batch_size=DEFAULT_BATCH_SIZE,
+             merchant_ids=None, progress=None):
+    """
+    Write statements for ``[start, end)`` to ``directory``.
+
+    With more than one worker, batches of ``batch_size`` statements are
+    rendered in a pool of ``workers`` processes (default: one per CPU);
+    at most two batches per worker wait in memory at a time. ``progress``
+    is called with the running ``(statements, lines)`` counts.
+    Returns ``{'statements', 'lines', 'elapsed'}``.
+    """
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    counts = [0, 0]
+
+    def collect(result):
+        counts[0] += result[0]
+        counts[1] += result[1]
+        if progress is not None:
+            progress(*counts)
+
+    batches = _batches(build(start, end, merchant_ids), batch_size)
+    if workers == 1:
+        for batch in batches:
+            collect(render_batch(batch, directory, formats))
+    else:
+        # spawn, not fork: a forked child would inherit the open database connection and cursor.
+        # Workers set Django up before unpickling any task (which imports this module); they
+        # only render and never touch the database.
+        with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+        ) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.submit(render_batch, batch, directory, formats))
+                if len(pending) >= workers * 2:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+    return {'statements': counts[0], 'lines': counts[1], 'elapsed': time.perf_counter() - started}
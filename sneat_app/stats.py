@@ -0,0 +1,49 @@
+"""
+Platform-wide statistics shared by the super admin dashboard and reports.
+
+Both pages read ``platform_stats()``, which is cached through
+``sneat_app.caching`` and invalidated whenever a merchant or transaction
+changes, so any number of admins refreshing at once costs one aggregation.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import caching, ledger, rollups
+from .models import Merchant
+
+# monthly_revenue covers a rolling 30 days, so refresh it even when nothing is written
+DEFAULT_FRESH_FOR = 60
+
+
+def compute_platform_stats():
+    totals = ledger.global_totals()
+    merchant_counts = Merchant.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        inactive=Count('id', filter=Q(status='inactive')),
+    )
+    now = timezone.now()
+    return {
+        'total_merchants': merchant_counts['total'],
+        'active_merchants': merchant_counts['active'],
+        'inactive_merchants': merchant_counts['inactive'],
+        'total_transactions': totals['transaction_count'],
+        'credit_transactions': totals['credit_count'],
+        'debit_transactions': totals['debit_count'],
+        'total_revenue': totals['credit_total'],
+        'total_debits': totals['debit_total'],
+        'net_revenue': totals['net_total'],
+        'monthly_revenue': rollups.totals_between(now - timedelta(days=30), now)['credit']['total'],
+    }
+
+
+def platform_stats():
+    return caching.cached(
+        'platform_stats',
+        compute_platform_stats,
+        depends_on=(caching.MERCHANTS, caching.TRANSACTIONS),
+        fresh_for=getattr(settings, 'SNEAT_STATS_FRESH_FOR', DEFAULT_FRESH_FOR),
+    )
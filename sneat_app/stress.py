@@ -0,0 +1,210 @@
+"""
+Multi-process SQLite stress test (``manage.py stress_sqlite``).
+
+Seeds one database, then for each configuration ("mode") runs reader and
+writer processes against a fresh copy of it at the same time:
+
+* readers run the hot queries of ``sneat_app.query_plans`` in turn, the
+  reads behind the list, dashboard and report views;
+* writers add transactions the way ``transaction_add`` does
+  (``writes.run``, with the ledger, rollup and search signals), from
+  several threads each, as a threaded server would.
+
+The modes differ only in the environment their processes start with:
+
+* ``plain``: Django's SQLite backend with SQLite's defaults (rollback
+  journal, ``BEGIN DEFERRED``), what settings used before
+  ``sneat_app.sqlite``;
+* ``tuned``: ``sneat_app.sqlite`` (WAL, pragmas, ``BEGIN IMMEDIATE``);
+* ``queued``: ``tuned`` plus the single-writer queue of ``sneat_app.writes``.
+
+Every process starts measuring at the same moment (a barrier) and runs
+for ``duration`` seconds. "database is locked" errors are counted, not
+raised.
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connection
+
+from . import benchmarks, query_plans, seeding, writes
+from .models import Merchant, Transaction
+
+MODES = {
+    'plain': {'SNEAT_SQLITE_TUNED': '0', 'SNEAT_WRITE_QUEUE': '0'},
+    'tuned': {'SNEAT_SQLITE_TUNED': '1', 'SNEAT_WRITE_QUEUE': '0'},
+    'queued': {'SNEAT_SQLITE_TUNED': '1', 'SNEAT_WRITE_QUEUE': '1'},
+}
+DEFAULT_TRANSACTIONS = 100000
+DEFAULT_READERS = 4
+DEFAULT_WRITERS = 2
+DEFAULT_WRITER_THREADS = 4
+DEFAULT_DURATION = 10.0
+PREFIX = 'stress'
+
+
+class StressError(Exception):
+    pass
+
+
+@contextmanager
+def _environ(values):
+    """Set environment variables for processes spawned inside the block."""
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+@contextmanager
+def _pool(workers, path, mode):
+    # spawn, so each process reads its settings (engine, queue, database path) afresh
+    with _environ({**MODES[mode], 'SNEAT_DATABASE_PATH': str(path)}), ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+    ) as pool:
+        yield pool
+
+
+def prepare(transactions, seed=0):
+    """Migrate and seed the current database. Runs in a child process."""
+    call_command('migrate', verbosity=0)
+    seeding.seed(transactions=transactions, seed=seed, prefix=PREFIX, **benchmarks.scale_parameters(transactions))
+
+
+def read(barrier, duration):
+    """Run the hot queries in turn for ``duration`` seconds; returns ``(latencies, errors)``."""
+    builders = list(query_plans.HOT_QUERIES.values())
+    latencies, errors = [], 0
+    barrier.wait()
+    deadline = time.monotonic() + duration
+    index = 0
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            list(builders[index % len(builders)]())
+        except OperationalError:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+        index += 1
+    connection.close()
+    return latencies, errors
+
+
+def _add_transaction(merchant_id, cents):
+    return Transaction.objects.create(
+        merchant_id=merchant_id, amount=Decimal(cents) / 100, type='credit', description='Stress test',
+    )
+
+
+def write(barrier, duration, threads, seed):
+    """Add transactions from ``threads`` threads for ``duration`` seconds; returns ``(latencies, errors)``."""
+    merchant_ids = list(Merchant.objects.values_list('pk', flat=True))
+    connection.close()
+
+    def loop(index, deadline):
+        rng = random.Random(f'{seed}:{os.getpid()}:{index}')
+        latencies, errors = [], 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                writes.run(_add_transaction, rng.choice(merchant_ids), rng.randint(100, 100000))
+            except OperationalError:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+        connection.close()
+        return latencies, errors
+
+    barrier.wait()
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(loop, range(threads), [deadline] * threads))
+    return [latency for latencies, _ in results for latency in latencies], sum(errors for _, errors in results)
+
+
+def _copy(source, path, mode):
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        Path(f'{path}{suffix}').unlink(missing_ok=True)
+    shutil.copyfile(source, path)
+    if MODES[mode]['SNEAT_SQLITE_TUNED'] == '0':
+        # WAL is a property of the file; put the copy back in SQLite's default journal mode
+        with closing(sqlite3.connect(path)) as database:
+            database.execute('PRAGMA journal_mode = DELETE')
+
+
+def _summary(results, duration):
+    latencies = sorted(latency for latencies, _ in results for latency in latencies)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'operations': len(latencies),
+        'throughput': round(len(latencies) / duration, 1),
+        'p50_ms': ms(benchmarks.percentile(latencies, 50)),
+        'p99_ms': ms(benchmarks.percentile(latencies, 99)),
+        'errors': sum(errors for _, errors in results),
+    }
+
+
+def stress(path, mode, readers=DEFAULT_READERS, writers=DEFAULT_WRITERS, threads=DEFAULT_WRITER_THREADS,
+           duration=DEFAULT_DURATION, seed=0):
+    """Run readers and writers against ``path`` in ``mode``; returns ``{'reads': ..., 'writes': ...}``."""
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        barrier = manager.Barrier(readers + writers)
+        with _pool(readers + writers, path, mode) as pool:
+            reads = [pool.submit(read, barrier, duration) for _ in range(readers)]
+            written = [pool.submit(write, barrier, duration, threads, seed) for _ in range(writers)]
+            return {
+                'reads': _summary([future.result() for future in reads], duration),
+                'writes': _summary([future.result() for future in written], duration),
+            }
+
+
+def run(modes=tuple(MODES), directory=None, transactions=DEFAULT_TRANSACTIONS, reseed=False, seed=0,
+        progress=None, **options):
+    """
+    Seed (if needed), then stress a copy of the database in each mode.
+    ``options`` go to ``stress()``; ``progress`` is called with each step's
+    name as it starts. Returns ``{mode: stress() result}``.
+    """
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        raise StressError(f'Unknown mode(s): {", ".join(sorted(unknown))}.')
+    directory = Path(directory or Path(getattr(settings, 'SNEAT_BENCHMARK_ROOT', 'benchmarks')) / 'stress')
+    directory.mkdir(parents=True, exist_ok=True)
+    source = directory / f'stress-{transactions}.sqlite3'
+    if reseed or not source.exists():
+        source.unlink(missing_ok=True)
+        if progress is not None:
+            progress('seed')
+        with _pool(1, source, 'plain') as pool:
+            pool.submit(prepare, transactions, seed).result()
+
+    results = {}
+    for mode in modes:
+        if progress is not None:
+            progress(mode)
+        path = directory / f'stress-{transactions}-{mode}.sqlite3'
+        _copy(source, path, mode)
+        results[mode] = stress(path, mode, seed=seed, **options)
+    return results
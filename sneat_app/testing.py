@@ -0,0 +1,67 @@
+"""
+Test helpers for the request instrumentation in ``sneat_app.middleware``.
+
+``QueryBudgetMixin`` turns query budgets into test failures::
+
+    class MerchantListTests(QueryBudgetMixin, TestCase):
+        def test_list(self):
+            self.client.force_login(self.admin)
+            with self.captureRequests() as requests:
+                self.client.get(reverse('sneat_app:merchant_list'))
+            self.assertNoDuplicateQueries(requests[0])
+
+Any request made through the test client that exceeds its
+``SNEAT_QUERY_BUDGETS`` entry raises ``QueryBudgetExceeded``. Settings turn
+strict mode on for the whole of ``manage.py test``; the mixin also does for
+test cases run some other way. ``sneat_app.tests`` uses it to pin each
+page's query count.
+"""
+from contextlib import contextmanager
+
+from django.test import override_settings
+
+from . import middleware
+
+__all__ = ['QueryBudgetExceeded', 'QueryBudgetMixin', 'capture_requests']
+
+QueryBudgetExceeded = middleware.QueryBudgetExceeded
+
+
+@contextmanager
+def capture_requests():
+    """Collect the ``RequestMetrics`` of every request finished inside the block."""
+    captured = []
+    middleware.listeners.append(captured.append)
+    try:
+        yield captured
+    finally:
+        middleware.listeners.remove(captured.append)
+
+
+class QueryBudgetMixin:
+    """Enforce ``SNEAT_QUERY_BUDGETS`` strictly for every request in the test case."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Async views query on the main thread, where TestCase's transaction is visible.
+        cls._budget_override = override_settings(SNEAT_QUERY_BUDGET_STRICT=True, SNEAT_ASYNC_QUERIES=False)
+        cls._budget_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._budget_override.disable()
+        super().tearDownClass()
+
+    def captureRequests(self):
+        return capture_requests()
+
+    def assertMaxQueries(self, metrics, limit):
+        if metrics.queries > limit:
+            self.fail(f'{metrics.path} ran {metrics.queries} queries, expected at most {limit}.')
+
+    def assertNoDuplicateQueries(self, metrics, allowed=1):
+        repeated = [(sql, count) for sql, count in metrics.duplicates if count > allowed]
+        if repeated:
+            lines = '\n'.join(f'  {count}x {sql}' for sql, count in repeated)
+            self.fail(f'{metrics.path} repeated queries:\n{lines}')
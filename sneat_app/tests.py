@@ -0,0 +1,324 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import nullcontext
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import api, assets, caching, exports, fragments, imports, ledger, replicas, rollups, search
+from .models import Merchant, RevenueRollup, Transaction
+from .testing import QueryBudgetMixin
+
+
+class QueryCountTests(QueryBudgetMixin, TestCase):
+    """
+    Every list, dashboard and form renders with a fixed number of queries.
+
+    Each page is requested with a handful of rows and again with more rows
+    than fit on one page; both must run exactly the queries pinned here, so
+    a query per rendered row (an N+1) fails. ``QueryBudgetMixin`` also fails
+    any request over its ``SNEAT_QUERY_BUDGETS`` entry.
+    """
+    # Rows on the first request, then the total on the second (list pages show 10)
+    SIZES = (2, 25)
+
+    @classmethod
+    def setUpTestData(cls):
+        # No passwords: the tests sign in with force_login, and hashing would dominate the run
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', None)
+        cls.member = User.objects.create_user('member', 'member@example.com')
+        cls.merchant = cls.create_merchant(0)
+
+    @classmethod
+    def create_merchant(cls, index):
+        user = User.objects.create_user(
+            f'merchant{index}', f'merchant{index}@example.com', first_name='Merchant', last_name=str(index), is_staff=True,
+        )
+        return Merchant.objects.create(user=user, business_name=f'Business {index}', business_address='Street 1')
+
+    def grow(self, rows):
+        """Add merchants and transactions (some for ``self.merchant``) up to ``rows`` of each."""
+        for index in range(Merchant.objects.count(), rows):
+            self.create_merchant(index)
+        merchants = list(Merchant.objects.order_by('pk'))
+        for index in range(Transaction.objects.count(), rows):
+            Transaction.objects.create(
+                merchant=self.merchant if index % 2 == 0 else merchants[index % len(merchants)],
+                amount=Decimal('10.50'), type='debit' if index % 3 else 'credit',
+                description=f'Order {index}',
+            )
+
+    def assertQueries(self, user, url, expected):
+        for rows in self.SIZES:
+            self.grow(rows)
+            # Statistics, fragments and content types are cached; count a cold render
+            cache.clear()
+            ContentType.objects.clear_cache()
+            self.client.force_login(user)
+            with self.captureRequests() as requests:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                requests[-1].queries, expected,
+                f'{url} ran {requests[-1].queries} queries with {rows} rows, expected {expected}.',
+            )
+            self.assertNoDuplicateQueries(requests[-1])
+
+    def test_merchant_list(self):
+        self.assertQueries(self.admin, reverse('sneat_app:merchant_list'), 5)
+
+    def test_merchant_list_search(self):
+        self.assertQueries(self.admin, reverse('sneat_app:merchant_list') + '?search=business', 4)
+
+    def test_transaction_list(self):
+        self.assertQueries(self.admin, reverse('sneat_app:transaction_list'), 5)
+
+    def test_transaction_list_search(self):
+        self.assertQueries(self.admin, reverse('sneat_app:transaction_list') + '?search=order&type=debit', 4)
+
+    def test_transaction_add_form(self):
+        self.assertQueries(self.admin, reverse('sneat_app:transaction_add'), 3)
+
+    def test_super_admin_dashboard(self):
+        self.assertQueries(self.admin, reverse('sneat_app:super_admin_dashboard'), 7)
+
+    def test_merchant_dashboard(self):
+        self.assertQueries(self.merchant.user, reverse('sneat_app:merchant_dashboard'), 5)
+
+    def test_user_dashboard(self):
+        self.assertQueries(self.member, reverse('sneat_app:user_dashboard'), 4)
+
+    def test_reports(self):
+        self.assertQueries(self.admin, reverse('sneat_app:reports'), 6)
+
+    def test_merchant_changelist(self):
+        self.assertQueries(self.admin, reverse('admin:sneat_app_merchant_changelist'), 4)
+
+    def test_transaction_changelist(self):
+        self.assertQueries(self.admin, reverse('admin:sneat_app_transaction_changelist'), 4)
+
+    def test_transaction_changelist_search(self):
+        self.assertQueries(self.admin, reverse('admin:sneat_app_transaction_changelist') + '?q=order', 5)
+
+    def test_admin_transaction_add_form(self):
+        self.assertQueries(self.admin, reverse('admin:sneat_app_transaction_add'), 6)
+
+    def test_admin_transaction_change_form(self):
+        transaction = Transaction.objects.create(merchant=self.merchant, amount=Decimal('1.00'), type='credit')
+        self.assertQueries(self.admin, reverse('admin:sneat_app_transaction_change', args=[transaction.pk]), 7)
+
+
+class ExportDateTests(TestCase):
+    def test_parse_day(self):
+        self.assertEqual(exports.parse_day('2024-02-29', end=True).date().isoformat(), '2024-03-01')
+        for value in ('2024-02-30', '2024-13-01', '9999-12-31', 'yesterday'):
+            with self.subTest(value=value), self.assertRaises(exports.ExportError):
+                exports.parse_day(value, end=True)
+
+    def test_export_rejects_impossible_date(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', None))
+        response = self.client.get(reverse('sneat_app:transaction_export') + '?start=2024-02-30')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'Invalid date', response.content)
+
+    def test_generate_statements_rejects_impossible_date(self):
+        with self.assertRaisesMessage(CommandError, 'Invalid date'):
+            call_command('generate_statements', '--start', '2024-02-30')
+
+
+@override_settings(SNEAT_RATE_LIMITS={})
+class ApiValidationTests(TestCase):
+    BAD_AMOUNTS = ('1e400', '99999999999999999', 'NaN', 'Infinity', '-5', '1.001', 'abc')
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('merchant', 'merchant@example.com', is_staff=True)
+        cls.merchant = Merchant.objects.create(user=user, business_name='Business', business_address='Street 1')
+        _, cls.key = api.create_token(User.objects.create_superuser('admin', 'admin@example.com', None), 'tests')
+
+    def test_import_rejects_row(self):
+        for amount in self.BAD_AMOUNTS:
+            with self.subTest(amount=amount):
+                transactions, errors = imports.validate_batch(
+                    [(1, {'merchant_id': self.merchant.pk, 'amount': amount, 'type': 'credit'})]
+                )
+                self.assertEqual(transactions, [])
+                self.assertEqual(len(errors), 1)
+
+    def test_api_returns_400(self):
+        for amount in self.BAD_AMOUNTS:
+            with self.subTest(amount=amount):
+                response = self.client.post(
+                    reverse('sneat_app:api_transaction_create'),
+                    {'merchant_id': self.merchant.pk, 'amount': amount, 'type': 'credit'},
+                    content_type='application/json', headers={'Authorization': f'Bearer {self.key}'},
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('amount', response.json()['errors'][0]['error'].lower())
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_api_rejects_long_idempotency_key(self):
+        response = self.client.post(
+            reverse('sneat_app:api_transaction_create'),
+            {'merchant_id': self.merchant.pk, 'amount': '10.00', 'type': 'credit'},
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {self.key}', 'Idempotency-Key': 'k' * 256},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Idempotency-Key must be at most 255 characters.')
+        self.assertFalse(Transaction.objects.exists())
+
+
+class MerchantDeletionTests(TestCase):
+    def setUp(self):
+        self.merchants = []
+        for index in range(3):
+            user = User.objects.create_user(f'merchant{index}', f'merchant{index}@example.com')
+            merchant = Merchant.objects.create(user=user, business_name=f'Business {index}', business_address='Street 1')
+            for number in range(5):
+                Transaction.objects.create(
+                    merchant=merchant, amount=Decimal('10.50'), type='debit' if number % 2 else 'credit',
+                    description=f'Order {number}',
+                )
+            self.merchants.append(merchant)
+
+    def global_rollups(self):
+        return {
+            (rollup.granularity, rollup.bucket_start, rollup.type): (rollup.total, rollup.count)
+            for rollup in RevenueRollup.objects.filter(merchant__isnull=True, count__gt=0)
+        }
+
+    def assertConsistent(self):
+        self.assertEqual(ledger.verify_balances(), [])
+        stored = self.global_rollups()
+        rollups.backfill()
+        self.assertEqual(stored, self.global_rollups())
+        self.assertEqual(
+            sorted(search.ranked_ids(Transaction.objects.all(), 'order')),
+            sorted(Transaction.objects.values_list('pk', flat=True)),
+        )
+
+    def test_delete_merchant(self):
+        self.merchants[0].delete()
+        self.assertConsistent()
+
+    def test_delete_user_and_queryset(self):
+        self.merchants[0].user.delete()
+        Merchant.objects.filter(pk=self.merchants[1].pk).delete()
+        self.assertConsistent()
+
+    def test_delete_transaction_after_merchant(self):
+        self.merchants[0].delete()
+        self.merchants[1].transactions.first().delete()
+        self.assertConsistent()
+
+    def test_queries_do_not_grow_with_transactions(self):
+        with self.assertNumQueries(12):
+            self.merchants[0].delete()
+        for number in range(20):
+            Transaction.objects.create(merchant=self.merchants[1], amount=Decimal('1.00'), type='credit')
+        with self.assertNumQueries(12):
+            self.merchants[1].delete()
+
+
+class ReplicaCacheTests(SimpleTestCase):
+    """Values cached under the current generation are computed on the primary, not a lagging replica."""
+
+    def setUp(self):
+        token = replicas._current.set(replicas.RequestState('replica1'))
+        self.addCleanup(replicas._current.reset, token)
+        self.addCleanup(cache.clear)
+
+    def test_router_reads_replica(self):
+        self.assertEqual(router.db_for_read(Transaction), 'replica1')
+
+    def test_cached_computes_on_primary(self):
+        value = caching.cached('tests:alias', lambda: router.db_for_read(Transaction))
+        self.assertEqual(value, replicas.PRIMARY)
+        self.assertEqual(router.db_for_read(Transaction), 'replica1')
+
+    def test_fragment_context_on_primary(self):
+        aliases = []
+
+        def context():
+            aliases.append(router.db_for_read(Transaction))
+            return {}
+
+        fragments.render_fragment(RequestFactory().get('/'), 'super_admin/partials/sidebar.html', context)
+        self.assertEqual(aliases, [replicas.PRIMARY])
+
+
+class AssetBundleTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(SNEAT_ASSET_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def assertSmaller(self, names, compress=True):
+        for name, entry in assets.build(names, compress=compress).items():
+            with self.subTest(bundle=name):
+                self.assertLess(entry['bytes'], entry['source_bytes'])
+                if not compress:
+                    continue
+                self.assertLess(entry['gzip_bytes'], entry['bytes'])
+                if assets.brotli is not None:
+                    self.assertLess(entry['brotli_bytes'], entry['bytes'])
+
+    def test_css_bundles_are_smaller_than_sources(self):
+        self.assertSmaller([name for name in assets.BUNDLES if name.endswith('.css')])
+
+    @unittest.skipIf(assets.rjsmin is None, 'rjsmin is not installed')
+    def test_js_bundles_are_smaller_than_sources(self):
+        # Brotli at its default quality takes seconds on the vendor JS
+        self.assertSmaller([name for name in assets.BUNDLES if name.endswith('.js')], compress=False)
+
+
+@unittest.skipUnless(connection.settings_dict['ENGINE'] == 'sneat_app.sqlite', 'needs the tuned SQLite engine')
+class SQLiteTransactionModeTests(SimpleTestCase):
+    """Only ``atomic_write()`` blocks take the write lock; other atomic blocks begin as readers."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+        self.wrapper = connections['default'].__class__({**connection.settings_dict, 'NAME': self.path}, alias='mode_tests')
+        self.addCleanup(self.wrapper.close)
+        self.wrapper.cursor().execute('CREATE TABLE t (x INTEGER)')
+
+    def other_writer_blocked(self):
+        with sqlite3.connect(self.path, timeout=0, isolation_level=None) as other:
+            try:
+                other.execute('BEGIN IMMEDIATE')
+            except sqlite3.OperationalError:
+                return True
+            other.execute('ROLLBACK')
+            return False
+
+    def begin(self, write):
+        # What atomic() does on entering its outermost block
+        with self.wrapper.writing() if write else nullcontext():
+            self.wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        self.assertTrue(self.wrapper.connection.in_transaction)
+        self.addCleanup(self.wrapper.set_autocommit, True)
+        self.addCleanup(self.wrapper.rollback)
+
+    def test_read_only_block_begins_deferred(self):
+        self.begin(write=False)
+        self.wrapper.cursor().execute('SELECT * FROM t')
+        self.assertFalse(self.wrapper.__dict__.get('_write_lock'))
+        self.assertFalse(self.other_writer_blocked())
+
+    def test_write_block_begins_immediate(self):
+        self.begin(write=True)
+        self.assertTrue(self.wrapper._write_lock.locked())
+        self.assertTrue(self.other_writer_blocked())
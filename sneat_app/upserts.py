@@ -0,0 +1,72 @@
+"""
+Set-based counter updates.
+
+``increment()`` adds a batch of deltas to a table in one
+``INSERT ... ON CONFLICT (...) DO UPDATE`` per few hundred rows: rows whose
+key exists are added to, the others are inserted as given. The ledger and
+the rollups apply a whole import chunk or API batch this way instead of an
+``UPDATE`` (and, for a new bucket, an ``INSERT``) per key. It needs upserts
+with a conflict target (SQLite 3.24+, PostgreSQL); callers check
+``supported()`` and otherwise fall back to updating row by row.
+"""
+from django.db import connections, router
+
+
+def supported(model):
+    return connections[router.db_for_write(model)].features.supports_update_conflicts_with_target
+
+
+def increment(model, rows, keys, increments, replace=(), latest=(), condition=None):
+    """
+    Write ``rows``, dicts of field name to value, into ``model``'s table.
+
+    Where a row with the same ``keys`` already exists, the ``increments``
+    fields are added to it, the ``replace`` fields overwritten and the
+    ``latest`` fields set to the later of the two values. ``condition`` is
+    the ``WHERE`` clause of the partial unique index over ``keys``, if the
+    index is partial. Each key may appear in ``rows`` only once.
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    names = list(rows[0])
+    fields = [model._meta.get_field(name) for name in names]
+
+    def column(name):
+        return qn(model._meta.get_field(name).column)
+
+    greatest = 'GREATEST' if connection.vendor == 'postgresql' else 'MAX'
+    assignments = [f'{column(name)} = {table}.{column(name)} + excluded.{column(name)}' for name in increments]
+    assignments += [f'{column(name)} = excluded.{column(name)}' for name in replace]
+    assignments += [
+        f'{column(name)} = {greatest}(COALESCE({table}.{column(name)}, excluded.{column(name)}), '
+        f'COALESCE(excluded.{column(name)}, {table}.{column(name)}))'
+        for name in latest
+    ]
+    target = f'({", ".join(column(name) for name in keys)})'
+    if condition:
+        target += f' WHERE {condition}'
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    batch_size = connection.ops.bulk_batch_size(fields, rows)
+
+    # Bucket starts, types and timestamps repeat across rows; adapt each value once
+    prepared = {}
+
+    def prepare(field, value):
+        key = (field.name, value)
+        if key not in prepared:
+            prepared[key] = field.get_db_prep_save(value, connection)
+        return prepared[key]
+
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset:offset + batch_size]
+            params = [prepare(field, row[name]) for row in batch for name, field in zip(names, fields)]
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(column(name) for name in names)}) '
+                f'VALUES {", ".join([placeholders] * len(batch))} '
+                f'ON CONFLICT {target} DO UPDATE SET {", ".join(assignments)}',
+                params,
+            )
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, charts, live, views
 
 app_name = 'sneat_app'
 
@@ -13,9 +13,11 @@ urlpatterns = [
     # User Dashboards
     path('user/dashboard/', views.user_dashboard, name='user_dashboard'),
     path('merchant/dashboard/', views.merchant_dashboard, name='merchant_dashboard'),
+    path('merchant/statement/', views.merchant_statement, name='merchant_statement'),
     
     # Super Admin URLs
     path('super-admin/dashboard/', views.super_admin_dashboard, name='super_admin_dashboard'),
+    path('super-admin/live/', live.events, name='live_events'),
     
     # Merchant Management
     path('super-admin/merchants/', views.merchant_list, name='merchant_list'),
@@ -23,10 +25,17 @@ urlpatterns = [
     path('super-admin/merchants/<int:merchant_id>/edit/', views.merchant_edit, name='merchant_edit'),
     path('super-admin/merchants/<int:merchant_id>/delete/', views.merchant_delete, name='merchant_delete'),
     path('super-admin/merchants/<int:merchant_id>/toggle-status/', views.merchant_toggle_status, name='merchant_toggle_status'),
+    path('super-admin/merchants/<int:merchant_id>/statement/', views.merchant_statement_admin, name='merchant_statement_admin'),
     
     # Transaction Management
     path('super-admin/transactions/', views.transaction_list, name='transaction_list'),
     path('super-admin/transactions/add/', views.transaction_add, name='transaction_add'),
+    path('super-admin/transactions/export/', views.transaction_export, name='transaction_export'),
+    
+    # JSON API
+    path('api/transactions/', api.transaction_create, name='api_transaction_create'),
+    path('api/transactions/batch/', api.transaction_batch_create, name='api_transaction_batch_create'),
+    path('api/charts/revenue/', charts.revenue, name='chart_revenue'),
     
     # Reports and Settings
     path('super-admin/reports/', views.reports, name='reports'),
@@ -1,16 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, logout, authenticate
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count
+from django.db.models import F, Sum, Count, Value
+from django.db.models.functions import Concat, Trim
 from django.utils import timezone
-from datetime import timedelta
+import asyncio
+from urllib.parse import urlencode
 from django.views.decorators.csrf import csrf_protect
-from django.middleware.csrf import get_token
+from django.views.decorators.http import require_POST
 from .forms import UnifiedLoginForm, UserRegistrationForm, MerchantForm, TransactionForm, ChangePasswordForm
 from .models import Merchant, Transaction
-from django.contrib.auth.models import User
+from . import aio, caching, exports, fragments, ledger, search, statements, stats, writes
+from .pagination import CursorPaginator, RankedPaginator
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 
 def is_superuser(user):
     return user.is_authenticated and user.is_superuser
@@ -21,6 +24,22 @@ def is_merchant(user):
 def is_normal_user(user):
     return user.is_authenticated and not user.is_staff and not user.is_superuser
 
+# Querysets shaped to what each template renders, so a page runs the same
+# number of queries whatever its size (budgets: SNEAT_QUERY_BUDGETS).
+def _full_name(prefix):
+    return Trim(Concat(F(f'{prefix}first_name'), Value(' '), F(f'{prefix}last_name')))
+
+def merchant_rows(queryset):
+    return queryset.select_related('user').only(
+        'id', 'business_name', 'status', 'created_at',
+        'user__first_name', 'user__last_name', 'user__email',
+    )
+
+def transaction_rows(queryset):
+    return queryset.select_related('merchant').only(
+        'id', 'amount', 'type', 'description', 'created_at', 'merchant__business_name',
+    ).annotate(merchant_name=_full_name('merchant__user__'))
+
 @csrf_protect
 def unified_login(request):
     if request.user.is_authenticated:
@@ -52,6 +71,17 @@ def unified_login(request):
     
     return render(request, 'auth/login.html', {'form': form})
 
+def _create_account(user):
+    user.save()
+    
+    # If merchant, create merchant profile
+    if user.is_staff:
+        Merchant.objects.create(
+            user=user,
+            business_name=f"{user.get_full_name()}'s Business",
+            status='active'
+        )
+
 @csrf_protect
 def register(request):
     if request.user.is_authenticated:
@@ -62,15 +92,7 @@ def register(request):
         if form.is_valid():
             user = form.save(commit=False)
             user.is_staff = form.cleaned_data.get('is_staff', False)
-            user.save()
-            
-            # If merchant, create merchant profile
-            if user.is_staff:
-                Merchant.objects.create(
-                    user=user,
-                    business_name=f"{user.get_full_name()}'s Business",
-                    status='active'
-                )
+            writes.run(_create_account, user)
             
             messages.success(request, 'Account created successfully! Please login.')
             return redirect('sneat_app:unified_login')
@@ -90,56 +112,100 @@ def user_dashboard(request):
         messages.error(request, 'Access denied.')
         return redirect('sneat_app:unified_login')
     
+    def panel_context():
+        totals = Transaction.objects.filter(merchant__user=request.user).aggregate(
+            total_transactions=Count('id'), total_amount=Sum('amount'),
+        )
+        return {
+            'user': request.user,
+            'total_transactions': totals['total_transactions'],
+            'total_amount': totals['total_amount'] or 0,
+        }
+    
+    depends_on = [caching.user_generation(request.user.pk)]
+    merchant_id = Merchant.objects.filter(user=request.user).values_list('pk', flat=True).first()
+    if merchant_id is not None:
+        depends_on.append(caching.merchant_generation(merchant_id))
     context = {
-        'user': request.user,
-        'total_transactions': Transaction.objects.filter(merchant__user=request.user).count(),
-        'total_amount': Transaction.objects.filter(merchant__user=request.user).aggregate(Sum('amount'))['amount__sum'] or 0,
+        **fragments.chrome(request, 'user'),
+        'panels': fragments.render_fragment(
+            request, 'user/partials/panels.html', panel_context,
+            key=(request.user.pk,), depends_on=depends_on,
+        ),
     }
     return render(request, 'user/dashboard.html', context)
 
-@login_required
-def merchant_dashboard(request):
+# The dashboards and reports are async: under ASGI their independent queries
+# run concurrently on a thread pool (see sneat_app.aio) and no thread is held
+# while they wait. Under WSGI Django runs them through async_to_sync.
+@aio.login_required
+async def merchant_dashboard(request):
     if not is_merchant(request.user):
-        messages.error(request, 'Access denied.')
+        await aio.run_sync(messages.error, request, 'Access denied.')
         return redirect('sneat_app:unified_login')
     
     try:
-        merchant = request.user.merchant_profile
-        context = {
+        merchant = await aio.run_sync(lambda: request.user.merchant_profile)
+    except Merchant.DoesNotExist:
+        await aio.run_sync(messages.error, request, 'Merchant profile not found.')
+        return redirect('sneat_app:unified_login')
+    
+    async def panel_context():
+        balance, recent_transactions = await aio.gather(
+            lambda: ledger.balance_for(merchant),
+            lambda: list(merchant.transactions.only('id', 'merchant', 'amount', 'type', 'description', 'created_at')[:5]),
+        )
+        return {
             'user': request.user,
             'merchant': merchant,
-            'total_transactions': merchant.transactions.count(),
-            'total_revenue': merchant.transactions.filter(type='credit').aggregate(Sum('amount'))['amount__sum'] or 0,
-            'recent_transactions': merchant.transactions.all()[:5],
+            'balance': balance,
+            'total_transactions': balance.transaction_count,
+            'total_revenue': balance.credit_total,
+            'recent_transactions': recent_transactions,
         }
-        return render(request, 'merchant/dashboard.html', context)
-    except Merchant.DoesNotExist:
-        messages.error(request, 'Merchant profile not found.')
-        return redirect('sneat_app:unified_login')
+    
+    chrome, panels = await asyncio.gather(
+        aio.run_sync(fragments.chrome, request, 'merchant'),
+        fragments.arender_fragment(
+            request, 'merchant/partials/panels.html', panel_context,
+            key=(request.user.pk, merchant.pk),
+            depends_on=(caching.user_generation(request.user.pk), caching.merchant_generation(merchant.pk)),
+        ),
+    )
+    return await aio.run_sync(render, request, 'merchant/dashboard.html', {**chrome, 'panels': panels})
 
 # Super Admin Views
-@login_required
-@user_passes_test(is_superuser)
-def super_admin_dashboard(request):
-    # Get statistics
-    total_merchants = Merchant.objects.count()
-    active_merchants = Merchant.objects.filter(status='active').count()
-    total_transactions = Transaction.objects.count()
-    total_revenue = Transaction.objects.filter(type='credit').aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # Recent data
-    recent_merchants = Merchant.objects.all()[:5]
-    recent_transactions = Transaction.objects.all()[:5]
+@aio.login_required
+@aio.user_passes_test(is_superuser)
+async def super_admin_dashboard(request):
+    async def panel_context():
+        # Statistics (cached, shared with reports) and the recent rows, queried concurrently
+        platform, recent_merchants, recent_transactions = await aio.gather(
+            stats.platform_stats,
+            lambda: list(Merchant.objects.only('id', 'business_name', 'status', 'created_at')[:5]),
+            lambda: list(Transaction.objects.select_related('merchant').only(
+                'id', 'amount', 'type', 'created_at', 'merchant__business_name'
+            )[:5]),
+        )
+        
+        return {
+            'total_merchants': platform['total_merchants'],
+            'active_merchants': platform['active_merchants'],
+            'total_transactions': platform['total_transactions'],
+            'total_revenue': platform['total_revenue'],
+            'recent_merchants': recent_merchants,
+            'recent_transactions': recent_transactions,
+        }
     
-    context = {
-        'total_merchants': total_merchants,
-        'active_merchants': active_merchants,
-        'total_transactions': total_transactions,
-        'total_revenue': total_revenue,
-        'recent_merchants': recent_merchants,
-        'recent_transactions': recent_transactions,
-    }
-    return render(request, 'super_admin/dashboard.html', context)
+    # The panels show nothing user-specific, so every admin shares one copy.
+    chrome, panels = await asyncio.gather(
+        aio.run_sync(fragments.chrome, request, 'super_admin'),
+        fragments.arender_fragment(
+            request, 'super_admin/partials/panels.html', panel_context,
+            depends_on=(caching.MERCHANTS, caching.TRANSACTIONS),
+        ),
+    )
+    return await aio.run_sync(render, request, 'super_admin/dashboard.html', {**chrome, 'panels': panels})
 
 @login_required
 @user_passes_test(is_superuser)
@@ -147,27 +213,24 @@ def merchant_list(request):
     search_query = request.GET.get('search', '')
     status_filter = request.GET.get('status', '')
     
-    merchants = Merchant.objects.all()
-    
-    if search_query:
-        merchants = merchants.filter(
-            Q(user__username__icontains=search_query) |
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(business_name__icontains=search_query)
-        )
+    merchants = merchant_rows(Merchant.objects.all())
     
     if status_filter:
         merchants = merchants.filter(status=status_filter)
     
-    paginator = Paginator(merchants, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if search_query:
+        # Ranked by the search index instead of a leading-wildcard LIKE over joined tables
+        ids = search.ranked_ids(merchants, search_query)
+        paginator = RankedPaginator(merchants, ids, 10, count_is_exact=len(ids) < search.result_limit())
+    else:
+        paginator = CursorPaginator(merchants, 10)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'status_filter': status_filter,
+        'filter_query': urlencode({key: value for key, value in [('search', search_query), ('status', status_filter)] if value}),
     }
     return render(request, 'super_admin/merchant_list.html', context)
 
@@ -180,7 +243,7 @@ def merchant_add(request):
         if form.is_valid():
             merchant = form.save(commit=False)
             # Note: In a real app, you'd create the user and profile here
-            merchant.save()
+            writes.run(merchant.save)
             messages.success(request, 'Merchant added successfully!')
             return redirect('sneat_app:merchant_list')
     else:
@@ -197,7 +260,7 @@ def merchant_edit(request, merchant_id):
     if request.method == 'POST':
         form = MerchantForm(request.POST, instance=merchant)
         if form.is_valid():
-            form.save()
+            writes.run(form.save)
             messages.success(request, 'Merchant updated successfully!')
             return redirect('sneat_app:merchant_list')
     else:
@@ -212,18 +275,24 @@ def merchant_delete(request, merchant_id):
     merchant = get_object_or_404(Merchant, id=merchant_id)
     
     if request.method == 'POST':
-        merchant.delete()
+        writes.run(merchant.delete)
         messages.success(request, 'Merchant deleted successfully!')
         return redirect('sneat_app:merchant_list')
     
     return render(request, 'super_admin/merchant_confirm_delete.html', {'merchant': merchant})
 
-@login_required
-@user_passes_test(is_superuser)
-def merchant_toggle_status(request, merchant_id):
+def _toggle_status(merchant_id):
+    # Read and flip in one transaction, so concurrent toggles apply one after the other
     merchant = get_object_or_404(Merchant, id=merchant_id)
     merchant.status = 'inactive' if merchant.status == 'active' else 'active'
     merchant.save()
+    return merchant
+
+@login_required
+@user_passes_test(is_superuser)
+@require_POST
+def merchant_toggle_status(request, merchant_id):
+    merchant = writes.run(_toggle_status, merchant_id)
     
     status_text = 'activated' if merchant.status == 'active' else 'deactivated'
     messages.success(request, f'Merchant {status_text} successfully!')
@@ -235,26 +304,23 @@ def transaction_list(request):
     search_query = request.GET.get('search', '')
     type_filter = request.GET.get('type', '')
     
-    transactions = Transaction.objects.all()
-    
-    if search_query:
-        transactions = transactions.filter(
-            Q(merchant__user__username__icontains=search_query) |
-            Q(merchant__business_name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+    transactions = transaction_rows(Transaction.objects.all())
     
     if type_filter:
         transactions = transactions.filter(type=type_filter)
     
-    paginator = Paginator(transactions, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if search_query:
+        ids = search.ranked_ids(transactions, search_query)
+        paginator = RankedPaginator(transactions, ids, 10, count_is_exact=len(ids) < search.result_limit())
+    else:
+        paginator = CursorPaginator(transactions, 10)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'type_filter': type_filter,
+        'filter_query': urlencode({key: value for key, value in [('search', search_query), ('type', type_filter)] if value}),
     }
     return render(request, 'super_admin/transaction_list.html', context)
 
@@ -265,7 +331,7 @@ def transaction_add(request):
     if request.method == 'POST':
         form = TransactionForm(request.POST)
         if form.is_valid():
-            form.save()
+            writes.run(form.save)
             messages.success(request, 'Transaction added successfully!')
             return redirect('sneat_app:transaction_list')
     else:
@@ -275,31 +341,99 @@ def transaction_add(request):
 
 @login_required
 @user_passes_test(is_superuser)
-def reports(request):
+def transaction_export(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in exports.FORMATS:
+        return HttpResponseBadRequest(f'Unsupported format: {export_format}')
+    try:
+        start = exports.parse_day(request.GET.get('start'))
+        end = exports.parse_day(request.GET.get('end'), end=True)
+    except exports.ExportError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    transactions = exports.export_queryset(
+        search_query=request.GET.get('search', ''),
+        type_filter=request.GET.get('type', ''),
+        start=start,
+        end=end,
+    )
+    response = StreamingHttpResponse(
+        exports.stream(transactions, export_format),
+        content_type=exports.FORMATS[export_format],
+    )
+    filename = f"transactions-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def statement_response(request, merchant):
+    """One merchant's statement for ``?month=YYYY-MM`` (default: last month) as HTML or ``?format=csv``."""
+    statement_format = request.GET.get('format', 'html')
+    if statement_format not in statements.FORMATS:
+        return HttpResponseBadRequest(f'Unsupported format: {statement_format}')
+    try:
+        if request.GET.get('month'):
+            start, end = statements.month_period(request.GET['month'])
+        else:
+            start, end = statements.previous_month()
+    except statements.StatementError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    statement = next(statements.build(start, end, merchant_ids=[merchant.pk]))
+    if statement_format == 'html':
+        return HttpResponse(statements.render_html(statement))
+    response = HttpResponse(content_type=statements.FORMATS['csv'])
+    statements.write_csv(statement, response)
+    filename = f"statement-{statements.period_label(start, end)}-{merchant.pk}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+@user_passes_test(is_merchant)
+def merchant_statement(request):
+    merchant = get_object_or_404(Merchant, user=request.user)
+    return statement_response(request, merchant)
+
+@login_required
+@user_passes_test(is_superuser)
+def merchant_statement_admin(request, merchant_id):
+    merchant = get_object_or_404(Merchant, id=merchant_id)
+    return statement_response(request, merchant)
+
+@aio.login_required
+@aio.user_passes_test(is_superuser)
+async def reports(request):
+    # Top merchants by revenue, fetched alongside the (cached) platform statistics
+    platform, top_merchants = await aio.gather(
+        stats.platform_stats,
+        lambda: list(Merchant.objects.filter(balance__isnull=False).only(
+            'id', 'business_name', 'status'
+        ).annotate(
+            total_revenue=F('balance__credit_total'),
+            name=_full_name('user__'),
+            email=F('user__email'),
+        ).order_by('-balance__credit_total')[:10]),
+    )
+    
     # Revenue statistics
-    total_revenue = Transaction.objects.filter(type='credit').aggregate(Sum('amount'))['amount__sum'] or 0
-    monthly_revenue = Transaction.objects.filter(
-        type='credit',
-        created_at__gte=timezone.now() - timedelta(days=30)
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
+    total_revenue = platform['total_revenue']
+    total_debits = platform['total_debits']
+    net_revenue = platform['net_revenue']
+    monthly_revenue = platform['monthly_revenue']
     
     # Merchant statistics
-    total_merchants = Merchant.objects.count()
-    active_merchants = Merchant.objects.filter(status='active').count()
-    inactive_merchants = Merchant.objects.filter(status='inactive').count()
+    total_merchants = platform['total_merchants']
+    active_merchants = platform['active_merchants']
+    inactive_merchants = platform['inactive_merchants']
     
     # Transaction statistics
-    total_transactions = Transaction.objects.count()
-    credit_transactions = Transaction.objects.filter(type='credit').count()
-    debit_transactions = Transaction.objects.filter(type='debit').count()
-    
-    # Top merchants by revenue
-    top_merchants = Merchant.objects.annotate(
-        total_revenue=Sum('transactions__amount', filter=Q(transactions__type='credit'))
-    ).order_by('-total_revenue')[:10]
+    total_transactions = platform['total_transactions']
+    credit_transactions = platform['credit_transactions']
+    debit_transactions = platform['debit_transactions']
     
     context = {
         'total_revenue': total_revenue,
+        'total_debits': total_debits,
+        'net_revenue': net_revenue,
         'monthly_revenue': monthly_revenue,
         'total_merchants': total_merchants,
         'active_merchants': active_merchants,
@@ -309,7 +443,7 @@ def reports(request):
         'debit_transactions': debit_transactions,
         'top_merchants': top_merchants,
     }
-    return render(request, 'super_admin/reports.html', context)
+    return await aio.run_sync(render, request, 'super_admin/reports.html', context)
 
 @login_required
 @user_passes_test(is_superuser)
@@ -0,0 +1,139 @@
+"""
+Single-writer queue with group commit, for SQLite.
+
+SQLite lets one connection write at a time; every other writer waits on
+the busy timeout for its turn, then pays for its own BEGIN IMMEDIATE and
+COMMIT. With ``SNEAT_WRITE_QUEUE`` on, ``run()`` hands writes to one
+thread per process instead. That thread takes every write waiting, up to
+``SNEAT_WRITE_QUEUE_BATCH`` (and, when ``SNEAT_WRITE_QUEUE_WAIT_MS`` is
+set, waits that long for more after the first), and runs the batch in
+one transaction: one lock acquisition and one commit for all of them.
+Writes queue up while a batch commits, so the busier the process, the
+larger the batches.
+
+Each write runs in its own savepoint, so one that fails (a validation
+error, an ``IntegrityError``) rolls back only itself, and its exception is
+raised in the caller as usual. Writes run in the caller's context
+variables, so request instrumentation and replica stickiness see them.
+``run()`` returns once the batch has committed.
+
+Off (the default), ``run()`` calls the function in ``atomic_write()`` on
+the caller's thread. Calls made inside an atomic block, or from the
+writer thread itself, always run in place. Keep the queue off under
+``TestCase``, whose transaction is only visible on the main thread's
+connection.
+
+``atomic_write()`` is ``transaction.atomic()`` for blocks that write. On
+the tuned SQLite engine (``sneat_app.sqlite``) their transaction begins
+``IMMEDIATE`` under the write lock; other atomic blocks begin as readers.
+"""
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connection, connections, transaction
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_WAIT_MS = 0
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'SNEAT_WRITE_QUEUE', False)
+
+
+@contextmanager
+def atomic_write(using=None):
+    """``transaction.atomic()`` for a block that writes; open the outermost block with it."""
+    writing = getattr(connections[using or DEFAULT_DB_ALIAS], 'writing', nullcontext)
+    with writing(), transaction.atomic(using=using):
+        yield
+
+
+def _in_savepoint(func, args, kwargs):
+    try:
+        with transaction.atomic():
+            return True, func(*args, **kwargs)
+    except Exception as e:
+        return False, e
+
+
+class WriteQueue:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, wait=DEFAULT_WAIT_MS / 1000):
+        self.batch_size = batch_size
+        self.wait = wait
+        self.batches = 0
+        self.writes = 0
+        self._jobs = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._loop, name='sneat-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def thread(self):
+        return self._thread
+
+    def submit(self, func, *args, **kwargs):
+        """Queue ``func(*args, **kwargs)``; the returned future resolves once its batch commits."""
+        future = Future()
+        self._jobs.put((contextvars.copy_context(), func, args, kwargs, future))
+        return future
+
+    def _take(self):
+        jobs = [self._jobs.get()]
+        deadline = time.monotonic() + self.wait
+        while len(jobs) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                jobs.append(self._jobs.get(timeout=timeout) if timeout > 0 else self._jobs.get_nowait())
+            except queue.Empty:
+                break
+        return jobs
+
+    def _loop(self):
+        while True:
+            jobs = self._take()
+            # Connection housekeeping Django does between requests (CONN_MAX_AGE, health checks)
+            close_old_connections()
+            try:
+                with atomic_write():
+                    outcomes = [context.run(_in_savepoint, func, args, kwargs)
+                                for context, func, args, kwargs, _ in jobs]
+            except Exception as e:
+                # BEGIN or COMMIT failed: nothing in the batch was written
+                for *_, future in jobs:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.writes += len(jobs)
+            for (*_, future), (ok, value) in zip(jobs, outcomes):
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+
+def write_queue():
+    """This process's writer, started on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteQueue(
+                getattr(settings, 'SNEAT_WRITE_QUEUE_BATCH', DEFAULT_BATCH_SIZE),
+                getattr(settings, 'SNEAT_WRITE_QUEUE_WAIT_MS', DEFAULT_WAIT_MS) / 1000,
+            )
+        return _queue
+
+
+def run(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` in a transaction, through the writer queue when it is on."""
+    if (not enabled() or connection.in_atomic_block
+            or (_queue is not None and threading.current_thread() is _queue.thread)):
+        with atomic_write():
+            return func(*args, **kwargs)
+    return write_queue().submit(func, *args, **kwargs).result()
@@ -8,4 +8,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sneat_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up; serves the live dashboard stream without a thread per client.
+from sneat_app import live  # noqa: E402
+
+application = live.mount(django_application)
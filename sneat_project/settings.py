@@ -3,6 +3,7 @@ Django settings for sneat_project project.
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -29,7 +30,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'sneat_app.middleware.QueryInstrumentationMiddleware',
+    'sneat_app.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'sneat_app.ratelimit.RateLimitMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -40,9 +44,24 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'sneat_project.urls'
 
 TEMPLATES = [
+    # Site templates (templates/) are Jinja2; see sneat_project/jinja2.py
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
         'DIRS': [BASE_DIR / 'templates'],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'environment': 'sneat_project.jinja2.environment',
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+    # The admin and app templates (sneat_app/templates/) stay on the Django engine
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -58,12 +77,26 @@ TEMPLATES = [
 WSGI_APPLICATION = 'sneat_project.wsgi.application'
 
 # Database
+# SQLite tuned for concurrent requests (sneat_app.sqlite: WAL, pragmas, BEGIN IMMEDIATE);
+# SNEAT_SQLITE_TUNED=0 uses Django's plain backend, e.g. to compare with `manage.py stress_sqlite`
+SNEAT_SQLITE_TUNED = os.environ.get('SNEAT_SQLITE_TUNED', '1') != '0'
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': 'sneat_app.sqlite' if SNEAT_SQLITE_TUNED else 'django.db.backends.sqlite3',
+        # Overridable so the benchmarks (sneat_app.benchmarks) can run against one database per scale
+        'NAME': os.environ.get('SNEAT_DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
+        # Persistent connections, checked before reuse
+        'CONN_MAX_AGE': int(os.environ.get('SNEAT_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# Read replicas (sneat_app.replicas): SQLite copies of the primary, one per path, kept
+# up to date by `manage.py sync_replicas`. Add PostgreSQL replicas to DATABASES directly.
+SNEAT_DATABASE_REPLICAS = [path for path in os.environ.get('SNEAT_DATABASE_REPLICAS', '').split(os.pathsep) if path]
+for index, path in enumerate(SNEAT_DATABASE_REPLICAS, 1):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'NAME': path, 'TEST': {'MIRROR': 'default'}}
+SNEAT_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['sneat_app.replicas.ReplicaRouter']
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -100,3 +133,118 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Keyset pagination: list pages count at most this many rows (0 disables the count)
+SNEAT_PAGINATION_COUNT_LIMIT = 1000
+
+# Search index used by the transaction/merchant lists and admin search
+SNEAT_SEARCH_BACKEND = 'sneat_app.search.backends.SQLiteFTSBackend'
+SNEAT_SEARCH_RESULT_LIMIT = 500
+
+# Request instrumentation (sneat_app.middleware): most queries each view may run.
+# Over-budget requests log a warning, or fail when SNEAT_QUERY_BUDGET_STRICT is on.
+SNEAT_QUERY_BUDGETS = {
+    'sneat_app:super_admin_dashboard': 10,
+    'sneat_app:merchant_dashboard': 8,
+    'sneat_app:user_dashboard': 4,
+    'sneat_app:merchant_list': 8,
+    'sneat_app:transaction_list': 8,
+    'sneat_app:transaction_add': 4,
+    'sneat_app:reports': 10,
+    'sneat_app:chart_revenue': 4,
+    'admin:sneat_app_merchant_changelist': 6,
+    'admin:sneat_app_transaction_changelist': 6,
+    'admin:sneat_app_transaction_add': 8,
+    'admin:sneat_app_transaction_change': 8,
+}
+# Strict under `manage.py test`, so an N+1 fails any test that requests the page, or with
+# SNEAT_QUERY_BUDGET_STRICT=1 (e.g. a staging server).
+SNEAT_QUERY_BUDGET_STRICT = sys.argv[1:2] == ['test'] or os.environ.get('SNEAT_QUERY_BUDGET_STRICT') == '1'
+SNEAT_SERVER_TIMING = DEBUG
+
+# Cache backend: "locmem" (default), "file", or "redis" for a local Redis
+# (SNEAT_REDIS_URL). Dashboard statistics are cached here (sneat_app.caching).
+SNEAT_CACHE = os.environ.get('SNEAT_CACHE', 'locmem')
+SNEAT_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sneat',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('SNEAT_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+CACHES = {
+    'default': SNEAT_CACHE_BACKENDS[SNEAT_CACHE],
+}
+SNEAT_CACHE_ALIAS = 'default'
+# Seconds the shared dashboard/reports statistics are served before a refresh
+SNEAT_STATS_FRESH_FOR = 60
+# Dashboard chrome and data panels (sneat_app.fragments); hit rates via `manage.py cache_stats`
+SNEAT_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+SNEAT_CACHE_STATS = True
+# Compiled Jinja2 bytecode, shared by all workers (None disables)
+SNEAT_JINJA2_BYTECODE_CACHE = BASE_DIR / 'cache' / 'jinja2'
+
+# Bundled, fingerprinted CSS/JS written by `manage.py build_assets` (sneat_app.assets).
+# Templates link the bundles once built unless this is off; sources are linked otherwise.
+SNEAT_ASSET_ROOT = STATIC_ROOT / 'bundles'
+SNEAT_ASSET_BUNDLES = not DEBUG
+
+# Live dashboard stream (sneat_app.live): per-client backlog before a resync,
+# keepalive and reconnect delays, and how often totals are re-sent after writes
+SNEAT_LIVE_QUEUE_SIZE = 100
+SNEAT_LIVE_HEARTBEAT = 15
+SNEAT_LIVE_RETRY_MS = 5000
+SNEAT_LIVE_TOTALS_INTERVAL = 1.0
+
+# Async views (sneat_app.aio) run their queries concurrently on a shared pool of
+# this many threads; False runs them on the request thread (needed inside TestCase)
+SNEAT_ASYNC_QUERIES = True
+SNEAT_ASYNC_QUERY_THREADS = 16
+
+# Merchant statements written by `manage.py generate_statements` (sneat_app.statements),
+# one directory per period
+SNEAT_STATEMENT_ROOT = BASE_DIR / 'statements'
+
+# Seeded databases (one per scale) and results of `manage.py benchmark` (sneat_app.benchmarks)
+SNEAT_BENCHMARK_ROOT = BASE_DIR / 'benchmarks'
+
+# Sign in by username or email with one indexed lookup and one password hash (sneat_app.backends)
+AUTHENTICATION_BACKENDS = ['sneat_app.backends.EmailOrUsernameBackend']
+
+# Rate limits (sneat_app.ratelimit), checked for POSTs before the view runs:
+# URL name -> rules "<key>:<count>/<period>" with key ip, username (login field) or user.
+# "memory" counts per process; "cache" shares counts between workers through SNEAT_RATE_LIMIT_CACHE.
+SNEAT_RATE_LIMIT_BACKEND = os.environ.get('SNEAT_RATE_LIMIT_BACKEND', 'memory')
+SNEAT_RATE_LIMIT_CACHE = 'default'
+SNEAT_RATE_LIMITS = {
+    'sneat_app:unified_login': ['ip:20/m', 'ip:200/h', 'username:10/m'],
+    'sneat_app:login': ['ip:20/m', 'ip:200/h', 'username:10/m'],
+    'sneat_app:register': ['ip:5/m', 'ip:30/h'],
+    'sneat_app:transaction_add': ['user:60/m', 'ip:120/m'],
+    'sneat_app:merchant_toggle_status': ['user:30/m'],
+}
+
+# Views whose GETs read from a replica, and how long a browser reads the primary after it writes
+SNEAT_REPLICA_VIEWS = [
+    'sneat_app:user_dashboard',
+    'sneat_app:merchant_dashboard',
+    'sneat_app:super_admin_dashboard',
+    'sneat_app:merchant_list',
+    'sneat_app:transaction_list',
+    'sneat_app:chart_revenue',
+    'sneat_app:reports',
+]
+SNEAT_REPLICA_PIN_SECONDS = 10
+
+# Writes from transaction_add, register and the API go through one writer thread per
+# process that group-commits them in batches (sneat_app.writes). Off under TestCase.
+SNEAT_WRITE_QUEUE = os.environ.get('SNEAT_WRITE_QUEUE', '0') == '1'
+SNEAT_WRITE_QUEUE_BATCH = 64
+SNEAT_WRITE_QUEUE_WAIT_MS = 0
@@ -6,8 +6,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from sneat_app import assets
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Fingerprinted bundles from `manage.py build_assets`, served in production too
+    path(f"{settings.STATIC_URL.strip('/')}/bundles/<path:path>", assets.serve_bundle, name='asset_bundle'),
     path('', include('sneat_app.urls')),
 ]
 
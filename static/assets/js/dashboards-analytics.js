@@ -16,16 +16,20 @@
   // --------------------------------------------------------------------
   const totalRevenueChartEl = document.querySelector('#totalRevenueChart'),
     totalRevenueChartOptions = {
+      // Filled in from the chart's data-chart-url; see loadRevenueChart below
       series: [
         {
-          name: '2021',
-          data: [18, 7, 15, 29, 18, 12, 9]
+          name: 'Credit',
+          data: []
         },
         {
-          name: '2020',
-          data: [-13, -18, -9, -14, -5, -17, -15]
+          name: 'Debit',
+          data: []
         }
       ],
+      noData: {
+        text: 'Loading...'
+      },
       chart: {
         height: 300,
         stacked: true,
@@ -78,8 +82,10 @@
         }
       },
       xaxis: {
-        categories: ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul'],
+        categories: [],
+        tickAmount: 12,
         labels: {
+          rotate: 0,
           style: {
             fontSize: '13px',
             colors: axisColor
@@ -272,6 +278,76 @@
   if (typeof totalRevenueChartEl !== undefined && totalRevenueChartEl !== null) {
     const totalRevenueChart = new ApexCharts(totalRevenueChartEl, totalRevenueChartOptions);
     totalRevenueChart.render();
+    if (totalRevenueChartEl.dataset.chartUrl) {
+      loadRevenueChart(totalRevenueChart, totalRevenueChartEl);
+    }
+  }
+
+  // Revenue chart data: credit above the axis, debit below. The endpoint
+  // answers unchanged data with 304 via ETag, so polling is cheap.
+  function loadRevenueChart(chart, el) {
+    const pollInterval = 60000,
+      // Roughly one bar per 8px; the server merges buckets beyond that
+      pixelsPerPoint = 8,
+      labelFormats = {
+        day: { month: 'short', day: 'numeric' },
+        week: { month: 'short', day: 'numeric' },
+        month: { month: 'short', year: 'numeric' }
+      },
+      card = el.closest('.card'),
+      buttons = card ? card.querySelectorAll('[data-chart-interval]') : [];
+    let interval = 'day',
+      lastBody = null;
+
+    function formatLabel(label) {
+      // Labels are UTC dates; format them as such so they do not shift a day
+      return new Date(label + 'T00:00:00Z').toLocaleDateString(undefined, {
+        ...labelFormats[interval],
+        timeZone: 'UTC'
+      });
+    }
+
+    function load() {
+      const params = new URLSearchParams({
+        interval: interval,
+        points: Math.max(1, Math.floor(el.clientWidth / pixelsPerPoint))
+      });
+      return fetch(el.dataset.chartUrl + '?' + params, {
+        credentials: 'same-origin',
+        headers: { Accept: 'application/json' }
+      })
+        .then(response => (response.ok ? response.text() : null))
+        .then(body => {
+          // A revalidated (304) response comes back with the stored body
+          if (body === null || body === lastBody) {
+            return;
+          }
+          lastBody = body;
+          const data = JSON.parse(body);
+          chart.updateOptions({
+            xaxis: { categories: data.labels.map(formatLabel) },
+            series: [
+              { name: 'Credit', data: data.series.credit },
+              { name: 'Debit', data: data.series.debit.map(total => -total) }
+            ]
+          });
+        })
+        .catch(() => {});
+    }
+
+    buttons.forEach(button => {
+      button.addEventListener('click', () => {
+        buttons.forEach(other => other.classList.toggle('active', other === button));
+        interval = button.dataset.chartInterval;
+        load();
+      });
+    });
+    load();
+    setInterval(() => {
+      if (!document.hidden) {
+        load();
+      }
+    }, pollInterval);
   }
 
   // Growth Chart - Radial Bar Chart
@@ -0,0 +1,62 @@
+/**
+ * Live dashboard updates (Server-Sent Events from sneat_app.live)
+ */
+
+'use strict';
+
+(function () {
+  const url = document.body.dataset.liveUrl;
+  if (!url || !window.EventSource) {
+    return;
+  }
+
+  const maxRows = 5;
+  const source = new EventSource(url);
+
+  source.addEventListener('totals', function (event) {
+    const totals = JSON.parse(event.data);
+    document.querySelectorAll('[data-live-stat]').forEach(function (el) {
+      const value = totals[el.dataset.liveStat];
+      if (value !== undefined) {
+        el.textContent = value;
+      }
+    });
+  });
+
+  source.addEventListener('transaction', function (event) {
+    const transaction = JSON.parse(event.data);
+    const tbody = document.querySelector('[data-live-transactions]');
+    if (!tbody) {
+      return;
+    }
+    const empty = tbody.querySelector('[data-live-empty]');
+    if (empty) {
+      empty.remove();
+    }
+
+    const row = document.createElement('tr');
+    const cells = [transaction.merchant, '$' + transaction.amount, null, transaction.date];
+    cells.forEach(function (text) {
+      const cell = document.createElement('td');
+      if (text === null) {
+        const badge = document.createElement('span');
+        badge.className = 'badge ' + (transaction.type === 'credit' ? 'bg-success' : 'bg-danger');
+        badge.textContent = transaction.type_display;
+        cell.appendChild(badge);
+      } else {
+        cell.textContent = text;
+      }
+      row.appendChild(cell);
+    });
+    tbody.insertBefore(row, tbody.firstChild);
+    while (tbody.rows.length > maxRows) {
+      tbody.deleteRow(-1);
+    }
+  });
+
+  // The server dropped updates this page missed; start from a fresh render.
+  source.addEventListener('resync', function () {
+    source.close();
+    window.location.reload();
+  });
+})();